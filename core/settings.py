@@ -96,6 +96,20 @@ DATABASES = {
     }
 }
 
+# Cache: per-process memory locally; set REDIS_URL in production so every
+# worker shares the cache (and sees catalog cache invalidations).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'vinsaraa',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
 # Auth User Model (CRITICAL)
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
@@ -121,6 +135,11 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploaded images get resized WebP/JPEG copies at these widths (store.images),
+# built on a background thread after the upload commits.
+IMAGE_DERIVATIVE_WIDTHS = [320, 640, 1280]
+IMAGE_DERIVATIVES_ASYNC = True
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -134,6 +153,66 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Store catalog pagination (?page_size= is capped at STORE_MAX_PAGE_SIZE)
+STORE_PAGE_SIZE = 24
+STORE_MAX_PAGE_SIZE = 100
+# Lower bounds (₹) of the price bands offered as a catalog facet
+STORE_PRICE_BANDS = [0, 1000, 2000, 5000]
+# Seconds a cached catalog response lives (it is invalidated on writes anyway)
+STORE_CACHE_TIMEOUT = 300
+# Cart revalidation (POST /api/store/stock/): lines per request, seconds cached
+STORE_STOCK_MAX_LINES = 50
+STORE_STOCK_CACHE_TIMEOUT = 5
+# Seconds checkout holds stock for an unpaid order (store.reservations)
+STOCK_RESERVATION_TTL = 15 * 60
+# Seconds a worker trusts its copy of SiteConfig before checking for edits
+SITE_CONFIG_CHECK_INTERVAL = 1.0
+# Where the working cart lives (orders.carts): 'database' writes every change
+# to Cart/CartItem; 'cache' keeps it in the cache (needs REDIS_URL, see system
+# check orders.E001) and writes it behind on a worker thread, or at checkout.
+CART_BACKEND = os.environ.get('CART_BACKEND', 'database')
+CART_WRITE_BEHIND_ASYNC = True
+# Seconds a cache-held cart lives after its last change (it is in the database by then)
+CART_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+# Operations per POST /api/orders/cart/batch/
+CART_BATCH_MAX_OPERATIONS = 50
+# Order status stream (GET /api/orders/<id>/status/stream/, orders.events):
+# seconds before the stream ends (the client reconnects), between keepalive
+# comments, and between checks for changes published by other workers
+ORDER_STATUS_STREAM_TIMEOUT = 5 * 60
+ORDER_STATUS_KEEPALIVE = 15
+ORDER_STATUS_CHECK_INTERVAL = 1.0
+# Seconds a stream token (POST /api/orders/<id>/status/stream-token/) can open the stream
+ORDER_STATUS_STREAM_TOKEN_TTL = 60
+# Where manage.py dispatch_outbox delivers order/payment events (orders.outbox):
+# a list of {'BACKEND': dotted path, 'OPTIONS': {...}}. Available sinks:
+# orders.outbox.LogSink (the 'orders.outbox' logger, at INFO), .WebhookSink (url,
+# secret, timeout), .FileQueueSink (directory)
+OUTBOX_SINKS = [{'BACKEND': 'orders.outbox.LogSink'}]
+# Failed events are retried after OUTBOX_RETRY_DELAY seconds, doubling per
+# failure (up to an hour), and parked after OUTBOX_MAX_ATTEMPTS failures
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_RETRY_DELAY = 30
+# Seconds a dispatcher owns the batch it is sending before another may retry it
+OUTBOX_CLAIM_TIMEOUT = 300
+if os.environ.get('OUTBOX_WEBHOOK_URL'):
+    OUTBOX_SINKS.append({
+        'BACKEND': 'orders.outbox.WebhookSink',
+        'OPTIONS': {'url': os.environ['OUTBOX_WEBHOOK_URL'], 'secret': os.environ.get('OUTBOX_WEBHOOK_SECRET', '')},
+    })
+if os.environ.get('OUTBOX_QUEUE_DIR'):
+    OUTBOX_SINKS.append({'BACKEND': 'orders.outbox.FileQueueSink', 'OPTIONS': {'directory': os.environ['OUTBOX_QUEUE_DIR']}})
+
+# Public URLs (used for absolute links outside a request, e.g. product feeds)
+SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
+FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
+
+# Product feed export (store.feeds)
+STORE_CURRENCY = 'INR'
+FEED_BRAND = 'Vinsaraa'
+FEED_PRODUCT_URL = FRONTEND_URL.rstrip('/') + '/product/{slug}'
+FEED_CACHE_DIR = os.path.join(BASE_DIR, 'feeds')
+
 # CORS Config (Allow Frontend)
 CORS_ALLOW_ALL_ORIGINS = True # Easier for dev, restrict in prod
 
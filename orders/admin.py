@@ -1,12 +1,15 @@
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
-from .models import Order, OrderItem, Cart, CartItem
+from .events import publish_order_status
+from .outbox import record_event, record_events, requeue
+from .models import Order, OrderItem, Cart, CartItem, CouponRedemption, OutboxEvent
 
 # Order Admin
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ('product_name', 'variant_label', 'price', 'quantity')
+    readonly_fields = ('variant', 'product_name', 'variant_label', 'price', 'quantity')
 
 
 @admin.register(Order)
@@ -29,14 +32,14 @@ class OrderAdmin(admin.ModelAdmin):
         }
 
     readonly_fields = (
-        'user', 'total_amount', 'created_at',
+        'user', 'total_amount', 'coupon', 'discount_amount', 'shipping_amount', 'tax_amount', 'created_at',
         'shipping_address', 'phone',
         'razorpay_order_id', 'razorpay_payment_id', 'razorpay_signature'
     )
     
     fieldsets = (
         ('Order Info', {
-            'fields': ('user', 'total_amount', 'created_at')
+            'fields': ('user', 'total_amount', 'coupon', 'discount_amount', 'shipping_amount', 'tax_amount', 'created_at')
         }),
         ('Status', {
             'fields': ('payment_status', 'order_status'),
@@ -55,18 +58,33 @@ class OrderAdmin(admin.ModelAdmin):
     # --- NEW CHANGE: Action Functions ---
     @admin.action(description='Mark selected orders as Processing')
     def mark_as_processing(self, request, queryset):
-        updated = queryset.update(order_status='Processing')
+        updated = self.set_order_status(queryset, 'Processing')
         self.message_user(request, f'{updated} orders marked as Processing.')
 
     @admin.action(description='Mark selected orders as Shipped')
     def mark_as_shipped(self, request, queryset):
-        updated = queryset.update(order_status='Shipped')
+        updated = self.set_order_status(queryset, 'Shipped')
         self.message_user(request, f'{updated} orders marked as Shipped.')
 
     @admin.action(description='Mark selected orders as Delivered')
     def mark_as_delivered(self, request, queryset):
-        updated = queryset.update(order_status='Delivered')
+        updated = self.set_order_status(queryset, 'Delivered')
         self.message_user(request, f'{updated} orders marked as Delivered.')
+
+    def set_order_status(self, queryset, new_status):
+        """Bulk status change plus one outbox event per changed order, in one transaction."""
+        with transaction.atomic():
+            orders = list(queryset.select_for_update().exclude(order_status=new_status))
+            previous = {order.pk: order.order_status for order in orders}
+            Order.objects.filter(pk__in=list(previous)).update(order_status=new_status)
+            for order in orders:
+                order.order_status = new_status
+            record_events('order.status_changed', orders, {
+                pk: {'from': status, 'to': new_status} for pk, status in previous.items()
+            })
+            # Wake status streams of the changed orders (orders.events)
+            transaction.on_commit(lambda: [publish_order_status(pk) for pk in previous])
+        return len(orders)
     # ------------------------------------
 
     def user_email(self, obj):
@@ -105,6 +123,13 @@ class OrderAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         """Save changes without blocking validation"""
         super().save_model(request, obj, form, change)
+        # Admin saves run in a transaction, so the outbox events commit with them
+        if change and 'order_status' in form.changed_data:
+            record_event('order.status_changed', obj, **{'from': form.initial.get('order_status'), 'to': obj.order_status})
+        if change and 'payment_status' in form.changed_data and obj.payment_status == 'Paid':
+            record_event('order.paid', obj)
+        # Payment may have been marked by hand: wake status streams (orders.events)
+        transaction.on_commit(lambda: publish_order_status(obj.pk))
     
     def has_add_permission(self, request):
         """Disable adding orders from admin"""
@@ -118,13 +143,46 @@ class OrderAdmin(admin.ModelAdmin):
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('order', 'product_name', 'variant_label', 'price', 'quantity')
-    readonly_fields = ('order', 'product_name', 'variant_label', 'price', 'quantity')
+    readonly_fields = ('order', 'variant', 'product_name', 'variant_label', 'price', 'quantity')
     
     def has_add_permission(self, request):
         """Disable adding order items"""
         return False
 
 
+@admin.register(CouponRedemption)
+class CouponRedemptionAdmin(admin.ModelAdmin):
+    list_display = ('coupon', 'user', 'order', 'discount_amount', 'created_at')
+    list_filter = ('coupon',)
+    search_fields = ('coupon__code', 'user__email')
+    readonly_fields = ('coupon', 'user', 'order', 'discount_amount', 'created_at')
+
+    def has_add_permission(self, request):
+        """Redemptions are written by checkout only"""
+        return False
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'topic', 'order', 'created_at', 'dispatched_at', 'attempts', 'next_attempt_at', 'failed_at')
+    list_filter = ('topic', ('dispatched_at', admin.EmptyFieldListFilter), ('failed_at', admin.EmptyFieldListFilter))
+    search_fields = ('topic', 'order__id')
+    readonly_fields = (
+        'topic', 'order', 'payload', 'created_at', 'dispatched_at', 'attempts', 'last_error',
+        'next_attempt_at', 'failed_at',
+    )
+    actions = ['retry_events']
+
+    @admin.action(description='Retry selected undelivered events now')
+    def retry_events(self, request, queryset):
+        requeued = requeue(queryset)
+        self.message_user(request, f'{requeued} events queued for the next dispatch.')
+
+    def has_add_permission(self, request):
+        """Events are written with the state changes they describe"""
+        return False
+
+
 # Hide Cart and CartItem - not needed in admin
 admin.site.unregister(Cart) if Cart in admin.site._registry else None
 admin.site.unregister(CartItem) if CartItem in admin.site._registry else None
\ No newline at end of file
@@ -0,0 +1,393 @@
+import logging
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import close_old_connections, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from store.models import ProductVariant
+from store.reservations import InsufficientStock
+
+from .models import Cart, CartItem
+from .serializers import CartSerializer, CartStateSerializer, CartStateSummarySerializer, CartSummarySerializer
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'cart'
+CACHE_TIMEOUT = getattr(settings, 'CART_CACHE_TIMEOUT', 7 * 24 * 60 * 60)
+# Seconds before a per-user lock (or a queued flush marker) left behind by a
+# crashed worker expires on its own, and seconds a request waits for a lock
+# before giving up with CartBusy.
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2
+FLUSH_PENDING_TIMEOUT = 60
+OPERATIONS = ('add', 'update', 'remove')
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cart-write-behind')
+_queued = set()
+# Deletes a lock only while it still holds the caller's token
+_RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+class CartBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your cart is being updated by another request; please try again.'
+    default_code = 'cart_busy'
+
+
+def cache_key(user_id, suffix=None):
+    """'cart:<user id>' holds a cached cart; suffixed keys hold its lock and flush marker."""
+    return f'{KEY_PREFIX}:{user_id}' + (f':{suffix}' if suffix else '')
+
+
+def cart_queryset():
+    """
+    Carts with everything CartSerializer reads loaded in one extra query:
+    items -> variant -> product -> card (for the primary image).
+    """
+    items = CartItem.objects.select_related('variant__product__card').order_by('pk')
+    return Cart.objects.prefetch_related(Prefetch('items', queryset=items))
+
+
+def refresh_cart_totals(carts):
+    """
+    Recompute the denormalized Cart.subtotal and Cart.item_count for a
+    queryset of carts with one UPDATE, at current prices.
+    """
+    lines = (
+        CartItem.objects.filter(cart=OuterRef('pk'))
+        .order_by()
+        .values('cart')
+        .annotate(
+            line_subtotal=Sum(ExpressionWrapper(
+                (F('variant__product__price') + F('variant__additional_price')) * F('quantity'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )),
+            line_count=Sum('quantity'),
+        )
+    )
+    return carts.update(
+        subtotal=Coalesce(
+            Subquery(lines.values('line_subtotal')),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        item_count=Coalesce(Subquery(lines.values('line_count')), Value(0), output_field=IntegerField()),
+    )
+
+
+def carts_with_product(product_id):
+    return Cart.objects.filter(pk__in=CartItem.objects.filter(variant__product_id=product_id).values('cart_id'))
+
+
+def persist_lines(user_id, lines):
+    """
+    Make the user's stored cart hold exactly `lines` ({variant id: quantity})
+    in a fixed number of queries; lines for deleted variants are dropped.
+    Returns the cart id.
+    """
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user_id=user_id)
+        existing = set(ProductVariant.objects.filter(pk__in=list(lines)).values_list('pk', flat=True))
+        CartItem.objects.filter(cart=cart).exclude(variant_id__in=existing).delete()
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=cart, variant_id=variant_id, quantity=quantity)
+                for variant_id, quantity in lines.items() if variant_id in existing
+            ],
+            update_conflicts=True,
+            unique_fields=['cart', 'variant'],
+            update_fields=['quantity'],
+        )
+        # Bulk writes skip orders.signals
+        refresh_cart_totals(Cart.objects.filter(pk=cart.pk))
+    return cart.pk
+
+
+# --- Batch operations (POST /api/orders/cart/batch/) ---
+
+def parse_operation(data):
+    """
+    {"op": "add", "variant_id": 7, "quantity": 2} -> ('add', 7, 2).
+    add: quantity (default 1) is added to the line; update: the line is set
+    to quantity, 0 removes it; remove: the line is dropped. Raises ValueError
+    with a message for the shopper.
+    """
+    op = data.get('op') if isinstance(data, dict) else None
+    if op not in OPERATIONS:
+        raise ValueError(f"Each operation needs an 'op': one of {', '.join(OPERATIONS)}")
+    try:
+        variant_id = int(data.get('variant_id'))
+        quantity = None if op == 'remove' else int(data.get('quantity', 1 if op == 'add' else None))
+    except (TypeError, ValueError):
+        raise ValueError(f"'{op}' needs an integer 'variant_id'" + ('' if op == 'remove' else " and 'quantity'"))
+    if quantity is not None and quantity < (1 if op == 'add' else 0):
+        raise ValueError(f"'{op}' needs a quantity of at least {1 if op == 'add' else 0}")
+    return op, variant_id, quantity
+
+
+def apply_operations(lines, operations):
+    """A copy of `lines` ({variant id: quantity}) with parsed operations applied in order."""
+    lines = dict(lines)
+    for op, variant_id, quantity in operations:
+        if op == 'add':
+            lines[variant_id] = lines.get(variant_id, 0) + quantity
+        elif op == 'update' and quantity:
+            lines[variant_id] = quantity
+        else:
+            lines.pop(variant_id, None)
+    return lines
+
+
+def check_stock(lines, operations, variants):
+    """
+    Every line an operation added to or set must fit the variant's available
+    stock; `variants` maps id -> variant annotated by store.reservations.with_available.
+    """
+    for variant_id in sorted({variant_id for op, variant_id, _ in operations if op != 'remove'}):
+        variant = variants[variant_id]
+        if lines.get(variant_id, 0) > variant.available:
+            raise InsufficientStock(f'Not enough stock for {variant.product.title} ({variant.size})')
+
+
+# --- Cart backends (settings.CART_BACKEND) ---
+
+class DatabaseCartBackend:
+    """Every change is written straight to Cart/CartItem."""
+
+    def data(self, user):
+        """The cart as CartSerializer renders it."""
+        cart, _ = cart_queryset().get_or_create(user=user)
+        return CartSerializer(cart).data
+
+    def summary(self, user):
+        """Subtotal and item count only, as CartSummarySerializer renders them."""
+        cart = Cart.objects.filter(user=user).first()
+        if cart is None:
+            return {'id': None, 'subtotal': '0.00', 'item_count': 0, 'updated_at': None}
+        return CartSummarySerializer(cart).data
+
+    def add(self, user, variant, quantity):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        cart_item, created = CartItem.objects.get_or_create(cart=cart, variant=variant, defaults={'quantity': quantity})
+        if not created:
+            cart_item.quantity = F('quantity') + quantity
+            cart_item.save(update_fields=['quantity'])
+
+    def remove(self, user, variant_id):
+        get_object_or_404(CartItem, variant_id=variant_id, cart__user=user).delete()
+
+    def apply(self, user, operations, variants):
+        """Apply parsed operations all together or, on InsufficientStock, not at all."""
+        with transaction.atomic():
+            cart, _ = Cart.objects.select_for_update().get_or_create(user=user)
+            lines = apply_operations(dict(cart.items.order_by('pk').values_list('variant_id', 'quantity')), operations)
+            check_stock(lines, operations, variants)
+            persist_lines(user.pk, lines)
+
+    def flush(self, user):
+        """Write pending changes to Cart/CartItem (nothing is ever pending here)."""
+
+    def clear(self, user):
+        """Empty the cart; called inside checkout's transaction."""
+        CartItem.objects.filter(cart__user=user).delete()
+        Cart.objects.filter(user=user).update(subtotal=0, item_count=0)
+
+
+class CacheCartBackend(DatabaseCartBackend):
+    """
+    Keeps the working cart in Django's cache, keyed per user, so adding and
+    removing items never writes to the database on the request path. The
+    cart is written behind to Cart/CartItem: on a worker thread shortly after
+    a change (CART_WRITE_BEHIND_ASYNC) and synchronously at checkout.
+
+    Items have no rows of their own, so the "id" of each item in responses is
+    its variant id. Every worker must share the cache (REDIS_URL); the
+    orders.E001 system check enforces it.
+    """
+
+    def data(self, user):
+        return CartStateSerializer(self._render(user)).data
+
+    def summary(self, user):
+        return CartStateSummarySerializer(self._render(user)).data
+
+    def add(self, user, variant, quantity):
+        with self._locked(user.pk):
+            state = self._state(user.pk)
+            state['lines'][variant.pk] = state['lines'].get(variant.pk, 0) + quantity
+            self._save(user.pk, state)
+        self._schedule_flush(user.pk)
+
+    def remove(self, user, variant_id):
+        with self._locked(user.pk):
+            state = self._state(user.pk)
+            if state['lines'].pop(variant_id, None) is None:
+                raise Http404('No cart item matches the given query.')
+            self._save(user.pk, state)
+        self._schedule_flush(user.pk)
+
+    def apply(self, user, operations, variants):
+        with self._locked(user.pk):
+            state = self._state(user.pk)
+            lines = apply_operations(state['lines'], operations)
+            check_stock(lines, operations, variants)
+            state['lines'] = lines
+            self._save(user.pk, state)
+        self._schedule_flush(user.pk)
+
+    def flush(self, user):
+        self.write_behind(user.pk)
+
+    def clear(self, user):
+        super().clear(user)
+        transaction.on_commit(lambda: self._reset(user.pk))
+
+    def write_behind(self, user_id):
+        """
+        Persist the cached cart, if there is one, to Cart/CartItem. Flushes of
+        one cart run one at a time, each copying the latest lines under the
+        cart lock and writing them outside it, so adds never wait on the
+        database.
+        """
+        cache.delete(cache_key(user_id, 'flush'))
+        with self._locked(user_id, 'flushing'):
+            with self._locked(user_id):
+                state = cache.get(cache_key(user_id))
+                if state is None:
+                    return  # nothing cached, so nothing newer than the database
+                lines = dict(state['lines'])
+            cart_id = persist_lines(user_id, lines)
+            if state['cart_id'] != cart_id:
+                with self._locked(user_id):
+                    state = cache.get(cache_key(user_id))
+                    if state is not None:
+                        state['cart_id'] = cart_id
+                        cache.set(cache_key(user_id), state, CACHE_TIMEOUT)
+
+    # --- Cached state: {'cart_id', 'lines': {variant id: quantity}, 'updated_at'} ---
+
+    @contextmanager
+    def _locked(self, user_id, suffix='lock'):
+        """
+        Serializes read-modify-write of one user's cart across workers. Raises
+        CartBusy after LOCK_WAIT seconds; a holder that overruns LOCK_TIMEOUT
+        loses the lock, and its release then leaves the next holder's alone.
+        """
+        key = cache_key(user_id, suffix)
+        token = secrets.randbits(63)  # an int, which RedisCache stores unpickled
+        deadline = time.monotonic() + LOCK_WAIT
+        while not cache.add(key, token, LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                raise CartBusy()
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            release_lock(key, token)
+
+    def _state(self, user_id):
+        state = cache.get(cache_key(user_id))
+        if state is not None:
+            return state
+        # Cache miss: start from what was last written behind
+        cart = Cart.objects.filter(user_id=user_id).only('pk', 'updated_at').first()
+        state = {
+            'cart_id': cart.pk if cart else None,
+            'lines': dict(cart.items.order_by('pk').values_list('variant_id', 'quantity')) if cart else {},
+            'updated_at': cart.updated_at if cart else None,
+        }
+        cache.set(cache_key(user_id), state, CACHE_TIMEOUT)
+        return state
+
+    def _save(self, user_id, state):
+        state['updated_at'] = timezone.now()
+        cache.set(cache_key(user_id), state, CACHE_TIMEOUT)
+
+    def _reset(self, user_id):
+        try:
+            with self._locked(user_id):
+                state = self._state(user_id)
+                state['lines'] = {}
+                self._save(user_id, state)
+        except CartBusy:
+            # Checkout has committed; drop the cached cart so the next read
+            # reloads the emptied one from the database.
+            cache.delete(cache_key(user_id))
+            return
+        self._schedule_flush(user_id)
+
+    def _schedule_flush(self, user_id):
+        if not getattr(settings, 'CART_WRITE_BEHIND_ASYNC', True):
+            self.write_behind(user_id)
+        elif cache.add(cache_key(user_id, 'flush'), 1, FLUSH_PENDING_TIMEOUT):
+            # One queued flush per user at a time; it reads the latest state
+            # when it runs, so later changes ride along with it.
+            future = _executor.submit(_write_behind_in_background, user_id)
+            _queued.add(future)
+            future.add_done_callback(_queued.discard)
+
+    def _render(self, user):
+        state = self._state(user.pk)
+        variants = ProductVariant.objects.select_related('product__card').in_bulk(list(state['lines']))
+        items = [
+            CartItem(id=variant_id, variant=variants[variant_id], quantity=quantity)
+            for variant_id, quantity in state['lines'].items() if variant_id in variants
+        ]
+        subtotal = sum((item.total_price for item in items), Decimal('0.00'))
+        return {
+            'id': state['cart_id'],
+            'user': user.pk,
+            'items': items,
+            'total_cart_price': subtotal,
+            'subtotal': subtotal,
+            'item_count': sum(item.quantity for item in items),
+            'updated_at': state['updated_at'],
+        }
+
+
+def _write_behind_in_background(user_id):
+    try:
+        CacheCartBackend().write_behind(user_id)
+    except Exception:
+        logger.exception("Cart write-behind failed for user pk=%s", user_id)
+    finally:
+        close_old_connections()
+
+
+def release_lock(key, token):
+    """Delete the lock `key` only if it still holds `token`."""
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if isinstance(backend, RedisCache):
+        # In one step: between a get and a delete the lock could expire and be retaken
+        client = backend._cache.get_client(key, write=True)
+        client.eval(_RELEASE_SCRIPT, 1, backend.make_and_validate_key(key), token)
+    elif backend.get(key) == token:
+        backend.delete(key)
+
+
+def drain_write_behind():
+    """Block until every write-behind flush queued in this process has run."""
+    wait(list(_queued))
+
+
+BACKENDS = {
+    'database': DatabaseCartBackend,
+    'cache': CacheCartBackend,
+}
+
+
+def get_cart_backend(name=None):
+    return BACKENDS[name or getattr(settings, 'CART_BACKEND', 'database')]()
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.checks import Error, Tags, register
+
+from store.cache import cache_is_shared
+
+
+@register(Tags.caches)
+def check_cart_backend(app_configs, **kwargs):
+    """settings.CART_BACKEND must name a backend, and 'cache' needs a cache every worker shares."""
+    from .carts import BACKENDS
+
+    name = getattr(settings, 'CART_BACKEND', 'database')
+    if name not in BACKENDS:
+        return [Error(
+            f"CART_BACKEND = {name!r} is not a cart backend.",
+            hint=f"Use one of: {', '.join(BACKENDS)}.",
+            id='orders.E002',
+        )]
+    if name == 'cache' and not cache_is_shared():
+        return [Error(
+            f"CART_BACKEND = 'cache' needs a cache shared by every worker; "
+            f"{type(caches[DEFAULT_CACHE_ALIAS]).__name__} is per process.",
+            hint="Set REDIS_URL, or use CART_BACKEND = 'database'.",
+            id='orders.E001',
+        )]
+    return []
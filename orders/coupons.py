@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models import F
+
+from store.coupons import CouponError
+from store.models import Coupon
+
+from .models import CouponRedemption, Order
+
+
+def redeem_coupon(coupon, order, discount):
+    """
+    Count one use of `coupon` for `order`. Call inside the checkout
+    transaction, as late as possible: the conditional UPDATE below is the only
+    limit check that matters under concurrency, and the row lock it takes is
+    held until commit. The per-user limit is re-checked under that lock, so
+    concurrent checkouts by one shopper queue up and see each other's uses.
+    Raises CouponError, which must roll the transaction back.
+    """
+    used = Coupon.objects.filter(
+        pk=coupon.pk, active=True, uses_count__lt=F('usage_limit'),
+    ).update(uses_count=F('uses_count') + 1)
+    if not used:
+        raise CouponError('Coupon usage limit exceeded')
+    if (
+        coupon.per_user_limit is not None
+        and CouponRedemption.objects.filter(coupon=coupon, user_id=order.user_id).count() >= coupon.per_user_limit
+    ):
+        raise CouponError('You have already used this coupon')
+    return CouponRedemption.objects.create(
+        coupon=coupon, user_id=order.user_id, order=order, discount_amount=discount,
+    )
+
+
+def release_coupon(order):
+    """Undo redeem_coupon() for an order that will never be paid; returns whether it had a use."""
+    deleted, _ = CouponRedemption.objects.filter(order=order).delete()
+    if deleted and order.coupon_id:
+        Coupon.objects.filter(pk=order.coupon_id, uses_count__gt=0).update(uses_count=F('uses_count') - 1)
+    return bool(deleted)
+
+
+def release_unpaid_coupons(order_ids):
+    """
+    release_coupon() for the orders among `order_ids` still awaiting payment,
+    e.g. once their stock holds expired. The orders are locked, so a payment
+    captured meanwhile either lands first (and keeps its use) or waits.
+    Returns how many uses were given back.
+    """
+    with transaction.atomic():
+        orders = Order.objects.select_for_update().filter(
+            pk__in=order_ids, payment_status='Pending', coupon__isnull=False,
+        )
+        return sum(release_coupon(order) for order in orders)
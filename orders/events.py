@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Order status notifications for the streaming status endpoint
+# (orders.views.order_status_stream), without polling the database.
+#
+# publish_order_status() runs once a status change has committed. It wakes
+# the waiters in this process directly, and stamps 'order-status:<id>' in the
+# cache for the other workers: each event loop runs one watcher that reads
+# the stamps of every order its waiters follow in a single get_many() per
+# ORDER_STATUS_CHECK_INTERVAL. An idle waiter costs a coroutine and an
+# asyncio.Event, with no thread and no query.
+
+CHECK_INTERVAL = getattr(settings, 'ORDER_STATUS_CHECK_INTERVAL', 1.0)
+KEY_PREFIX = 'order-status'
+STAMP_TIMEOUT = 60 * 60
+
+
+def _key(order_id):
+    return f'{KEY_PREFIX}:{order_id}'
+
+
+class Waiter:
+    """One subscriber to an order's status changes, bound to its event loop."""
+
+    def __init__(self, order_id, stamp):
+        self.order_id = order_id
+        self.stamp = stamp
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    async def wait(self, timeout):
+        """True if a change was published since the last wait, within `timeout` seconds."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+    def notify(self, stamp):
+        # Only ever called on self.loop
+        self.stamp = stamp
+        self.event.set()
+
+
+_lock = threading.Lock()
+_waiters = {}   # order id -> set of Waiters, across every loop in the process
+_watchers = {}  # event loop -> its watcher task
+
+
+@asynccontextmanager
+async def subscribe(order_id):
+    """
+    async with subscribe(order.pk) as waiter: ... await waiter.wait(timeout)
+    Subscribe before reading the order, so no change can slip in between.
+    """
+    waiter = Waiter(order_id, await cache.aget(_key(order_id)))
+    with _lock:
+        _waiters.setdefault(order_id, set()).add(waiter)
+        task = _watchers.get(waiter.loop)
+        if task is None or task.done():
+            _watchers[waiter.loop] = waiter.loop.create_task(_watch(waiter.loop))
+    try:
+        yield waiter
+    finally:
+        with _lock:
+            waiters = _waiters.get(order_id, set())
+            waiters.discard(waiter)
+            if not waiters:
+                _waiters.pop(order_id, None)
+
+
+async def _watch(loop):
+    """Wakes this loop's waiters for changes published by other workers."""
+    while True:
+        await asyncio.sleep(CHECK_INTERVAL)
+        with _lock:
+            watched = {
+                order_id: [waiter for waiter in waiters if waiter.loop is loop]
+                for order_id, waiters in _waiters.items()
+            }
+            watched = {order_id: waiters for order_id, waiters in watched.items() if waiters}
+            if not watched:
+                _watchers.pop(loop, None)
+                return
+        stamps = await cache.aget_many([_key(order_id) for order_id in watched])
+        for order_id, waiters in watched.items():
+            stamp = stamps.get(_key(order_id))
+            for waiter in waiters:
+                if stamp != waiter.stamp:
+                    waiter.notify(stamp)
+
+
+def publish_order_status(order_id):
+    """Tell every waiter on the order that its status changed. Call after commit."""
+    stamp = time.time_ns()
+    cache.set(_key(order_id), stamp, STAMP_TIMEOUT)
+    with _lock:
+        waiters = list(_waiters.get(order_id, ()))
+    for waiter in waiters:
+        try:
+            waiter.loop.call_soon_threadsafe(waiter.notify, stamp)
+        except RuntimeError:
+            pass  # its loop has closed, and the request with it
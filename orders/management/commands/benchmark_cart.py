@@ -0,0 +1,95 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from orders.carts import BACKENDS, cache_key, drain_write_behind
+from orders.models import Cart, CartItem
+from store.models import ProductVariant
+
+EMAIL = 'cart-benchmark-{index}@example.invalid'
+
+
+class Command(BaseCommand):
+    help = (
+        'Concurrent add-to-cart load against each cart backend (orders.carts): '
+        '--users shoppers each add --adds items from --threads threads, then the '
+        'write-behind is drained and what reached Cart/CartItem is checked. '
+        'Uses throwaway users, deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--adds', type=int, default=10, help='Add-to-cart calls per user')
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--backend', choices=[*BACKENDS, 'both'], default='both')
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['adds'], options['threads']) < 1:
+            raise CommandError('--users, --adds and --threads must be positive.')
+        variants = list(ProductVariant.objects.filter(product__is_active=True).order_by('pk')[:options['adds']])
+        if not variants:
+            raise CommandError('Needs at least one variant of an active product; import a catalog first.')
+
+        User = get_user_model()
+        emails = [EMAIL.format(index=index) for index in range(options['users'])]
+        User.objects.filter(email__in=emails).delete()
+        users = [User.objects.create_user(email=email) for email in emails]
+        names = list(BACKENDS) if options['backend'] == 'both' else [options['backend']]
+
+        self.stdout.write(
+            f"{len(users)} users x {options['adds']} adds over {len(variants)} variants, {options['threads']} threads"
+        )
+        try:
+            for name in names:
+                self.run(name, users, variants, options['adds'], options['threads'])
+        finally:
+            cache.delete_many([cache_key(user.pk) for user in users])
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished."))
+
+    def run(self, name, users, variants, adds, threads):
+        # Not get_cart_backend(): every thread here shares this process's cache,
+        # so the cache backend needs no REDIS_URL to be measured.
+        backend = BACKENDS[name]()
+        Cart.objects.filter(user__in=users).delete()
+        cache.delete_many([cache_key(user.pk) for user in users])
+        # Interleaved, so concurrent calls hit different users' carts
+        tasks = [(user, variants[index % len(variants)]) for index in range(adds) for user in users]
+
+        def add(task):
+            user, variant = task
+            started = time.perf_counter()
+            try:
+                backend.add(user, variant, 1)
+            except Exception as exc:
+                self.stderr.write(f"⚠️ {name}: {exc}")
+                return None
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        if threads == 1:
+            timings = [add(task) for task in tasks]
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                timings = list(pool.map(add, tasks))
+        elapsed = time.perf_counter() - started
+
+        # Whatever the background write-behind hasn't persisted yet, as at checkout
+        started = time.perf_counter()
+        drain_write_behind()
+        for user in users:
+            backend.flush(user)
+        drained = time.perf_counter() - started
+
+        done = sorted(timing for timing in timings if timing is not None)
+        stored = CartItem.objects.filter(cart__user__in=users).aggregate(total=Sum('quantity'))['total'] or 0
+        p50 = done[len(done) // 2] * 1000 if done else 0
+        p95 = done[min(int(len(done) * 0.95), len(done) - 1)] * 1000 if done else 0
+        self.stdout.write(
+            f"  {name:<9} {len(done) / elapsed:8.0f} adds/s  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  "
+            f"errors {len(timings) - len(done)}  flush {drained * 1000:7.1f} ms  stored {stored}/{len(done)}"
+        )
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.outbox import DispatchError, dispatch_batch, get_sinks, purge_dispatched
+
+
+class Command(BaseCommand):
+    help = (
+        'Delivers pending order/payment outbox events, oldest first and in batches, '
+        'each order\'s events in sequence, to every sink in settings.OUTBOX_SINKS (log, HTTP webhook, file queue). '
+        'A failed batch is retried later with backoff while the rest of the queue '
+        'moves on. Run it from cron, or with --every to keep it running as a worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--every', type=float, metavar='SECONDS', help='Repeat forever, sleeping this long once drained')
+        parser.add_argument('--purge-days', type=int, metavar='DAYS', help='Also delete events dispatched more than DAYS ago')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        sinks = get_sinks()
+        while True:
+            sent = failed = 0
+            while True:
+                try:
+                    count = dispatch_batch(sinks, options['batch_size'])
+                except DispatchError as exc:
+                    # Those events now wait for their retry; carry on with the rest
+                    self.stderr.write(f"⚠️ {exc}")
+                    failed += 1
+                    continue
+                sent += count
+                if not count:
+                    # A short batch can still leave events that waited on an
+                    # earlier one of their order, so stop only once drained
+                    break
+            self.stdout.write(self.style.SUCCESS(f"✅ Dispatched {sent} outbox events."))
+            if failed and not options['every']:
+                raise CommandError(f"{failed} batches not delivered; they will be retried.")
+            if options['purge_days'] is not None:
+                purged = purge_dispatched(options['purge_days'])
+                self.stdout.write(f"Purged {purged} dispatched events.")
+            if not options['every']:
+                return
+            time.sleep(options['every'])
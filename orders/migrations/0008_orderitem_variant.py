@@ -0,0 +1,59 @@
+# Generated by Django 5.2.9 on 2026-10-16 23:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_variants(apps, schema_editor):
+    """
+    Link existing items to their variant by product title + "Size: M" label.
+    Titles that more than one product shares are left unlinked rather than
+    guessed; capture falls back to the old lookup for those.
+    """
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('store', 'Product')
+    ProductVariant = apps.get_model('store', 'ProductVariant')
+
+    titles = set(OrderItem.objects.filter(variant__isnull=True).values_list('product_name', flat=True))
+    if not titles:
+        return
+    product_ids = {}
+    for title, pk in Product.objects.filter(title__in=titles).values_list('title', 'pk'):
+        product_ids[title] = None if title in product_ids else pk
+    variants = {
+        (product_id, size): pk
+        for pk, product_id, size in ProductVariant.objects.filter(
+            product_id__in=[pk for pk in product_ids.values() if pk]
+        ).values_list('pk', 'product_id', 'size')
+    }
+
+    batch = []
+    for item in OrderItem.objects.filter(variant__isnull=True).only('pk', 'product_name', 'variant_label').iterator(chunk_size=1000):
+        label = item.variant_label or ''
+        size = label.split(':', 1)[1].strip() if ':' in label else None
+        variant_id = variants.get((product_ids.get(item.product_name), size))
+        if variant_id:
+            item.variant_id = variant_id
+            batch.append(item)
+        if len(batch) >= 1000:
+            OrderItem.objects.bulk_update(batch, ['variant'])
+            batch = []
+    if batch:
+        OrderItem.objects.bulk_update(batch, ['variant'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_pricing'),
+        ('store', '0015_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='variant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='store.productvariant'),
+        ),
+        migrations.RunPython(backfill_variants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.9 on 2026-10-16 23:23
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    Cart = apps.get_model('orders', 'Cart')
+    CartItem = apps.get_model('orders', 'CartItem')
+    lines = (
+        CartItem.objects.filter(cart=OuterRef('pk'))
+        .order_by()
+        .values('cart')
+        .annotate(
+            line_subtotal=Sum(ExpressionWrapper(
+                (F('variant__product__price') + F('variant__additional_price')) * F('quantity'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )),
+            line_count=Sum('quantity'),
+        )
+    )
+    Cart.objects.update(
+        subtotal=Coalesce(
+            Subquery(lines.values('line_subtotal')),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        item_count=Coalesce(Subquery(lines.values('line_count')), Value(0), output_field=IntegerField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_orderitem_variant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.9 on 2026-10-16 23:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """
+    Before the unique constraints go on: fold every user's extra carts into
+    their oldest one, and duplicate lines for a variant into a single line
+    (quantities added up).
+    """
+    Cart = apps.get_model('orders', 'Cart')
+    CartItem = apps.get_model('orders', 'CartItem')
+
+    touched = set()
+    duplicated_users = (
+        Cart.objects.values('user').annotate(carts=Count('id')).filter(carts__gt=1).values_list('user', flat=True)
+    )
+    for user_id in list(duplicated_users):
+        keep, *extra = Cart.objects.filter(user_id=user_id).order_by('pk')
+        CartItem.objects.filter(cart__in=extra).update(cart=keep)
+        Cart.objects.filter(pk__in=[cart.pk for cart in extra]).delete()
+        touched.add(keep.pk)
+
+    duplicated_lines = (
+        CartItem.objects.values('cart', 'variant').annotate(lines=Count('id')).filter(lines__gt=1)
+    )
+    for row in list(duplicated_lines):
+        keep, *extra = CartItem.objects.filter(cart_id=row['cart'], variant_id=row['variant']).order_by('pk')
+        keep.quantity += sum(item.quantity for item in extra)
+        keep.save(update_fields=['quantity'])
+        CartItem.objects.filter(pk__in=[item.pk for item in extra]).delete()
+        touched.add(row['cart'])
+
+    for cart in Cart.objects.filter(pk__in=touched):
+        items = CartItem.objects.filter(cart=cart).select_related('variant__product')
+        cart.subtotal = sum((item.variant.product.price + item.variant.additional_price) * item.quantity for item in items)
+        cart.item_count = sum(item.quantity for item in items)
+        cart.save(update_fields=['subtotal', 'item_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_cart_totals'),
+        ('store', '0015_stockreservation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cart',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cart', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'variant'), name='cartitem_cart_variant_unique'),
+        ),
+    ]
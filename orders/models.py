@@ -1,15 +1,20 @@
 from django.db import models
 from django.conf import settings
-from store.models import ProductVariant
+from store.models import Coupon, ProductVariant
+from store.pricing import unit_price
 
 # --- CART MODELS (Temporary Basket) ---
 class Cart(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
+    # Denormalized from the items at current prices (see orders.carts / orders.signals)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     @property
     def total_price(self):
+        # Uses the items already loaded by orders.carts.cart_queryset()
         return sum(item.total_price for item in self.items.all())
 
 class CartItem(models.Model):
@@ -17,10 +22,15 @@ class CartItem(models.Model):
     variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'variant'], name='cartitem_cart_variant_unique'),
+        ]
+
     @property
     def price_per_unit(self):
         """Calculate price per unit (product price + variant additional price)"""
-        return self.variant.product.price + self.variant.additional_price
+        return unit_price(self.variant)
     
     @property
     def total_price(self):
@@ -47,6 +57,10 @@ class Order(models.Model):
     
     # Payment Info
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    coupon = models.ForeignKey(Coupon, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    shipping_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='Pending')
     order_status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, default='Processing')
     
@@ -57,11 +71,18 @@ class Order(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Order history walks a user's orders by (created_at, id), newest first
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.email}"
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
+    variant = models.ForeignKey(ProductVariant, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_items')
     product_name = models.CharField(max_length=255) # Snapshot of name at time of purchase
     variant_label = models.CharField(max_length=255) # e.g. "Size: M, Color: Red"
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -69,3 +90,63 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity} x {self.product_name}"
+
+    @property
+    def size(self):
+        """ "Size: M" -> "M" """
+        if self.variant_label and ":" in self.variant_label:
+            return self.variant_label.split(":", 1)[1].strip()
+        return None
+
+
+# --- COUPON LEDGER ---
+class CouponRedemption(models.Model):
+    """
+    One row per coupon use, written in the same transaction as the
+    Coupon.uses_count increment (see orders.coupons).
+    """
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='redemptions')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='coupon_redemptions')
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='coupon_redemption')
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['coupon', 'user'], name='redemption_coupon_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.coupon} on order #{self.order_id}"
+
+
+# --- OUTBOX (order and payment events for downstream systems) ---
+class OutboxEvent(models.Model):
+    """
+    Written in the same transaction as the state change it describes (see
+    orders.outbox), so an event exists if and only if the change committed.
+    The dispatch_outbox command delivers pending events to the configured sinks,
+    retrying failed ones from next_attempt_at and parking them (failed_at)
+    after OUTBOX_MAX_ATTEMPTS.
+    """
+    topic = models.CharField(max_length=100)  # e.g. "order.paid", "order.status_changed"
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbox_events')
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The dispatcher reads pending events oldest first
+            models.Index(
+                fields=['id'], condition=models.Q(dispatched_at__isnull=True, failed_at__isnull=True),
+                name='outbox_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk}"
@@ -0,0 +1,228 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# A failed event is retried after RETRY_DELAY seconds, doubling with every
+# further failure up to MAX_RETRY_DELAY, and parked once it has failed
+# MAX_ATTEMPTS times.
+MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 10)
+RETRY_DELAY = getattr(settings, 'OUTBOX_RETRY_DELAY', 30)
+MAX_RETRY_DELAY = 60 * 60
+# How long a dispatcher owns the batch it claimed; a batch whose dispatcher
+# died becomes due again after this. Keep it above the sinks' total timeouts.
+CLAIM_TIMEOUT = getattr(settings, 'OUTBOX_CLAIM_TIMEOUT', 300)
+
+# Transactional outbox: state changes record an OutboxEvent in their own
+# transaction (record_event / record_events), and the dispatch_outbox command
+# later delivers pending events, oldest first, in batches, to every sink in
+# settings.OUTBOX_SINKS. Nothing downstream (emails, warehouse sync,
+# analytics) runs inside the request, and an event is only marked dispatched
+# once every sink accepted it. Delivery is at least once: a batch that fails
+# on any sink is retried whole, so consumers dedupe on the event "id".
+# Failed events back off instead of blocking the queue, and after
+# MAX_ATTEMPTS they are parked (failed_at) until requeued from the admin.
+# Events of one order are still delivered in order: a later event waits
+# while an earlier one for the same order is undelivered (in flight, backed
+# off or parked), so a batch carries at most one event per order.
+#
+# Topics:
+#   order.paid            - payment captured (callback, webhook or admin)
+#   order.status_changed  - order_status changed; payload has "from" and "to"
+
+
+def order_payload(order, **extra):
+    return {
+        'order_id': order.pk,
+        'user_id': order.user_id,
+        'payment_status': order.payment_status,
+        'order_status': order.order_status,
+        'total_amount': str(order.total_amount),
+        'razorpay_order_id': order.razorpay_order_id,
+        'razorpay_payment_id': order.razorpay_payment_id,
+        **extra,
+    }
+
+
+def record_event(topic, order, **extra):
+    """Record one event; call inside the transaction that makes the change."""
+    return OutboxEvent.objects.create(topic=topic, order=order, payload=order_payload(order, **extra))
+
+
+def record_events(topic, orders, extra=None):
+    """record_event() for many orders in one INSERT; `extra` maps order pk -> payload additions."""
+    extra = extra or {}
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(topic=topic, order=order, payload=order_payload(order, **extra.get(order.pk, {})))
+        for order in orders
+    ])
+
+
+def message(event):
+    """What sinks receive for one event."""
+    return {
+        'id': event.pk,
+        'topic': event.topic,
+        'created_at': event.created_at.isoformat(),
+        'payload': event.payload,
+    }
+
+
+# --- Sinks: send(messages) delivers a batch or raises ---
+
+class LogSink:
+    """Writes each event to the orders.outbox logger."""
+
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def send(self, messages):
+        for item in messages:
+            logger.log(self.level, "Outbox %s #%s: %s", item['topic'], item['id'], json.dumps(item['payload']))
+
+
+class WebhookSink:
+    """
+    POSTs {"events": [...]} as JSON to `url`. With a `secret`, the body's
+    HMAC-SHA256 hex digest is sent in X-Outbox-Signature.
+    """
+
+    def __init__(self, url, secret='', timeout=10):
+        self.url = url
+        self.secret = secret
+        self.timeout = timeout
+
+    def send(self, messages):
+        body = json.dumps({'events': messages}, cls=DjangoJSONEncoder).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.secret:
+            headers['X-Outbox-Signature'] = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+        response = requests.post(self.url, data=body, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class FileQueueSink:
+    """
+    Drops one JSON file per event into `directory`, named
+    <zero-padded id>-<topic>.json so a consumer can process them in order
+    and delete each when done. Files appear atomically.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def send(self, messages):
+        os.makedirs(self.directory, exist_ok=True)
+        for item in messages:
+            path = os.path.join(self.directory, f"{item['id']:012d}-{item['topic']}.json")
+            partial = f"{path}.{os.getpid()}.tmp"
+            with open(partial, 'w', encoding='utf-8') as handle:
+                json.dump(item, handle, cls=DjangoJSONEncoder)
+            os.replace(partial, path)
+
+
+def get_sinks():
+    return [
+        import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+        for config in getattr(settings, 'OUTBOX_SINKS', [{'BACKEND': 'orders.outbox.LogSink'}])
+    ]
+
+
+# --- Dispatching ---
+
+class DispatchError(Exception):
+    pass
+
+
+def pending_events(now=None):
+    """
+    Events neither dispatched nor parked whose next attempt is due and that
+    have no earlier undelivered event for the same order.
+    """
+    earlier = OutboxEvent.objects.filter(order=OuterRef('order'), pk__lt=OuterRef('pk'), dispatched_at__isnull=True)
+    return OutboxEvent.objects.filter(dispatched_at__isnull=True, failed_at__isnull=True).filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now or timezone.now()),
+        ~Exists(earlier),
+    )
+
+
+def retry_delay(attempts):
+    """Seconds to wait after an event's `attempts`-th failure."""
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def dispatch_batch(sinks, batch_size=100):
+    """
+    Deliver up to `batch_size` of the oldest due events to every sink and
+    mark them dispatched. Returns how many were sent. The batch is claimed
+    first (next_attempt_at set CLAIM_TIMEOUT ahead) in a short transaction
+    that locks pending rows with SKIP LOCKED, so several dispatchers can run
+    side by side and no row lock is held while the sinks are called. On a
+    sink failure the attempt is recorded on the events, which are retried
+    later (or parked after MAX_ATTEMPTS) so the rest of the queue keeps
+    moving, and DispatchError is raised.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(pending_events(now).select_for_update(skip_locked=True).order_by('pk')[:batch_size])
+        if not events:
+            return 0
+        pks = [event.pk for event in events]
+        OutboxEvent.objects.filter(pk__in=pks).update(next_attempt_at=now + timedelta(seconds=CLAIM_TIMEOUT))
+
+    try:
+        messages = [message(event) for event in events]
+        for sink in sinks:
+            sink.send(messages)
+    except Exception as exc:
+        parked = record_failure(events, f'{type(exc).__name__}: {exc}', timezone.now())
+        note = f'; {parked} parked after {MAX_ATTEMPTS} attempts' if parked else ''
+        raise DispatchError(f'{len(events)} events from #{events[0].pk} not delivered: {exc}{note}') from exc
+    OutboxEvent.objects.filter(pk__in=pks).update(
+        attempts=F('attempts') + 1, last_error='', next_attempt_at=None, dispatched_at=timezone.now(),
+    )
+    return len(events)
+
+
+def record_failure(events, error, now):
+    """Count a failed attempt on `events`, scheduling a retry or parking them; returns how many were parked."""
+    by_attempts = {}
+    for event in events:
+        by_attempts.setdefault(event.attempts + 1, []).append(event.pk)
+    parked = 0
+    for attempts, pks in by_attempts.items():
+        batch = OutboxEvent.objects.filter(pk__in=pks)
+        if attempts >= MAX_ATTEMPTS:
+            parked += batch.update(attempts=attempts, last_error=error, next_attempt_at=None, failed_at=now)
+            logger.error("Outbox events %s parked after %s attempts: %s", pks, attempts, error)
+        else:
+            batch.update(
+                attempts=attempts, last_error=error,
+                next_attempt_at=now + timedelta(seconds=retry_delay(attempts)),
+            )
+    return parked
+
+
+def requeue(events):
+    """Make parked or backed-off events due again, with a fresh attempt count."""
+    return events.filter(dispatched_at__isnull=True).update(attempts=0, next_attempt_at=None, failed_at=None)
+
+
+def purge_dispatched(days):
+    """Delete events dispatched more than `days` days ago."""
+    cutoff = timezone.now() - timedelta(days=days)
+    return OutboxEvent.objects.filter(dispatched_at__lt=cutoff).delete()[0]
@@ -1,6 +1,8 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from .models import Cart, CartItem
-from store.models import ProductImage
+from store.serializers import SparseFieldsetMixin
 from .models import Order, OrderItem
 from accounts.models import SavedAddress
 
@@ -11,7 +13,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ("id", "product_name", "variant_label", "price", "quantity")
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
@@ -19,6 +21,9 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = (
             "id",
             "total_amount",
+            "discount_amount",
+            "shipping_amount",
+            "tax_amount",
             "payment_status",
             "order_status",
             "razorpay_order_id",
@@ -28,6 +33,23 @@ class OrderSerializer(serializers.ModelSerializer):
             "phone",
             "items",
         )
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """One order-history row without its items; see UserOrdersView (?summary=1)."""
+    item_count = serializers.IntegerField(read_only=True)
+    first_item_name = serializers.CharField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Order
+        fields = (
+            "id",
+            "total_amount",
+            "payment_status",
+            "order_status",
+            "created_at",
+            "item_count",
+            "first_item_name",
+        )
+
 class CartItemSerializer(serializers.ModelSerializer):
     product_title = serializers.ReadOnlyField(source='variant.product.title')
     product_slug = serializers.ReadOnlyField(source='variant.product.slug')
@@ -41,11 +63,18 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ('id', 'product_title', 'product_slug', 'size', 'variant', 'quantity', 'price', 'subtotal', 'image')
 
     def get_image(self, obj):
-        # Fetch the primary image for the product
-        image = ProductImage.objects.filter(product=obj.variant.product, is_primary=True).first()
-        if image:
-            return image.image.url
-        return None
+        # The primary image comes from the product's ProductCard, loaded with
+        # the item by orders.carts.cart_queryset() (no query per item)
+        try:
+            card = obj.variant.product.card
+        except ObjectDoesNotExist:
+            return None
+        return default_storage.url(card.primary_image) if card.primary_image else None
+
+class CartSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Cart
+        fields = ('id', 'subtotal', 'item_count', 'updated_at')
 
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
@@ -53,7 +82,20 @@ class CartSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Cart
-        fields = ('id', 'user', 'items', 'total_cart_price', 'updated_at')
+        fields = ('id', 'user', 'items', 'total_cart_price', 'subtotal', 'item_count', 'updated_at')
+
+class CartStateSummarySerializer(serializers.Serializer):
+    """Same output as CartSummarySerializer, for a cart held by orders.carts.CacheCartBackend."""
+    id = serializers.IntegerField(allow_null=True)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    item_count = serializers.IntegerField()
+    updated_at = serializers.DateTimeField(allow_null=True)
+
+class CartStateSerializer(CartStateSummarySerializer):
+    """Same output as CartSerializer, for a cart held by orders.carts.CacheCartBackend."""
+    user = serializers.IntegerField()
+    items = CartItemSerializer(many=True)
+    total_cart_price = serializers.DecimalField(max_digits=10, decimal_places=2)
 class SavedAddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = SavedAddress
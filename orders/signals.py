@@ -0,0 +1,32 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from store.models import Product, ProductVariant
+
+from .carts import carts_with_product, refresh_cart_totals
+from .models import Cart, CartItem
+
+# Keeps Cart.subtotal / Cart.item_count in step with the cart's items and
+# their current prices. Bulk deletes (QuerySet.delete()) are skipped here;
+# whoever runs them refreshes the totals once afterwards.
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def update_cart_totals(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, (Cart, QuerySet)):
+        return
+    refresh_cart_totals(Cart.objects.filter(pk=instance.cart_id))
+
+
+@receiver(post_save, sender=Product)
+def reprice_carts_for_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_cart_totals(carts_with_product(instance.pk))
+
+
+@receiver(post_save, sender=ProductVariant)
+def reprice_carts_for_variant(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_cart_totals(Cart.objects.filter(pk__in=CartItem.objects.filter(variant=instance).values('cart_id')))
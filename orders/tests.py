@@ -1,3 +1,683 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import CustomUser
+from store.models import Category, Coupon, Product, ProductImage, ProductVariant, SiteConfig, StockReservation
+
+from .carts import LOCK_TIMEOUT, CacheCartBackend, _executor, cache_key
+from .checks import check_cart_backend
+from .events import publish_order_status, subscribe
+from .outbox import DispatchError, LogSink, WebhookSink, dispatch_batch, message, pending_events, record_event
+from .models import Cart, CartItem, CouponRedemption, Order, OrderItem, OutboxEvent
+
+
+def make_variant(category, index, **kwargs):
+    """Size M of a new 'Kurta <index>' product (sku KRT-<index>) at 1000.00."""
+    product = Product.objects.create(
+        category=category, title=f'Kurta {index}', slug=f'kurta-{index}', sku=f'KRT-{index}',
+        description='Cotton', price='1000.00', country_of_origin='India',
+    )
+    return ProductVariant.objects.create(product=product, size='M', **{'stock': 5, **kwargs})
+
+
+class ShopperTestCase(TestCase):
+    """A signed-in shopper, and `product_count` products with one variant each in self.variants."""
+    product_count = 1
+    variant_options = {}
+
+    def setUp(self):
+        SiteConfig.forget_solo()
+        self.user = CustomUser.objects.create_user(email='buyer@example.com', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Kurtas', slug='kurtas')
+        self.variants = [make_variant(self.category, index, **self.variant_options) for index in range(self.product_count)]
+
+    def add(self, variant, quantity=1):
+        return self.client.post(reverse('add_to_cart'), {'variant_id': variant.pk, 'quantity': quantity}, format='json')
+
+
+class UserOrdersViewTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='buyer@example.com', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        order = Order.objects.create(user=self.user, shipping_address='Hyderabad', phone='9999999999', total_amount='1000.00')
+        OrderItem.objects.create(order=order, product_name='Kurta', variant_label='Size: M', price='1000.00')
+
+    def test_omit_items_skips_the_prefetch(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('user-orders'), {'omit': 'items'})
+        self.assertNotIn('items', response.data['results'][0])
+
+    def test_fields(self):
+        response = self.client.get(reverse('user-orders'), {'fields': 'id,payment_status,items'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'payment_status', 'items'})
+        self.assertEqual(response.data['results'][0]['items'][0]['product_name'], 'Kurta')
+
+    def test_history_is_cursor_paginated_newest_first(self):
+        for index in range(4):
+            Order.objects.create(user=self.user, shipping_address='Pune', phone='1', total_amount=f'{index}.00')
+        ids, url = [], reverse('user-orders') + '?page_size=2&omit=items'
+        while url:
+            response = self.client.get(url)
+            ids += [order['id'] for order in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_summary_mode(self):
+        order = Order.objects.get()
+        OrderItem.objects.create(order=order, product_name='Dupatta', variant_label='Size: Free', price='500.00', quantity=2)
+        Order.objects.create(user=self.user, shipping_address='Pune', phone='1', total_amount='0.00')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('user-orders'), {'summary': '1'})
+        newest, oldest = response.data['results']
+        self.assertEqual((newest['item_count'], newest['first_item_name']), (0, None))
+        self.assertEqual((oldest['item_count'], oldest['first_item_name']), (3, 'Kurta'))
+        self.assertNotIn('items', oldest)
+
+
+
+@mock.patch('orders.views.razorpay_create_order', return_value={'id': 'order_rzp', 'amount': 0, 'currency': 'INR'})
+class CheckoutCouponTests(ShopperTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.coupon = Coupon.objects.create(
+            code='FEST10', discount_type='percentage', value='10.00', usage_limit=1,
+            valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+        )
+
+    def checkout(self, code='fest10', quantity=2):
+        return self.client.post(reverse('checkout'), {
+            'items': [{'sku': 'KRT-0', 'size': 'M', 'quantity': quantity}],
+            'coupon_code': code,
+        }, format='json')
+
+    def test_coupon_is_applied_and_counted(self, create_order):
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        # 2000 - 10% + 100 shipping (below the free threshold) + 18% tax on 1800
+        self.assertEqual(
+            (order.discount_amount, order.shipping_amount, order.tax_amount, order.total_amount),
+            (Decimal('200.00'), Decimal('100.00'), Decimal('324.00'), Decimal('2224.00')),
+        )
+        create_order.assert_called_once_with(Decimal('2224.00'), currency='INR')
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.uses_count, 1)
+        redemption = CouponRedemption.objects.get()
+        self.assertEqual((redemption.user, redemption.order, redemption.discount_amount), (self.user, order, Decimal('200.00')))
+
+    def test_exhausted_coupon_creates_no_order(self, create_order):
+        self.checkout()
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Coupon usage limit exceeded')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_limit_is_rechecked_when_redeeming(self, create_order):
+        # Another checkout took the last use between the check and the redemption
+        with mock.patch('store.pricing.check_coupon', return_value=(self.coupon, Decimal('200.00'))):
+            Coupon.objects.filter(pk=self.coupon.pk).update(uses_count=1)
+            response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Coupon.objects.get(pk=self.coupon.pk).uses_count, 1)
+
+    def test_per_user_limit(self, create_order):
+        Coupon.objects.filter(pk=self.coupon.pk).update(usage_limit=10, per_user_limit=1)
+        self.assertEqual(self.checkout().status_code, 201)
+        response = self.checkout()
+        self.assertEqual(response.data['error'], 'You have already used this coupon')
+
+    def test_per_user_limit_is_rechecked_when_redeeming(self, create_order):
+        Coupon.objects.filter(pk=self.coupon.pk).update(usage_limit=10, per_user_limit=1)
+        self.assertEqual(self.checkout().status_code, 201)
+        # A concurrent checkout by the same shopper passed the read-only check
+        coupon = Coupon.objects.get(pk=self.coupon.pk)
+        with mock.patch('store.pricing.check_coupon', return_value=(coupon, Decimal('200.00'))):
+            response = self.checkout()
+        self.assertEqual((response.status_code, response.data['error']), (400, 'You have already used this coupon'))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Coupon.objects.get(pk=self.coupon.pk).uses_count, 1)
+
+    def test_expired_holds_give_back_unpaid_coupon_uses(self, create_order):
+        Coupon.objects.filter(pk=self.coupon.pk).update(usage_limit=2)
+        self.checkout(quantity=1)
+        self.checkout(quantity=1)
+        paid, unpaid = Order.objects.order_by('pk')
+        Order.objects.filter(pk=paid.pk).update(payment_status='Paid')
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        out = StringIO()
+        call_command('release_expired_reservations', stdout=out)
+        self.assertIn('Released 2 expired stock reservations and 1 coupon uses', out.getvalue())
+        self.assertEqual(Coupon.objects.get(pk=self.coupon.pk).uses_count, 1)
+        self.assertEqual(list(CouponRedemption.objects.values_list('order', flat=True)), [paid.pk])
+        self.assertEqual(self.checkout(quantity=1).status_code, 201)
+
+    def test_gateway_failure_releases_the_coupon(self, create_order):
+        create_order.side_effect = RuntimeError('gateway down')
+        self.assertEqual(self.checkout().status_code, 502)
+        self.assertEqual(Coupon.objects.get(pk=self.coupon.pk).uses_count, 0)
+        self.assertFalse(CouponRedemption.objects.exists())
+
+
+@mock.patch('orders.views.razorpay_create_order', return_value={'id': 'order_rzp', 'amount': 0, 'currency': 'INR'})
+class CheckoutQueryCountTests(ShopperTestCase):
+    product_count = 15
+
+    def setUp(self):
+        super().setUp()
+        # Keep the warmed SiteConfig copy for the whole test
+        patcher = mock.patch('store.models.cache_is_shared', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def checkout(self, lines):
+        items = [{'sku': f'KRT-{index}', 'size': 'M', 'quantity': 1} for index in range(lines)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('checkout'), {'items': items}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_the_cart(self, create_order):
+        self.checkout(1)  # warm SiteConfig.get_solo()
+        self.assertEqual(self.checkout(1), self.checkout(15))
+        order = Order.objects.latest('id')
+        self.assertEqual(order.items.count(), 15)
+        self.assertEqual(order.razorpay_order_id, 'order_rzp')
+
+
+@mock.patch('orders.views.razorpay_create_order', return_value={'id': 'order_rzp', 'amount': 0, 'currency': 'INR'})
+class StockReservationTests(ShopperTestCase):
+    variant_options = {'stock': 3}
+
+    def setUp(self):
+        super().setUp()
+        [self.variant] = self.variants
+
+    def checkout(self, email, quantity):
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create_user(email=email, password='pw'))
+        return client.post(reverse('checkout'), {
+            'items': [{'sku': 'KRT-0', 'size': 'M', 'quantity': quantity}],
+        }, format='json')
+
+    def test_checkout_holds_stock_until_it_expires(self, create_order):
+        self.assertEqual(self.checkout('a@example.com', 2).status_code, 201)
+        hold = StockReservation.objects.get()
+        self.assertEqual((hold.variant, hold.quantity), (self.variant, 2))
+
+        response = self.checkout('b@example.com', 2)
+        self.assertEqual((response.status_code, response.data['error']), (400, 'Not enough stock for Kurta 0 (M)'))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.checkout('c@example.com', 1).status_code, 201)
+
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.checkout('d@example.com', 3).status_code, 201)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 3)  # held, not deducted
+
+        out = StringIO()
+        call_command('release_expired_reservations', '--batch-size', '1', stdout=out)
+        self.assertIn('Released 2', out.getvalue())
+        self.assertEqual(StockReservation.objects.get().quantity, 3)
+
+    def test_gateway_failure_releases_the_hold(self, create_order):
+        create_order.side_effect = RuntimeError('gateway down')
+        self.assertEqual(self.checkout('a@example.com', 3).status_code, 502)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class CartViewTests(ShopperTestCase):
+    product_count = 6
+    variant_options = {'additional_price': '50.00'}
+
+    def setUp(self):
+        super().setUp()
+        for index, variant in enumerate(self.variants):
+            ProductImage.objects.create(product=variant.product, image=f'products/{index}.jpg', is_primary=True)
+
+    def test_cart_query_count_does_not_grow_with_items(self):
+        self.add(self.variants[0])
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('my_cart'))
+        self.assertEqual(response.data['items'][0]['image'], '/media/products/0.jpg')
+
+        for variant in self.variants[1:]:
+            self.add(variant, 2)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('my_cart'))
+        self.assertEqual(len(response.data['items']), 6)
+        self.assertEqual(response.data['total_cart_price'], '11550.00')
+
+    def test_totals_follow_items_and_prices(self):
+        self.add(self.variants[0], 2)
+        response = self.add(self.variants[1])
+        self.assertEqual((response.data['subtotal'], response.data['item_count']), ('3150.00', 3))
+
+        product = self.variants[0].product
+        product.price = '500.00'
+        product.save()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cart_summary'))
+        self.assertEqual((response.data['subtotal'], response.data['item_count']), ('2150.00', 3))
+
+        response = self.client.delete(reverse('remove_cart_item', args=[self.variants[1].pk]))
+        self.assertEqual((response.data['subtotal'], response.data['item_count']), ('1100.00', 2))
+        self.assertEqual(response.data['total_cart_price'], '1100.00')
+
+    def test_one_cart_per_user(self):
+        self.add(self.variants[0])
+        self.add(self.variants[0], 2)
+        self.assertEqual(CartItem.objects.get().quantity, 3)
+        with self.assertRaises(IntegrityError):
+            Cart.objects.create(user=self.user)
+
+    def batch(self, *operations):
+        return self.client.post(reverse('cart_batch'), {'operations': list(operations)}, format='json')
+
+    def test_batch_applies_every_operation_in_constant_queries(self):
+        for variant, quantity in zip(self.variants, (3, 1, 1)):
+            self.add(variant, quantity)
+
+        def count(operations):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.batch(*operations)
+            self.assertEqual(response.status_code, 200)
+            return len(queries), response
+
+        few, _ = count([{'op': 'update', 'variant_id': self.variants[2].pk, 'quantity': 0}])
+        many, response = count(
+            [{'op': 'add', 'variant_id': variant.pk, 'quantity': 1} for variant in self.variants[3:]]
+            + [
+                {'op': 'update', 'variant_id': self.variants[0].pk, 'quantity': 1},
+                {'op': 'remove', 'variant_id': self.variants[1].pk},
+            ]
+        )
+        self.assertEqual(few, many)
+        self.assertEqual(
+            [(item['variant'], item['quantity']) for item in response.data['items']],
+            [(self.variants[0].pk, 1)] + [(variant.pk, 1) for variant in self.variants[3:]],
+        )
+        self.assertEqual((response.data['subtotal'], response.data['item_count']), ('4200.00', 4))
+
+    def test_batch_is_all_or_nothing(self):
+        response = self.batch(
+            {'op': 'add', 'variant_id': self.variants[0].pk, 'quantity': 2},
+            {'op': 'add', 'variant_id': self.variants[1].pk, 'quantity': 4},
+            {'op': 'add', 'variant_id': self.variants[1].pk, 'quantity': 2},
+        )
+        self.assertEqual((response.status_code, response.data['error']), (400, 'Not enough stock for Kurta 1 (M)'))
+        self.assertFalse(CartItem.objects.exists())
+
+        response = self.batch({'op': 'update', 'variant_id': self.variants[0].pk})
+        self.assertEqual(response.data['error'], "'update' needs an integer 'variant_id' and 'quantity'")
+        response = self.batch({'op': 'add', 'variant_id': 999})
+        self.assertEqual(response.data['error'], 'Unknown product variant: 999')
+
+
+@override_settings(CART_BACKEND='cache', CART_WRITE_BEHIND_ASYNC=False)
+@mock.patch('orders.views.razorpay_create_order', return_value={'id': 'order_rzp', 'amount': 0, 'currency': 'INR'})
+class CacheCartBackendTests(ShopperTestCase):
+    product_count = 3
+    variant_options = {'additional_price': '50.00'}
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # The test cache is LocMemCache, shared by everything in this process
+        patcher = mock.patch('orders.checks.cache_is_shared', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cart_is_served_from_the_cache_and_written_behind(self, create_order):
+        self.add(self.variants[0], 2)
+        response = self.add(self.variants[1])
+        self.assertEqual((response.data['subtotal'], response.data['item_count']), ('3150.00', 3))
+        self.assertEqual([item['id'] for item in response.data['items']], [self.variants[0].pk, self.variants[1].pk])
+        self.assertEqual(
+            sorted(CartItem.objects.values_list('variant_id', 'quantity')),
+            [(self.variants[0].pk, 2), (self.variants[1].pk, 1)],
+        )
+        self.assertEqual(Cart.objects.get(user=self.user).subtotal, Decimal('3150.00'))
+
+        with self.assertNumQueries(1):  # the variants; the cart itself comes from the cache
+            response = self.client.get(reverse('my_cart'))
+        self.assertEqual(response.data['total_cart_price'], '3150.00')
+        self.assertEqual(response.data['id'], Cart.objects.get().pk)
+
+        response = self.client.delete(reverse('remove_cart_item', args=[self.variants[0].pk]))
+        self.assertEqual((response.data['subtotal'], response.data['item_count']), ('1050.00', 1))
+        self.assertEqual(list(CartItem.objects.values_list('variant_id', flat=True)), [self.variants[1].pk])
+        self.assertEqual(self.client.delete(reverse('remove_cart_item', args=[self.variants[0].pk])).status_code, 404)
+
+    def test_batch(self, create_order):
+        self.add(self.variants[0], 2)
+        response = self.client.post(reverse('cart_batch'), {'operations': [
+            {'op': 'add', 'variant_id': self.variants[1].pk, 'quantity': 2},
+            {'op': 'update', 'variant_id': self.variants[0].pk, 'quantity': 5},
+        ]}, format='json')
+        self.assertEqual((response.data['subtotal'], response.data['item_count']), ('7350.00', 7))
+        self.assertEqual(
+            sorted(CartItem.objects.values_list('variant_id', 'quantity')),
+            [(self.variants[0].pk, 5), (self.variants[1].pk, 2)],
+        )
+        response = self.client.post(reverse('cart_batch'), {'operations': [
+            {'op': 'remove', 'variant_id': self.variants[0].pk},
+            {'op': 'add', 'variant_id': self.variants[1].pk, 'quantity': 4},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('cart_summary')).data['item_count'], 7)
+
+    def test_cache_miss_reloads_the_stored_cart(self, create_order):
+        self.add(self.variants[2], 2)
+        cache.clear()
+        response = self.client.get(reverse('cart_summary'))
+        self.assertEqual((response.data['subtotal'], response.data['item_count']), ('2100.00', 2))
+
+    @override_settings(CART_WRITE_BEHIND_ASYNC=True)
+    def test_changes_are_flushed_once_per_burst_and_at_checkout(self, create_order):
+        with mock.patch.object(_executor, 'submit') as submit:
+            self.add(self.variants[0])
+            self.add(self.variants[1], 2)
+            submit.assert_called_once()
+            self.assertFalse(CartItem.objects.exists())
+
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('checkout'), {}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted(Order.objects.get().items.values_list('variant_id', 'quantity')),
+            [(self.variants[0].pk, 1), (self.variants[1].pk, 2)],
+        )
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.client.get(reverse('cart_summary')).data['item_count'], 0)
+
+    def test_needs_a_shared_cache(self, create_order):
+        self.assertEqual(check_cart_backend(None), [])
+        with mock.patch('orders.checks.cache_is_shared', return_value=False):
+            [error] = check_cart_backend(None)
+        self.assertEqual(error.id, 'orders.E001')
+        self.assertIn('LocMemCache is per process', error.msg)
+        with override_settings(CART_BACKEND='redis'):
+            self.assertEqual([error.id for error in check_cart_backend(None)], ['orders.E002'])
+
+    def test_lock_is_only_released_by_its_holder(self, create_order):
+        backend = CacheCartBackend()
+        key = cache_key(self.user.pk, 'lock')
+        with backend._locked(self.user.pk):
+            # The holder overran LOCK_TIMEOUT and another worker took the lock
+            cache.set(key, 'other', LOCK_TIMEOUT)
+        self.assertEqual(cache.get(key), 'other')
+        with mock.patch('orders.carts.LOCK_WAIT', 0.02):
+            self.assertEqual(self.add(self.variants[0]).status_code, 503)
+        cache.delete(key)
+        self.assertEqual(self.add(self.variants[0]).status_code, 200)
+
+    def test_write_behind_persists_outside_the_cart_lock(self, create_order):
+        self.add(self.variants[0])
+        lock = cache_key(self.user.pk, 'lock')
+        held = []
+        with mock.patch('orders.carts.persist_lines', side_effect=lambda *args: held.append(cache.get(lock)) or 1):
+            CacheCartBackend().write_behind(self.user.pk)
+        self.assertEqual(held, [None])
+
+    def test_benchmark_command(self, create_order):
+        out = StringIO()
+        call_command('benchmark_cart', '--users', '2', '--adds', '3', '--threads', '1', stdout=out)
+        self.assertIn('stored 6/6', out.getvalue())
+        self.assertEqual(out.getvalue().count('stored 6/6'), 2)
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+
+@override_settings(ORDER_STATUS_KEEPALIVE=0.05, ORDER_STATUS_STREAM_TIMEOUT=5)
+class OrderStatusStreamTests(ShopperTestCase):
+    product_count = 0
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.order = Order.objects.create(
+            user=self.user, shipping_address='Hyderabad', phone='9999999999',
+            total_amount='1000.00', razorpay_order_id='order_rzp',
+        )
+        self.url = reverse('order-status-stream', args=[self.order.pk])
+        self.token = str(AccessToken.for_user(self.user))
+        # Streams close their connection after each read; this one holds the test transaction
+        patcher = mock.patch('orders.views.connection')
+        self.connection = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.stream_token = self.client.post(reverse('order-status-stream-token', args=[self.order.pk])).data['token']
+
+    async def test_stream_pushes_the_captured_payment(self):
+        response = await self.async_client.get(self.url, {'token': self.stream_token})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertIn('"payment_status": "Pending"', (await anext(chunks)).decode())
+        self.assertEqual(await anext(chunks), b': keepalive\n\n')
+
+        await Order.objects.filter(pk=self.order.pk).aupdate(payment_status='Paid', razorpay_payment_id='pay_1')
+        publish_order_status(self.order.pk)
+        rest = [chunk.decode() async for chunk in chunks]
+        self.assertTrue(rest[-1].startswith('event: status\n'))
+        self.assertIn('"payment_status": "Paid"', rest[-1])
+        self.assertEqual(set(rest[:-1]), {': keepalive\n\n'} if rest[:-1] else set())
+        # Closed after each read, so waiting holds no database connection
+        self.assertEqual(self.connection.close.call_count, 2)
+
+    async def test_authentication(self):
+        response = await self.async_client.get(self.url, headers={'authorization': f'Bearer {self.token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await self.async_client.get(self.url)).status_code, 401)
+        self.assertEqual((await self.async_client.get(self.url, {'token': 'garbage'})).status_code, 401)
+        # The access JWT is never accepted in the query string
+        self.assertEqual((await self.async_client.get(self.url, {'token': self.token})).status_code, 401)
+        other_order = await Order.objects.acreate(user=self.user, shipping_address='Pune', phone='1', total_amount='1.00')
+        other_url = reverse('order-status-stream', args=[other_order.pk])
+        self.assertEqual((await self.async_client.get(other_url, {'token': self.stream_token})).status_code, 401)
+        with override_settings(ORDER_STATUS_STREAM_TOKEN_TTL=-1):
+            self.assertEqual((await self.async_client.get(self.url, {'token': self.stream_token})).status_code, 401)
+        stranger = await CustomUser.objects.acreate(email='other@example.com')
+        response = await self.async_client.get(self.url, headers={'authorization': f'Bearer {AccessToken.for_user(stranger)}'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_stream_tokens_are_only_issued_for_own_orders(self):
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create_user(email='other@example.com', password='pw'))
+        self.assertEqual(client.post(reverse('order-status-stream-token', args=[self.order.pk])).status_code, 404)
+
+    def test_not_streamed_under_wsgi(self):
+        response = self.client.get(self.url, {'token': self.stream_token})
+        self.assertEqual(response.status_code, 501)
+
+    def test_status_updates_are_published(self):
+        Order.objects.filter(pk=self.order.pk).update(payment_status='Paid')
+        self.user.is_staff = True
+        self.user.save()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch('orders.views.publish_order_status') as publish, self.captureOnCommitCallbacks(execute=True):
+            client.patch(reverse('update-order-status', args=[self.order.pk]), {'order_status': 'Shipped'}, format='json')
+        publish.assert_called_once_with(self.order.pk)
+
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        with mock.patch('orders.admin.publish_order_status') as publish, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:orders_order_changelist'), {
+                'action': 'mark_as_delivered', '_selected_action': [self.order.pk],
+            })
+        publish.assert_called_once_with(self.order.pk)
+
+    async def test_changes_published_by_other_workers_arrive_through_the_cache(self):
+        with mock.patch('orders.events.CHECK_INTERVAL', 0.01):
+            async with subscribe(self.order.pk) as waiter:
+                self.assertFalse(await waiter.wait(0.05))
+                await cache.aset(f'order-status:{self.order.pk}', 1)
+                self.assertTrue(await waiter.wait(1))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_superuser(email='admin@example.com', password='pw')
+        self.orders = [
+            Order.objects.create(
+                user=self.staff, shipping_address='Hyderabad', phone='9999999999',
+                total_amount='1000.00', payment_status='Paid',
+            )
+            for _ in range(3)
+        ]
+
+    def test_status_changes_are_recorded_with_the_change(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        url = reverse('update-order-status', args=[self.orders[0].pk])
+        self.assertEqual(client.patch(url, {'order_status': 'Shipped'}, format='json').status_code, 200)
+        client.patch(url, {'order_status': 'Shipped'}, format='json')  # no change, no event
+        client.patch(url, {'order_status': 'Lost'}, format='json')
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.topic, event.order, event.payload['from'], event.payload['to']), (
+            'order.status_changed', self.orders[0], 'Processing', 'Shipped',
+        ))
+
+    def test_admin_bulk_action(self):
+        self.orders[0].order_status = 'Delivered'
+        self.orders[0].save()
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse('admin:orders_order_changelist'), {
+            'action': 'mark_as_delivered', '_selected_action': [order.pk for order in self.orders],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(Order.objects.values_list('order_status', flat=True).distinct()), ['Delivered'])
+        self.assertEqual(
+            sorted(OutboxEvent.objects.values_list('order_id', flat=True)),
+            [order.pk for order in self.orders[1:]],
+        )
+        self.assertEqual(OutboxEvent.objects.first().payload['order_status'], 'Delivered')
+
+    def test_dispatch_delivers_in_batches_and_keeps_failed_events(self):
+        for order in self.orders:
+            record_event('order.paid', order)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        sinks = [
+            {'BACKEND': 'orders.outbox.LogSink'},
+            {'BACKEND': 'orders.outbox.FileQueueSink', 'OPTIONS': {'directory': directory}},
+        ]
+        err = StringIO()
+        with override_settings(OUTBOX_SINKS=sinks), mock.patch('orders.outbox.FileQueueSink.send', side_effect=OSError('disk full')):
+            with self.assertRaisesMessage(CommandError, '2 batches not delivered'):
+                call_command('dispatch_outbox', '--batch-size', '2', stdout=StringIO(), stderr=err)
+        self.assertIn('disk full', err.getvalue())
+        self.assertEqual(list(OutboxEvent.objects.order_by('pk').values_list('attempts', flat=True)), [1, 1, 1])
+        self.assertFalse(OutboxEvent.objects.exclude(dispatched_at=None).exists())
+        self.assertFalse(OutboxEvent.objects.filter(next_attempt_at__lte=timezone.now()).exists())
+
+        OutboxEvent.objects.update(next_attempt_at=timezone.now())  # their retry is due
+        out = StringIO()
+        with override_settings(OUTBOX_SINKS=sinks), self.assertLogs('orders.outbox') as logs:
+            call_command('dispatch_outbox', '--batch-size', '2', stdout=out)
+        self.assertIn('Dispatched 3', out.getvalue())
+        self.assertEqual(len(logs.records), 3)
+        self.assertFalse(OutboxEvent.objects.filter(dispatched_at=None).exists())
+        names = sorted(os.listdir(directory))
+        self.assertEqual(len(names), 3)
+        with open(os.path.join(directory, names[0])) as handle:
+            message = json.load(handle)
+        self.assertEqual((message['topic'], message['payload']['order_id']), ('order.paid', self.orders[0].pk))
+
+    def test_failing_events_back_off_and_are_parked(self):
+        poison, healthy = [record_event('order.paid', order) for order in self.orders[:2]]
+
+        def send(messages):
+            if any(item['id'] == poison.pk for item in messages):
+                raise ValueError('rejected')
+
+        sinks = [{'BACKEND': 'orders.outbox.LogSink'}]
+        with override_settings(OUTBOX_SINKS=sinks), mock.patch('orders.outbox.LogSink.send', side_effect=send):
+            with self.assertRaises(CommandError):
+                call_command('dispatch_outbox', '--batch-size', '1', stdout=StringIO(), stderr=StringIO())
+            healthy.refresh_from_db()
+            self.assertIsNotNone(healthy.dispatched_at)  # not stuck behind the failing event
+
+            with mock.patch('orders.outbox.MAX_ATTEMPTS', 3), self.assertLogs('orders.outbox', 'ERROR'):
+                for _ in range(2):
+                    OutboxEvent.objects.filter(pk=poison.pk).update(next_attempt_at=timezone.now())
+                    with self.assertRaises(CommandError):
+                        call_command('dispatch_outbox', stdout=StringIO(), stderr=StringIO())
+        poison.refresh_from_db()
+        self.assertEqual((poison.attempts, poison.last_error, poison.dispatched_at), (3, 'ValueError: rejected', None))
+        self.assertIsNotNone(poison.failed_at)
+        call_command('dispatch_outbox', stdout=StringIO())  # parked events are left alone
+
+        self.client.force_login(self.staff)
+        self.client.post(reverse('admin:orders_outboxevent_changelist'), {
+            'action': 'retry_events', '_selected_action': [poison.pk],
+        })
+        poison.refresh_from_db()
+        self.assertEqual((poison.attempts, poison.failed_at), (0, None))
+
+    def test_batch_is_claimed_before_the_sinks_run(self):
+        event = record_event('order.paid', self.orders[0])
+
+        def send(messages):
+            claimed = OutboxEvent.objects.get(pk=event.pk)
+            self.assertGreater(claimed.next_attempt_at, timezone.now())
+            self.assertFalse(pending_events().exists())  # another dispatcher skips it
+
+        with mock.patch('orders.outbox.LogSink.send', side_effect=send) as sent:
+            self.assertEqual(dispatch_batch([LogSink()]), 1)
+        sent.assert_called_once()
+        event.refresh_from_db()
+        self.assertEqual((event.attempts, event.next_attempt_at), (1, None))
+
+    def test_later_events_of_an_order_wait_for_earlier_ones(self):
+        paid = record_event('order.paid', self.orders[0])
+        shipped = record_event('order.status_changed', self.orders[0], **{'from': 'Processing', 'to': 'Shipped'})
+        other = record_event('order.paid', self.orders[1])
+        with mock.patch('orders.outbox.LogSink.send', side_effect=ValueError('rejected')):
+            with self.assertRaises(DispatchError):
+                dispatch_batch([LogSink()], batch_size=1)
+
+        with mock.patch('orders.outbox.LogSink.send') as send:
+            self.assertEqual(dispatch_batch([LogSink()]), 1)
+        self.assertEqual([item['id'] for item in send.call_args.args[0]], [other.pk])
+
+        OutboxEvent.objects.filter(pk=paid.pk).update(next_attempt_at=timezone.now())
+        with mock.patch('orders.outbox.LogSink.send') as send:
+            call_command('dispatch_outbox', stdout=StringIO())
+        self.assertEqual([call.args[0][0]['id'] for call in send.call_args_list], [paid.pk, shipped.pk])
+
+    @mock.patch('orders.outbox.requests.post')
+    def test_webhook_sink_signs_the_batch(self, post):
+        record_event('order.paid', self.orders[0])
+        WebhookSink('https://hooks.example.com/orders', secret='s3cret').send(
+            [message(event) for event in OutboxEvent.objects.all()]
+        )
+        body = post.call_args.kwargs['data']
+        self.assertEqual(json.loads(body)['events'][0]['topic'], 'order.paid')
+        self.assertEqual(
+            post.call_args.kwargs['headers']['X-Outbox-Signature'],
+            hmac.new(b's3cret', body, hashlib.sha256).hexdigest(),
+        )
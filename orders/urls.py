@@ -1,13 +1,17 @@
 from django.urls import path
-from .views import CartView, AddToCartView, RemoveCartItemView, CheckoutView # Import CheckoutView
-from .views import UserOrdersView, order_status, update_order_status
+from .views import CartView, CartSummaryView, AddToCartView, RemoveCartItemView, CartBatchView, CheckoutView # Import CheckoutView
+from .views import UserOrdersView, order_status, order_status_stream, order_status_stream_token, update_order_status
 from .views import SavedAddressListCreateView, SavedAddressDetailView
 urlpatterns = [
     path('cart/', CartView.as_view(), name='my_cart'),
+    path('cart/summary/', CartSummaryView.as_view(), name='cart_summary'),
     path('cart/add/', AddToCartView.as_view(), name='add_to_cart'),
-    path('cart/remove/<int:pk>/', RemoveCartItemView.as_view(), name='remove_cart_item'),
+    path('cart/remove/<int:variant_id>/', RemoveCartItemView.as_view(), name='remove_cart_item'),
+    path('cart/batch/', CartBatchView.as_view(), name='cart_batch'),
      path("", UserOrdersView.as_view(), name="user-orders"),          # GET /orders/
     path("<int:pk>/status/", order_status, name="order-status"),     # GET /orders/<id>/status/
+    path("<int:pk>/status/stream/", order_status_stream, name="order-status-stream"),  # GET /orders/<id>/status/stream/ (SSE)
+    path("<int:pk>/status/stream-token/", order_status_stream_token, name="order-status-stream-token"),  # POST /orders/<id>/status/stream-token/
     path("<int:pk>/update-status/", update_order_status, name="update-order-status"),  # PATCH /orders/<id>/update-status/
     
     # New Checkout URL
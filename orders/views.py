@@ -1,17 +1,35 @@
-from decimal import Decimal
+import json
+import time
 
+from asgiref.sync import sync_to_async
 from rest_framework import generics, status, views,permissions
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from .models import Order
 from django.shortcuts import get_object_or_404
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view, permission_classes
-
-from .models import Cart, CartItem, Order, OrderItem
-from .serializers import CartSerializer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .coupons import redeem_coupon, release_coupon
+from .models import Cart, Order, OrderItem
+from .carts import get_cart_backend, parse_operation
+from .events import publish_order_status, subscribe
+from .outbox import record_event
+from store.coupons import CouponError
+from store.pricing import PricingError, cart_lines, quote, resolve_lines
+from store.reservations import InsufficientStock, release_reservations, reserve, with_available
 from store.models import ProductVariant
-from .serializers import OrderSerializer
+from store.pagination import KeysetPagination
+from .serializers import OrderSerializer, OrderSummarySerializer
 from payments.razorpay_client import create_order as razorpay_create_order
 
 from accounts.models import SavedAddress
@@ -19,11 +37,49 @@ from .serializers import SavedAddressSerializer
 
 
 class UserOrdersView(generics.ListAPIView):
+    """
+    GET /api/orders/ -> the user's orders, newest first, a page at a time
+    (?cursor=, ?page_size=; see store.pagination.KeysetPagination).
+    ?summary=1 returns each order's item count and first item name instead
+    of its items, in one query per page.
+    """
     permission_classes = [permissions.IsAuthenticated]
-    serializer_class = OrderSerializer
+    # Ordering (-created_at, -id) is applied by the paginator
+    pagination_class = KeysetPagination
+
+    def is_summary(self):
+        return self.request.query_params.get("summary") in ("1", "true")
+
+    def get_serializer_class(self):
+        return OrderSummarySerializer if self.is_summary() else OrderSerializer
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related("items").order_by("-created_at")
+        queryset = Order.objects.filter(user=self.request.user)
+        if self.is_summary():
+            items = OrderItem.objects.filter(order=OuterRef("pk")).order_by()
+            return queryset.only("id", "total_amount", "payment_status", "order_status", "created_at").annotate(
+                item_count=Coalesce(
+                    Subquery(items.values("order").annotate(total=Sum("quantity")).values("total")),
+                    Value(0),
+                ),
+                first_item_name=Subquery(items.order_by("pk").values("product_name")[:1]),
+            )
+        # ?fields= / ?omit= also decide whether the items are prefetched at all;
+        # created_at is the keyset pagination cursor
+        return OrderSerializer.optimize_queryset(queryset, self.request, always=("created_at",))
+
+
+STATUS_FIELDS = ("id", "payment_status", "order_status", "razorpay_order_id", "razorpay_payment_id")
+
+
+def status_data(order):
+    return {
+        "order_id": order.id,
+        "payment_status": order.payment_status,
+        "order_status": order.order_status,
+        "razorpay_order_id": order.razorpay_order_id,
+        "razorpay_payment_id": order.razorpay_payment_id,
+    }
 
 
 @api_view(["GET"])
@@ -31,19 +87,125 @@ class UserOrdersView(generics.ListAPIView):
 def order_status(request, pk):
     """
     GET /orders/<pk>/status/  -> returns simple status data used by frontend polling
+    (prefer order_status_stream below, which pushes the change instead)
     """
     try:
-        order = Order.objects.prefetch_related("items").get(pk=pk, user=request.user)
+        order = Order.objects.only(*STATUS_FIELDS).get(pk=pk, user=request.user)
     except Order.DoesNotExist:
         return Response({"detail": "Not found"}, status=404)
 
-    return Response({
-        "order_id": order.id,
-        "payment_status": order.payment_status,
-        "order_status": order.order_status,
-        "razorpay_order_id": order.razorpay_order_id,
-        "razorpay_payment_id": order.razorpay_payment_id,
-    })
+    return Response(status_data(order))
+
+
+STREAM_TOKEN_SALT = "orders.order-status-stream"
+
+
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+def order_status_stream_token(request, pk):
+    """
+    POST /orders/<pk>/status/stream-token/  -> {"token", "expires_in"}: a
+    signed token that only opens this order's status stream, for ?token=
+    (a browser EventSource can't set headers, and query strings end up in
+    access logs, so the access JWT never goes there).
+    """
+    get_object_or_404(Order.objects.only("pk"), pk=pk, user=request.user)
+    token = signing.TimestampSigner(salt=STREAM_TOKEN_SALT).sign(f"{request.user.pk}:{pk}")
+    return Response({"token": token, "expires_in": settings.ORDER_STATUS_STREAM_TOKEN_TTL})
+
+
+def stream_user(request, order_id):
+    """
+    The user of a JWT access token from the Authorization header, or of an
+    unexpired order_status_stream_token for this order in ?token=; None if
+    neither is valid.
+    """
+    raw_token = request.GET.get("token")
+    if raw_token:
+        try:
+            value = signing.TimestampSigner(salt=STREAM_TOKEN_SALT).unsign(
+                raw_token, max_age=settings.ORDER_STATUS_STREAM_TOKEN_TTL,
+            )
+        except signing.BadSignature:
+            return None
+        user_id, _, token_order_id = value.partition(":")
+        if token_order_id != str(order_id):
+            return None
+        return get_user_model().objects.filter(pk=user_id, is_active=True).first()
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+async def order_status_stream(request, pk):
+    """
+    GET /orders/<pk>/status/stream/  -> text/event-stream of "status" events
+    (the order_status data): one right away, then one each time a change to
+    the order commits. Ends once the order is Paid, or after
+    ORDER_STATUS_STREAM_TIMEOUT seconds; EventSource then reconnects by itself
+    (with a fresh stream token once the old one has expired).
+
+    Waiting is notified through orders.events, not by re-reading the order,
+    so under ASGI (core.asgi) a worker holds thousands of idle streams. Under
+    WSGI the whole stream would be buffered before anything is sent, so it
+    answers 501 and clients poll order_status instead.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"detail": "Status streaming needs the ASGI server; poll /api/orders/<id>/status/ instead."},
+            status=501,
+        )
+    user = await sync_to_async(stream_user)(request, pk)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    if not await Order.objects.filter(pk=pk, user=user).aexists():
+        return JsonResponse({"detail": "Not found"}, status=404)
+    return StreamingHttpResponse(
+        status_events(pk),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@sync_to_async
+def read_status(order_id):
+    """
+    The order with its STATUS_FIELDS, or None. The request's executor thread
+    keeps its own connection, so close it: an idle stream holds none.
+    """
+    try:
+        return Order.objects.only(*STATUS_FIELDS).filter(pk=order_id).first()
+    finally:
+        connection.close()
+
+
+async def status_events(order_id):
+    deadline = time.monotonic() + settings.ORDER_STATUS_STREAM_TIMEOUT
+    keepalive = settings.ORDER_STATUS_KEEPALIVE
+    sent = None
+    async with subscribe(order_id) as waiter:
+        while True:
+            order = await read_status(order_id)
+            if order is None:
+                return
+            data = status_data(order)
+            if data != sent:
+                retry = "retry: 3000\n" if sent is None else ""
+                yield f"{retry}event: status\ndata: {json.dumps(data)}\n\n"
+                sent = data
+            if order.payment_status == "Paid":
+                return
+            # Sleep until a change is published, with a comment line now and
+            # then so proxies don't drop the idle connection
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                if await waiter.wait(min(keepalive, remaining)):
+                    break
+                yield ": keepalive\n\n"
 
 
 @api_view(["PATCH"])
@@ -87,9 +249,14 @@ def update_order_status(request, pk):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    order.order_status = new_status
-    order.save()
-    
+    previous_status = order.order_status
+    with transaction.atomic():
+        order.order_status = new_status
+        order.save()
+        if new_status != previous_status:
+            record_event("order.status_changed", order, **{"from": previous_status, "to": new_status})
+            transaction.on_commit(lambda: publish_order_status(order.pk))
+
     return Response({
         "order_id": order.id,
         "order_status": order.order_status,
@@ -98,13 +265,22 @@ def update_order_status(request, pk):
 
 # --- CART VIEWS ---
 
+def cart_response(user, status_code=status.HTTP_200_OK):
+    """The user's cart, serialized in a fixed number of queries."""
+    return Response(get_cart_backend().data(user), status=status_code)
+
 class CartView(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        return cart_response(request.user)
+
+class CartSummaryView(views.APIView):
+    """GET /api/orders/cart/summary/ -> subtotal and item count only, for badges (one query)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(get_cart_backend().summary(request.user))
 
 class AddToCartView(views.APIView):
     permission_classes = [IsAuthenticated]
@@ -113,30 +289,65 @@ class AddToCartView(views.APIView):
         variant_id = request.data.get('variant_id')
         quantity = int(request.data.get('quantity', 1))
 
-        cart, _ = Cart.objects.get_or_create(user=request.user)
         variant = get_object_or_404(ProductVariant, id=variant_id)
 
         if variant.stock < quantity:
             return Response({"error": "Not enough stock available"}, status=status.HTTP_400_BAD_REQUEST)
 
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, variant=variant)
-        
-        if not created:
-            cart_item.quantity += quantity
-        else:
-            cart_item.quantity = quantity
-
-        cart_item.save()
-        return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
+        get_cart_backend().add(request.user, variant, quantity)
+        return cart_response(request.user)
 
 class RemoveCartItemView(views.APIView):
+    """DELETE /api/orders/cart/remove/<variant_id>/ -> the "variant" of an item in the cart response."""
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, variant_id):
+        get_cart_backend().remove(request.user, variant_id)
+        return cart_response(request.user)
+
+class CartBatchView(views.APIView):
+    """
+    POST /api/orders/cart/batch/
+    {"operations": [{"op": "add", "variant_id": 7, "quantity": 2},
+                    {"op": "update", "variant_id": 9, "quantity": 1},
+                    {"op": "remove", "variant_id": 4}]}
+    -> the cart, after applying every operation in order (or none of them,
+    if any line would exceed the available stock). update to 0 removes.
+    For merging a guest cart at login, "buy the look", etc. in one request.
+    """
     permission_classes = [IsAuthenticated]
 
-    def delete(self, request, pk):
-        cart_item = get_object_or_404(CartItem, id=pk, cart__user=request.user)
-        cart_item.delete()
-        cart = Cart.objects.get(user=request.user)
-        return Response(CartSerializer(cart).data)
+    def post(self, request):
+        payload = request.data.get('operations')
+        if not isinstance(payload, list) or not payload:
+            return Response({"error": "'operations' must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(payload) > settings.CART_BATCH_MAX_OPERATIONS:
+            return Response(
+                {"error": f"At most {settings.CART_BATCH_MAX_OPERATIONS} operations per request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            operations = [parse_operation(operation) for operation in payload]
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Every variant being added or set, with its available stock, in one query
+        wanted = {variant_id for op, variant_id, _ in operations if op != 'remove'}
+        variants = with_available(
+            ProductVariant.objects.filter(pk__in=wanted, product__is_active=True).select_related('product')
+        ).in_bulk()
+        unknown = sorted(wanted - set(variants))
+        if unknown:
+            return Response(
+                {"error": f"Unknown product variant: {', '.join(map(str, unknown))}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            get_cart_backend().apply(request.user, operations, variants)
+        except InsufficientStock as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return cart_response(request.user)
 
 #Adress
 class SavedAddressListCreateView(generics.ListCreateAPIView):
@@ -169,89 +380,43 @@ class CheckoutView(views.APIView):
         """
 
         items_payload = request.data.get("items")
+        cart_backend = get_cart_backend()
 
-        order_line_items = []  # list of dicts: { "product_name", "size", "price_per_unit", "quantity" }
-        total_amount = Decimal("0.00")
-
+        # 1. Resolve the lines (see store.pricing)
         if items_payload:
             # --- MODE 1: CLIENT-SIDE CART SENT FROM FRONTEND ---
-            if not isinstance(items_payload, list):
-                return Response(
-                    {"error": "Invalid items format. Expected a list of items."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            for line in items_payload:
-                sku = line.get("sku")
-                size = line.get("size")
-                quantity = int(line.get("quantity", 1) or 1)
-
-                if not sku or not size:
-                    return Response(
-                        {"error": "Each item must include 'sku' and 'size'."},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-                variant = get_object_or_404(
-                    ProductVariant,
-                    product__sku=sku,
-                    size=size,
-                )
-
-                if variant.stock < quantity:
-                    return Response(
-                        {
-                            "error": f"Not enough stock for {variant.product.title} ({size})"
-                        },
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-                price_per_unit = variant.product.price + variant.additional_price
-                line_total = price_per_unit * quantity
-                total_amount += line_total
-
-                order_line_items.append(
-                    {
-                        "product_name": variant.product.title,
-                        "size": size,
-                        "price_per_unit": price_per_unit,
-                        "quantity": quantity,
-                    }
-                )
+            try:
+                order_line_items = resolve_lines(items_payload)
+            except PricingError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         else:
             # --- MODE 2: SERVER-SIDE CART (if ever used) ---
+            # A cache-held cart is written behind; make Cart/CartItem current first
+            cart_backend.flush(request.user)
             try:
                 cart = Cart.objects.get(user=request.user)
-                if cart.items.count() == 0:
-                    return Response(
-                        {"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST
-                    )
             except Cart.DoesNotExist:
                 return Response(
                     {"error": "No cart found for this user"},
                     status=status.HTTP_404_NOT_FOUND,
                 )
-
-            # Use server cart totals
-            total_amount = cart.total_price
-
-            for item in cart.items.all():
-                price_per_unit = (
-                    item.variant.product.price + item.variant.additional_price
-                )
-                order_line_items.append(
-                    {
-                        "product_name": item.variant.product.title,
-                        "size": item.variant.size,
-                        "price_per_unit": price_per_unit,
-                        "quantity": item.quantity,
-                    }
+            order_line_items = cart_lines(cart.items.select_related("variant__product").order_by("pk"))
+            if not order_line_items:
+                return Response(
+                    {"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # We'll clear the server cart after creating the order (see below)
-            cart_to_clear = cart
+        # 2. Price the order: subtotal, coupon, shipping and tax. The coupon is
+        # only counted once the order exists (redeem_coupon below), where the
+        # usage limit is re-checked atomically.
+        try:
+            pricing = quote(order_line_items, request.data.get("coupon_code"), request.user)
+        except CouponError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        total_amount = pricing["total"]
+        coupon, discount = pricing["coupon"], pricing["discount"]
 
-        # 2. Create the Order
+        # 3. Create the Order
         address = request.data.get('address', '')
         apartment = request.data.get('apartment', '')
         city = request.data.get('city', '')
@@ -261,42 +426,62 @@ class CheckoutView(views.APIView):
         phone = request.data.get('phone', '')
         shipping_address = f"{address}\n{apartment}\n{city}, {state} {zip_code}\n{country}".strip()
 
-        order = Order.objects.create(
-            user=request.user,
-            shipping_address=shipping_address,
-            phone=phone,
-            total_amount=total_amount,
-            payment_status='Pending',
-            order_status='Processing'  # Explicitly set to Processing, not pending
-        )
+        # Order, items, stock holds, cart clearing and coupon use commit (or roll
+        # back) together, in a fixed number of queries however many lines the
+        # cart has.
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    user=request.user,
+                    shipping_address=shipping_address,
+                    phone=phone,
+                    total_amount=total_amount,
+                    coupon=coupon,
+                    discount_amount=discount,
+                    shipping_amount=pricing["shipping"],
+                    tax_amount=pricing["tax"],
+                    payment_status='Pending',
+                    order_status='Processing'  # Explicitly set to Processing, not pending
+                )
 
-        # 3. Move items into OrderItems (from whichever mode built order_line_items)
-        for line in order_line_items:
-            OrderItem.objects.create(
-                order=order,
-                product_name=line["product_name"],
-                variant_label=f"Size: {line['size']}",
-                price=line["price_per_unit"],
-                quantity=line["quantity"],
-            )
+                # 4. Move items into OrderItems (from whichever mode built order_line_items)
+                OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order,
+                        variant=line["variant"],
+                        product_name=line["product_name"],
+                        variant_label=f"Size: {line['size']}",
+                        price=line["price_per_unit"],
+                        quantity=line["quantity"],
+                    )
+                    for line in order_line_items
+                ])
 
-        # CRITICAL: Stock is NOT deducted here!
+                # Hold the stock until payment (or STOCK_RESERVATION_TTL)
+                reserve(order, order_line_items)
+
+                # 5. Clear server-side cart (whether we used it or not)
+                # This ensures cart is always empty after checkout
+                cart_backend.clear(request.user)
+
+                # Last statement before commit, so the coupon row stays locked briefly
+                if coupon:
+                    redeem_coupon(coupon, order, discount)
+        except (CouponError, InsufficientStock) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # CRITICAL: Stock is NOT deducted here, only held (store.reservations)!
         # Stock will be deducted only after payment verification succeeds
         # (see payments.VerifyPaymentView)
 
-        # 4. Clear server-side cart (whether we used it or not)
-        # This ensures cart is always empty after checkout
-        try:
-            user_cart = Cart.objects.get(user=request.user)
-            user_cart.items.all().delete()  # Clear all cart items
-        except Cart.DoesNotExist:
-            pass  # No cart to clear, that's fine
-
         # 6. Create Razorpay Order (amount in rupees → paise handled in utility)
         try:
             razorpay_order = razorpay_create_order(total_amount, currency="INR")
         except Exception as exc:
             # If Razorpay order creation fails, surface a clear error.
+            # The order can't be paid, so give its coupon use and stock back.
+            release_coupon(order)
+            release_reservations(order)
             return Response(
                 {"error": "Failed to create Razorpay order", "details": str(exc)},
                 status=status.HTTP_502_BAD_GATEWAY,
@@ -313,6 +498,9 @@ class CheckoutView(views.APIView):
                 "razorpay_order_id": order.razorpay_order_id,
                 "amount": razorpay_order.get("amount"),  # in paise
                 "currency": razorpay_order.get("currency", "INR"),
+                "discount_amount": str(order.discount_amount),
+                "shipping_amount": str(order.shipping_amount),
+                "tax_amount": str(order.tax_amount),
                 "key": getattr(settings, "RAZORPAY_KEY_ID", ""),
                 "order_status": order.order_status,
                 "payment_status": order.payment_status,
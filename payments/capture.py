@@ -0,0 +1,162 @@
+import logging
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+
+from orders.coupons import redeem_coupon
+from orders.events import publish_order_status
+from orders.models import CouponRedemption, Order
+from orders.outbox import record_event
+from store.coupons import CouponError
+from store.models import ProductVariant
+from store.reservations import InsufficientStock, convert_reservations, ensure_available, has_active_holds
+from store.stock import deduct_stock
+
+logger = logging.getLogger(__name__)
+
+# Marking an order paid, shared by the checkout callback (VerifyPaymentView)
+# and the Razorpay webhook, which often race for the same payment.
+#
+# Everything that only reads (the order, its items, variant lookups) happens
+# before the transaction. The transaction then claims the order with a
+# conditional UPDATE (payment_status Pending -> Paid), deducts stock and
+# converts the checkout holds, and commits; any failure rolls all of it back.
+# Whoever loses the race for the claim gets ALREADY_CAPTURED and does nothing.
+#
+# A payment can arrive after the order's holds expired. Its stock may be held
+# for other buyers by then, and release_expired_reservations may have given
+# its coupon use back, so both are checked (and the use taken) again; if
+# either is gone the capture fails and the payment needs a refund.
+
+CAPTURED = 'captured'
+ALREADY_CAPTURED = 'already_captured'
+
+STATS_PREFIX = 'payments:capture'
+OUTCOMES = (CAPTURED, ALREADY_CAPTURED, 'failed')
+
+
+class CaptureError(Exception):
+    """A payment that can't be applied to its order; details go in the response."""
+
+    def __init__(self, message, status_code=400, **details):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.details = details
+
+
+def variant_quantities(order):
+    """
+    {variant id: quantity} for the order's items. Items without a variant
+    (placed before OrderItem.variant existed and not matched by its backfill)
+    fall back to the old product title + size lookup.
+    """
+    quantities = Counter()
+    for item in order.items.all():
+        variant_id = item.variant_id
+        if variant_id is None and item.size:
+            variant_id = (
+                ProductVariant.objects.filter(product__title=item.product_name, size=item.size)
+                .values_list('pk', flat=True)
+                .first()
+            )
+        if variant_id is None:
+            raise CaptureError('Variant not found for order item', item=item.product_name)
+        quantities[variant_id] += item.quantity
+    return quantities
+
+
+def capture_payment(razorpay_order_id, razorpay_payment_id, razorpay_signature=None, user=None):
+    """
+    Mark the order paid, deduct its stock and convert its stock holds, once.
+    Returns (order, CAPTURED or ALREADY_CAPTURED); raises CaptureError.
+    Safe to call any number of times, concurrently, for the same payment.
+    """
+    started = time.perf_counter()
+    outcome, lock_seconds = 'failed', 0.0
+    try:
+        orders = Order.objects.prefetch_related('items').filter(razorpay_order_id=razorpay_order_id)
+        if user is not None:
+            orders = orders.filter(user=user)
+        order = orders.first()
+        if order is None:
+            raise CaptureError('Order not found', status_code=404)
+        if order.payment_status == 'Paid':
+            outcome = ALREADY_CAPTURED
+            return order, outcome
+        quantities = variant_quantities(order)
+
+        locked_at = time.perf_counter()
+        try:
+            with transaction.atomic():
+                fields = {'payment_status': 'Paid', 'razorpay_payment_id': razorpay_payment_id}
+                if razorpay_signature:
+                    fields['razorpay_signature'] = razorpay_signature
+                # order_status stays as 'Processing'
+                claimed = Order.objects.filter(pk=order.pk, payment_status='Pending').update(**fields)
+                if not claimed:
+                    outcome = ALREADY_CAPTURED
+                    return order, outcome
+                for field, value in fields.items():
+                    setattr(order, field, value)
+                if not has_active_holds(order):
+                    ensure_available(quantities)
+                    if order.coupon_id and not CouponRedemption.objects.filter(order=order).exists():
+                        redeem_coupon(order.coupon, order, order.discount_amount)
+                deduct_stock(quantities)
+                convert_reservations(order)
+                # Downstream work (emails, warehouse, analytics) goes through the outbox
+                record_event('order.paid', order)
+                # Wake anyone streaming this order's status (orders.events)
+                transaction.on_commit(lambda: publish_order_status(order.pk))
+        except InsufficientStock:
+            logger.warning("Payment %s for order %s can't be fulfilled: out of stock", razorpay_payment_id, order.pk)
+            raise CaptureError('Out of stock for one or more items')
+        except CouponError:
+            logger.warning("Payment %s for order %s can't be applied: coupon used up", razorpay_payment_id, order.pk)
+            raise CaptureError('The coupon on this order is no longer available')
+        finally:
+            lock_seconds = time.perf_counter() - locked_at
+
+        outcome = CAPTURED
+        return order, outcome
+    finally:
+        elapsed = time.perf_counter() - started
+        _record(outcome, elapsed, lock_seconds)
+        logger.info(
+            "Payment %s for order %s: %s in %.1f ms (%.1f ms in transaction)",
+            razorpay_payment_id, razorpay_order_id, outcome, elapsed * 1000, lock_seconds * 1000,
+        )
+
+
+# --- Timing metrics (shared across workers through the cache) ---
+
+def _incr(key, amount):
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if not cache.add(key, amount, timeout=None):
+            cache.incr(key, amount)
+
+
+def _record(outcome, elapsed, lock_seconds):
+    _incr(f'{STATS_PREFIX}:{outcome}:count', 1)
+    _incr(f'{STATS_PREFIX}:{outcome}:us', int(elapsed * 1_000_000))
+    _incr(f'{STATS_PREFIX}:{outcome}:lock_us', int(lock_seconds * 1_000_000))
+
+
+def get_capture_stats():
+    """{outcome: {'count', 'avg_ms', 'avg_lock_ms'}} since the cache was last cleared."""
+    keys = [f'{STATS_PREFIX}:{outcome}:{stat}' for outcome in OUTCOMES for stat in ('count', 'us', 'lock_us')]
+    values = cache.get_many(keys)
+    stats = {}
+    for outcome in OUTCOMES:
+        count = values.get(f'{STATS_PREFIX}:{outcome}:count', 0)
+        stats[outcome] = {
+            'count': count,
+            'avg_ms': round(values.get(f'{STATS_PREFIX}:{outcome}:us', 0) / count / 1000, 2) if count else None,
+            'avg_lock_ms': round(values.get(f'{STATS_PREFIX}:{outcome}:lock_us', 0) / count / 1000, 2) if count else None,
+        }
+    return stats
@@ -1,3 +1,146 @@
-from django.test import TestCase
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import CustomUser
+from orders.models import CouponRedemption, Order, OrderItem, OutboxEvent
+from payments.capture import ALREADY_CAPTURED, CAPTURED, capture_payment
+from store.models import Category, Coupon, Product, ProductVariant, StockReservation
+
+
+@mock.patch('payments.views.verify_payment_signature')
+class VerifyPaymentTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='buyer@example.com', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Kurtas', slug='kurtas')
+        product = Product.objects.create(
+            category=category, title='Kurta', slug='kurta', sku='KRT-1',
+            description='Cotton', price='1000.00', country_of_origin='India',
+        )
+        self.variant = ProductVariant.objects.create(product=product, size='M', stock=3)
+        self.order = Order.objects.create(
+            user=self.user, shipping_address='Hyderabad', phone='9999999999',
+            total_amount='2000.00', razorpay_order_id='order_rzp',
+        )
+        OrderItem.objects.create(order=self.order, product_name='Kurta', variant_label='Size: M', price='1000.00', quantity=2)
+        StockReservation.objects.create(
+            variant=self.variant, order=self.order, quantity=2,
+            expires_at=timezone.now() + timedelta(minutes=15),
+        )
+
+    def verify(self):
+        return self.client.post(reverse('razorpay_verify_payment'), {
+            'razorpay_order_id': 'order_rzp', 'razorpay_payment_id': 'pay_1', 'razorpay_signature': 'sig',
+        }, format='json')
+
+    def test_capture_uses_the_item_variant(self, verify_signature):
+        # Same title as the ordered product: the old title lookup could pick this one
+        other = Product.objects.create(
+            category=self.variant.product.category, title='Kurta', slug='kurta-2', sku='KRT-2',
+            description='Silk', price='900.00', country_of_origin='India',
+        )
+        decoy = ProductVariant.objects.create(product=other, size='M', stock=9)
+        self.order.items.update(variant=self.variant)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.verify().status_code, 200)
+        self.variant.refresh_from_db()
+        decoy.refresh_from_db()
+        self.assertEqual((self.variant.stock, decoy.stock), (1, 9))
+        self.assertEqual(self.variant.product.card.in_stock, True)
+
+    def test_short_stock_deducts_nothing(self, verify_signature):
+        second = ProductVariant.objects.create(product=self.variant.product, size='L', stock=0)
+        OrderItem.objects.create(order=self.order, variant=second, product_name='Kurta', variant_label='Size: L', price='1000.00')
+        self.order.items.filter(variant__isnull=True).update(variant=self.variant)
+        response = self.verify()
+        self.assertEqual(response.status_code, 400)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 3)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'Pending')
+
+    def test_backfill_links_unambiguous_titles(self, verify_signature):
+        backfill = import_module('orders.migrations.0008_orderitem_variant').backfill_variants
+        backfill(apps, None)
+        self.assertEqual(OrderItem.objects.get().variant, self.variant)
+
+    def test_capture_deducts_stock_and_converts_the_hold(self, verify_signature):
+        with mock.patch('payments.capture.publish_order_status') as publish, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.verify().status_code, 200)
+        publish.assert_called_once_with(self.order.pk)
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.topic, event.payload['payment_status'], event.payload['razorpay_payment_id']), ('order.paid', 'Paid', 'pay_1'))
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 1)
+        self.assertFalse(StockReservation.objects.exists())
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.payment_status, self.order.razorpay_payment_id), ('Paid', 'pay_1'))
+
+    def test_capture_after_the_hold_expired_rechecks_stock(self, verify_signature):
+        self.order.items.update(variant=self.variant)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        other = Order.objects.create(user=self.user, shipping_address='Pune', phone='1', total_amount='1000.00')
+        StockReservation.objects.create(
+            variant=self.variant, order=other, quantity=2, expires_at=timezone.now() + timedelta(minutes=15),
+        )
+        response = self.verify()
+        self.assertEqual((response.status_code, response.data['error']), (400, 'Out of stock for one or more items'))
+        self.variant.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual((self.variant.stock, self.order.payment_status), (3, 'Pending'))
+
+        StockReservation.objects.filter(order=other).delete()
+        self.assertEqual(self.verify().status_code, 200)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 1)
+
+    def test_capture_after_the_hold_expired_takes_the_coupon_use_again(self, verify_signature):
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code='FEST10', discount_type='fixed', value='100.00', usage_limit=1, uses_count=1,
+            valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+        )
+        self.order.items.update(variant=self.variant)
+        Order.objects.filter(pk=self.order.pk).update(coupon=coupon, discount_amount='100.00')
+        StockReservation.objects.all().delete()  # expired and swept; the sweeper gave the use back...
+        # ...and another order took it meanwhile
+        response = self.verify()
+        self.assertEqual((response.status_code, response.data['error']), (400, 'The coupon on this order is no longer available'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'Pending')
+
+        Coupon.objects.filter(pk=coupon.pk).update(uses_count=0)
+        self.assertEqual(self.verify().status_code, 200)
+        self.assertEqual(Coupon.objects.get(pk=coupon.pk).uses_count, 1)
+        self.assertEqual(CouponRedemption.objects.get().order, self.order)
+
+    @override_settings(RAZORPAY_WEBHOOK_SECRET='whsec')
+    @mock.patch('payments.views.razorpay.Client')
+    def test_callback_and_webhook_capture_once(self, client, verify_signature):
+        cache.clear()
+        self.order.items.update(variant=self.variant)
+        self.assertEqual(self.verify().status_code, 200)
+        event = {
+            'event': 'payment.captured',
+            'payload': {'payment': {'entity': {'id': 'pay_1', 'order_id': 'order_rzp'}}},
+        }
+        response = APIClient().post(reverse('razorpay_webhook'), event, format='json', HTTP_X_RAZORPAY_SIGNATURE='sig')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(capture_payment('order_rzp', 'pay_1')[1], ALREADY_CAPTURED)
+        self.assertEqual(OutboxEvent.objects.filter(topic='order.paid').count(), 1)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 1)
+
+        self.user.is_staff = True
+        self.user.save()
+        stats = self.client.get(reverse('payment_capture_stats')).data
+        self.assertEqual((stats[CAPTURED]['count'], stats[ALREADY_CAPTURED]['count']), (1, 2))
@@ -1,10 +1,11 @@
 from django.urls import path
 
-from .views import VerifyPaymentView, RazorpayWebhookView
+from .views import VerifyPaymentView, RazorpayWebhookView, CaptureStatsView
 
 urlpatterns = [
     path("verify/", VerifyPaymentView.as_view(), name="razorpay_verify_payment"),
     path("webhook/", RazorpayWebhookView.as_view(), name="razorpay_webhook"),
+    path("capture-stats/", CaptureStatsView.as_view(), name="payment_capture_stats"),
 ]
 
 
@@ -1,8 +1,5 @@
-from django.db import transaction
-from django.shortcuts import get_object_or_404
-
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
@@ -13,9 +10,8 @@ import razorpay
 
 logger = logging.getLogger(__name__)
 
-from orders.models import Order, OrderItem
+from payments.capture import ALREADY_CAPTURED, CaptureError, capture_payment, get_capture_stats
 from payments.razorpay_client import verify_payment_signature
-from store.models import ProductVariant
 
 
 class VerifyPaymentView(APIView):
@@ -50,80 +46,25 @@ class VerifyPaymentView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # 2. Atomic transaction for order + stock update
-        with transaction.atomic():
-            order = (
-                Order.objects.select_for_update()
-                .select_related("user")
-                .prefetch_related("items")
-                .filter(razorpay_order_id=razorpay_order_id, user=request.user)
-                .first()
+        # 2. Mark paid, deduct stock, convert stock holds (see payments.capture)
+        user = request.user if request.user.is_authenticated else None
+        try:
+            order, outcome = capture_payment(
+                razorpay_order_id, razorpay_payment_id, razorpay_signature, user=user,
             )
+        except CaptureError as exc:
+            return Response({"error": exc.message, **exc.details}, status=exc.status_code)
 
-            if not order:
-                return Response(
-                    {"error": "Order not found"},
-                    status=status.HTTP_404_NOT_FOUND,
-                )
-
-            # If already paid, treat as idempotent success
-            if order.payment_status == "Paid":
-                return Response(
-                    {
-                        "success": True,
-                        "message": "Payment already verified",
-                        "order_id": order.id,
-                    },
-                    status=status.HTTP_200_OK,
-                )
-
-            # Save payment identifiers and mark payment as Paid
-            # Keep order_status as Processing (NOT 'paid')
-            order.razorpay_payment_id = razorpay_payment_id
-            order.razorpay_signature = razorpay_signature
-            order.payment_status = "Paid"  # ✅ ONLY payment_status changes
-            # order_status stays as 'Processing' (default)
-
-            # 3. Deduct stock with row-level locks
-            for item in order.items.all():
-                # Our OrderItem stores product_name and variant_label ("Size: M")
-                # We infer the variant via product title + size.
-                size = None
-                if item.variant_label and ":" in item.variant_label:
-                    # "Size: M" → "M"
-                    size = item.variant_label.split(":", 1)[1].strip()
-
-                if not size:
-                    raise ValueError("Invalid variant label on order item.")
-
-                variant = (
-                    ProductVariant.objects.select_for_update()
-                    .filter(product__title=item.product_name, size=size)
-                    .first()
-                )
-
-                if not variant:
-                    return Response(
-                        {
-                            "error": "Variant not found for order item",
-                            "item": item.product_name,
-                        },
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-                if variant.stock < item.quantity:
-                    return Response(
-                        {
-                            "error": "Out of stock for one or more items",
-                            "item": item.product_name,
-                        },
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-                variant.stock -= item.quantity
-                variant.save()
-
-            order.save()
+        # If already paid, treat as idempotent success
+        if outcome == ALREADY_CAPTURED:
+            return Response(
+                {
+                    "success": True,
+                    "message": "Payment already verified",
+                    "order_id": order.id,
+                },
+                status=status.HTTP_200_OK,
+            )
 
         return Response(
             {
@@ -195,62 +136,17 @@ class RazorpayWebhookView(APIView):
                     logger.error("Webhook payment.captured missing order_id/payment_id")
                     return Response(status=status.HTTP_400_BAD_REQUEST)
 
-                # Idempotent processing: find order and mark paid if not already
-                from django.db import transaction
-                from orders.models import Order
-                from store.models import ProductVariant
-
-                with transaction.atomic():
-                    order = (
-                        Order.objects.select_for_update()
-                        .prefetch_related("items")
-                        .filter(razorpay_order_id=razorpay_order_id)
-                        .first()
-                    )
-
-                    if not order:
-                        logger.error("Order not found for razorpay_order_id=%s", razorpay_order_id)
-                        return Response(status=status.HTTP_404_NOT_FOUND)
-
-                    if order.payment_status == "Paid":
-                        logger.info("Order %s already marked as paid", order.id)
-                        return Response({"status": "ok"}, status=status.HTTP_200_OK)
-
-                    # Update order payment fields ONLY
-                    # Set payment_status='Paid', leave order_status as 'Processing'
-                    order.razorpay_payment_id = razorpay_payment_id
-                    order.payment_status = "Paid"  # ✅ ONLY payment_status
-                    # order_status stays as 'Processing' (default)
-
-                    # Deduct stock
-                    for item in order.items.all():
-                        size = None
-                        if item.variant_label and ":" in item.variant_label:
-                            size = item.variant_label.split(":", 1)[1].strip()
-
-                        if not size:
-                            raise ValueError("Invalid variant label on order item.")
-
-                        variant = (
-                            ProductVariant.objects.select_for_update()
-                            .filter(product__title=item.product_name, size=size)
-                            .first()
-                        )
-
-                        if not variant:
-                            logger.error("Variant not found for item %s", item.product_name)
-                            return Response({"error": "Variant not found"}, status=status.HTTP_400_BAD_REQUEST)
-
-                        if variant.stock < item.quantity:
-                            logger.error("Out of stock for item %s", item.product_name)
-                            return Response({"error": "Out of stock"}, status=status.HTTP_400_BAD_REQUEST)
-
-                        variant.stock -= item.quantity
-                        variant.save()
-
-                    order.save()
-
-                logger.info("Processed webhook and marked order %s as paid", order.id)
+                # Idempotent: the checkout callback may have captured it already
+                try:
+                    order, outcome = capture_payment(razorpay_order_id, razorpay_payment_id)
+                except CaptureError as exc:
+                    logger.error("Webhook capture failed for razorpay_order_id=%s: %s", razorpay_order_id, exc.message)
+                    return Response({"error": exc.message}, status=exc.status_code)
+
+                if outcome == ALREADY_CAPTURED:
+                    logger.info("Order %s already marked as paid", order.id)
+                else:
+                    logger.info("Processed webhook and marked order %s as paid", order.id)
                 return Response({"status": "ok"}, status=status.HTTP_200_OK)
             except Exception as exc:
                 logger.exception("Error processing webhook: %s", exc)
@@ -260,3 +156,11 @@ class RazorpayWebhookView(APIView):
         logger.info("Received unhandled webhook event: %s", event)
         return Response({"status": "ignored"}, status=status.HTTP_200_OK)
 
+
+class CaptureStatsView(APIView):
+    """GET /api/payments/capture-stats/ -> capture counts and timings per outcome (staff only)."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_capture_stats())
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Category, Product, ProductImage, ProductVariant, Coupon, SiteConfig
+from .models import Category, Product, ProductImage, ProductVariant, Coupon, SiteConfig, StockReservation
 
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
@@ -59,7 +59,8 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Coupon)
 class CouponAdmin(admin.ModelAdmin):
-    list_display = ('code', 'discount_type', 'value', 'active', 'valid_to')
+    list_display = ('code', 'discount_type', 'value', 'active', 'valid_to', 'uses_count', 'usage_limit')
+    readonly_fields = ('uses_count',)
     list_filter = ('active', 'discount_type')
 
 @admin.register(SiteConfig)
@@ -77,6 +78,16 @@ class SiteConfigAdmin(admin.ModelAdmin):
         """Allow deleting SiteConfig"""
         return True
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('variant', 'order', 'quantity', 'expires_at')
+    list_select_related = ('variant__product',)
+    readonly_fields = ('variant', 'order', 'quantity', 'expires_at', 'created_at')
+
+    def has_add_permission(self, request):
+        """Holds are made by checkout only"""
+        return False
+
 # Hide ProductImage and ProductVariant - they are managed via inlines
 admin.site.unregister(ProductImage) if ProductImage in admin.site._registry else None
 admin.site.unregister(ProductVariant) if ProductVariant in admin.site._registry else None
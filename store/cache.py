@@ -0,0 +1,182 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+CACHE_TIMEOUT = getattr(settings, 'STORE_CACHE_TIMEOUT', 300)
+KEY_PREFIX = 'catalog'
+STATS = ('hits', 'misses')
+
+# Cached responses are keyed by the current version of every namespace
+# they depend on:
+#   'categories'     - any category
+#   'products'       - any product, variant or image (listings, search, facets)
+#   'product:<slug>' - a single product's detail page
+#   'content'        - homepage content (web_content)
+#   'site-config'    - the SiteConfig row (SiteConfig.get_solo)
+# Bumping a namespace version orphans exactly the entries built from it;
+# they then age out of the cache on their own.
+#
+# Versions are nanosecond timestamps of the last change, so the same values
+# also give every response its ETag and Last-Modified without touching the
+# database.
+#
+# That only holds if every worker reads the same versions. With a per-process
+# cache (the locmem default without REDIS_URL) a change bumps the versions of
+# the worker that made it, and the others would keep serving their copies and
+# answering 304 indefinitely, so responses are then neither cached nor given
+# validators.
+
+
+def cache_is_shared():
+    """Whether the default cache is one store seen by every worker."""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache, FileBasedCache))
+
+
+def _version_key(namespace):
+    return f'{KEY_PREFIX}:version:{namespace}'
+
+
+def get_versions(namespaces):
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Seed from the clock so a version evicted from the cache can
+            # never restart at a number older entries were stored under.
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*namespaces):
+    keys = [_version_key(namespace) for namespace in namespaces]
+    current = cache.get_many(keys)
+    now = time.time_ns()
+    cache.set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys},
+        timeout=None,
+    )
+
+
+def invalidate(*namespaces):
+    """Bump the namespaces once the current transaction commits."""
+    transaction.on_commit(lambda: bump_versions(*namespaces))
+
+
+def record(stat):
+    key = f'{KEY_PREFIX}:stats:{stat}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_stats():
+    keys = {stat: f'{KEY_PREFIX}:stats:{stat}' for stat in STATS}
+    values = cache.get_many(keys.values())
+    stats = {stat: values.get(key, 0) for stat, key in keys.items()}
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else None
+    return stats
+
+
+def response_cache_key(request, view_name, versions):
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    )
+    raw = '|'.join([
+        view_name,
+        ','.join(str(version) for version in versions),
+        request.get_host(),
+        request.path,
+        urlencode(params),
+    ])
+    return f'{KEY_PREFIX}:response:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def validators(request, view_name, namespaces):
+    """Returns (cache key, ETag, Last-Modified timestamp) for a GET request."""
+    versions = get_versions(namespaces)
+    key = response_cache_key(request, view_name, versions)
+    etag = quote_etag(key.rsplit(':', 1)[-1])
+    last_modified = max(versions) // 10**9 if versions else None
+    return key, etag, last_modified
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code == 200:
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def conditional(*namespaces):
+    """
+    Conditional GET for ViewSet actions: answers 304 Not Modified from the
+    namespace versions alone, before the action runs. Needs a shared cache.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if not cache_is_shared():
+                return method(self, request, *args, **kwargs)
+            view_name = f'{type(self).__name__}.{method.__name__}'
+            _, etag, last_modified = validators(request, view_name, namespaces)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return not_modified
+            return set_validators(method(self, request, *args, **kwargs), etag, last_modified)
+        return wrapper
+    return decorator
+
+
+class CachedResponseMixin:
+    """
+    Serves GET responses from Django's cache. Views list the namespaces their
+    output depends on; signals in store.signals bump those namespaces when
+    the underlying rows change. Responses carry ETag/Last-Modified, matching
+    conditional requests get a 304, and an X-Cache: HIT/MISS header is set.
+    Without a shared cache the view just runs.
+    """
+
+    cache_namespaces = ()
+
+    def get_cache_namespaces(self):
+        return list(self.cache_namespaces)
+
+    def get(self, request, *args, **kwargs):
+        if not cache_is_shared():
+            return super().get(request, *args, **kwargs)
+        key, etag, last_modified = validators(request, type(self).__name__, self.get_cache_namespaces())
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        data = cache.get(key)
+        if data is not None:
+            record('hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return set_validators(response, etag, last_modified)
+
+        record('misses')
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return set_validators(response, etag, last_modified)
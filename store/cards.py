@@ -0,0 +1,57 @@
+from django.db import transaction
+
+from .models import Product, ProductCard
+
+
+def build_card(product):
+    """
+    Build (without saving) the ProductCard for a product whose category,
+    media and variants are already loaded.
+    """
+    images = [item for item in product.media.all() if item.image]
+    primary = next((item for item in images if item.is_primary), images[0] if images else None)
+    return ProductCard(
+        product=product,
+        category_slug=product.category.slug,
+        title=product.title,
+        slug=product.slug,
+        price=product.price,
+        original_price=product.original_price,
+        primary_image=primary.image.name if primary else '',
+        primary_image_derivatives=primary.derivatives if primary else {},
+        badge=product.badge,
+        is_new=product.is_new,
+        in_stock=any(variant.stock > 0 for variant in product.variants.all()),
+        created_at=product.created_at,
+    )
+
+
+def card_products():
+    return Product.objects.filter(is_active=True).select_related('category').prefetch_related('media', 'variants')
+
+
+def sync_product_card(product_id):
+    """Rewrite one product's card, or drop it if the product is gone or inactive."""
+    sync_product_cards([product_id])
+
+
+def sync_product_cards(product_ids):
+    """sync_product_card() for several products, in a fixed number of queries."""
+    cards = [build_card(product) for product in card_products().filter(pk__in=product_ids)]
+    gone = set(product_ids) - {card.product_id for card in cards}
+    if gone:
+        ProductCard.objects.filter(product_id__in=gone).delete()
+    if cards:
+        ProductCard.objects.bulk_create(
+            cards, update_conflicts=True, unique_fields=['product'],
+            update_fields=[field.name for field in ProductCard._meta.concrete_fields if not field.primary_key],
+        )
+
+
+def rebuild_product_cards():
+    """Recreate every card from scratch."""
+    with transaction.atomic():
+        ProductCard.objects.all().delete()
+        cards = [build_card(product) for product in card_products().iterator(chunk_size=500)]
+        ProductCard.objects.bulk_create(cards, batch_size=1000)
+    return len(cards)
@@ -0,0 +1,56 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.utils import timezone
+
+from .models import Coupon
+
+CENTS = Decimal('0.01')
+
+
+class CouponError(Exception):
+    """A coupon that can't be applied; str(exc) is safe to show the shopper."""
+
+
+class CouponNotFound(CouponError):
+    pass
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+def coupon_discount(coupon, order_total):
+    """Discount `coupon` gives on `order_total`, never more than the total."""
+    if coupon.discount_type == 'percentage':
+        discount = (order_total * coupon.value / 100).quantize(CENTS, rounding=ROUND_HALF_UP)
+    else:
+        discount = coupon.value
+    return min(discount, order_total)
+
+
+def check_coupon(code, order_total, user=None):
+    """
+    Returns (coupon, discount) if `code` applies to an order of `order_total`,
+    otherwise raises CouponError. This is a read-only check: the use is only
+    counted by orders.coupons.redeem_coupon(), which re-checks both limits
+    under the coupon's row lock.
+    """
+    try:
+        coupon = Coupon.objects.get(code=normalize_code(code), active=True)
+    except Coupon.DoesNotExist:
+        raise CouponNotFound('Invalid coupon code')
+
+    now = timezone.now()
+    if coupon.valid_from > now or coupon.valid_to < now:
+        raise CouponError('Coupon has expired')
+    if order_total < coupon.min_order_value:
+        raise CouponError(f'Minimum order value of ₹{coupon.min_order_value} required')
+    if coupon.uses_count >= coupon.usage_limit:
+        raise CouponError('Coupon usage limit exceeded')
+    if (
+        coupon.per_user_limit is not None
+        and user is not None and user.is_authenticated
+        and coupon.redemptions.filter(user=user).count() >= coupon.per_user_limit
+    ):
+        raise CouponError('You have already used this coupon')
+    return coupon, coupon_discount(coupon, order_total)
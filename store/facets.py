@@ -0,0 +1,154 @@
+from collections import Counter
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from .models import FacetCount, Product, ProductFacet, ProductVariant
+
+# Lower bounds of the price bands shown as a facet, in rupees.
+PRICE_BANDS = [Decimal(str(bound)) for bound in getattr(settings, 'STORE_PRICE_BANDS', [0, 1000, 2000, 5000])]
+
+
+def price_band(price):
+    """Label of the band `price` falls in, e.g. '1000-2000' or '5000+'."""
+    lower = PRICE_BANDS[0]
+    for bound in PRICE_BANDS[1:]:
+        if price < bound:
+            return f"{lower:f}-{bound:f}"
+        lower = bound
+    return f"{lower:f}+"
+
+
+def product_facets(product, in_stock_sizes=None):
+    """
+    The (facet, value) pairs a product contributes to the facet counts.
+    `in_stock_sizes` may be passed in when the variants are already loaded.
+    """
+    if product is None or not product.is_active:
+        return set()
+
+    pairs = {('price_band', price_band(product.price))}
+    if product.color.strip():
+        pairs.add(('color', product.color.strip()))
+    if product.fabric.strip():
+        pairs.add(('fabric', product.fabric.strip()))
+    if in_stock_sizes is None:
+        in_stock_sizes = product.variants.filter(stock__gt=0).values_list('size', flat=True)
+    pairs.update(('size', size) for size in in_stock_sizes)
+    return pairs
+
+
+def _pairs_q(pairs):
+    return reduce(or_, (Q(facet=facet, value=value) for facet, value in pairs))
+
+
+def sync_product_facets(product_id, deleted=False):
+    """
+    Bring one product's ProductFacet rows and the FacetCount totals in line
+    with its current state. Only the pairs that changed are touched, and the
+    counts move with F() expressions so concurrent syncs don't lose updates.
+    """
+    sync_facets([product_id], deleted)
+
+
+def sync_facets(product_ids, deleted=False):
+    """sync_product_facets() for several products, in a fixed number of queries."""
+    product_ids = list(dict.fromkeys(product_ids))
+    with transaction.atomic():
+        new = {}
+        if not deleted:
+            products = list(Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk'))
+            sizes = {}
+            in_stock = ProductVariant.objects.filter(product__in=products, stock__gt=0).values_list('product_id', 'size')
+            for product_id, size in in_stock:
+                sizes.setdefault(product_id, []).append(size)
+            new = {product.pk: product_facets(product, sizes.get(product.pk, [])) for product in products}
+        old = {}
+        for product_id, facet, value in ProductFacet.objects.filter(product_id__in=product_ids).values_list('product_id', 'facet', 'value'):
+            old.setdefault(product_id, set()).add((facet, value))
+
+        removed = [(pk, pair) for pk in product_ids for pair in old.get(pk, set()) - new.get(pk, set())]
+        if removed:
+            ProductFacet.objects.filter(
+                reduce(or_, (Q(product_id=pk, facet=facet, value=value) for pk, (facet, value) in removed))
+            ).delete()
+
+        added = [(pk, pair) for pk in product_ids for pair in new.get(pk, set()) - old.get(pk, set())]
+        if added:
+            ProductFacet.objects.bulk_create([
+                ProductFacet(product_id=pk, facet=facet, value=value)
+                for pk, (facet, value) in added
+            ])
+            FacetCount.objects.bulk_create(
+                [FacetCount(facet=facet, value=value) for facet, value in {pair for _, pair in added}],
+                ignore_conflicts=True,
+            )
+
+        deltas = Counter(pair for _, pair in added)
+        deltas.subtract(pair for _, pair in removed)
+        deltas = {pair: delta for pair, delta in deltas.items() if delta}
+        if deltas:
+            FacetCount.objects.filter(_pairs_q(deltas)).update(count=F('count') + Case(
+                *(When(facet=facet, value=value, then=Value(delta)) for (facet, value), delta in deltas.items()),
+                output_field=IntegerField(),
+            ))
+
+
+def rebuild_facets():
+    """Recompute every ProductFacet row and count from scratch."""
+    with transaction.atomic():
+        ProductFacet.objects.all().delete()
+        FacetCount.objects.all().delete()
+        rows = []
+        products = Product.objects.filter(is_active=True).prefetch_related('variants')
+        for product in products.iterator(chunk_size=500):
+            sizes = [variant.size for variant in product.variants.all() if variant.stock > 0]
+            rows += [
+                ProductFacet(product=product, facet=facet, value=value)
+                for facet, value in product_facets(product, sizes)
+            ]
+        ProductFacet.objects.bulk_create(rows, batch_size=1000)
+
+        counts = {}
+        for row in rows:
+            counts[(row.facet, row.value)] = counts.get((row.facet, row.value), 0) + 1
+        FacetCount.objects.bulk_create(
+            [FacetCount(facet=f, value=v, count=c) for (f, v), c in counts.items()],
+            batch_size=1000,
+        )
+    return len(rows)
+
+
+def facet_counts():
+    """
+    The facet block for listing responses, read from the precomputed table:
+    {'fabric': [{'value': 'Cotton', 'count': 42}, ...], ...}
+    """
+    block = {facet: [] for facet, _ in ProductFacet.FACET_CHOICES}
+    for facet, value, count in (
+        FacetCount.objects.filter(count__gt=0)
+        .order_by('facet', 'value')
+        .values_list('facet', 'value', 'count')
+    ):
+        block[facet].append({'value': value, 'count': count})
+    return block
+
+
+def filter_by_facets(queryset, params):
+    """
+    Narrow a Product queryset by ?color=, ?fabric=, ?size= and ?price_band=.
+    Comma separated values are OR-ed within a facet; facets are AND-ed.
+    """
+    for facet, _ in ProductFacet.FACET_CHOICES:
+        raw = params.get(facet)
+        if not raw:
+            continue
+        values = [value.strip() for value in raw.split(',') if value.strip()]
+        if values:
+            matching = ProductFacet.objects.filter(facet=facet, value__in=values)
+            queryset = queryset.filter(id__in=matching.values('product_id'))
+    return queryset
@@ -0,0 +1,193 @@
+import csv
+import json
+import os
+import secrets
+import tempfile
+import time
+import zlib
+from io import StringIO
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max
+
+from .models import Product
+from .pricing import unit_price
+
+# Merchant-style product feed, one item per variant, streamed in constant
+# memory: products are read in chunks with their variants and media
+# prefetched per chunk, and every item is written out as soon as it is built.
+
+CHUNK_SIZE = 500
+# Seconds before the lock of a crashed cached-feed rebuild expires on its own
+REBUILD_LOCK_TIMEOUT = 10 * 60
+
+FORMATS = {
+    # format: (content type, file extension)
+    'xml': ('application/xml; charset=utf-8', 'xml'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+}
+
+COLUMNS = [
+    'id', 'item_group_id', 'title', 'description', 'link', 'image_link',
+    'additional_image_link', 'availability', 'price', 'sale_price', 'brand',
+    'condition', 'product_type', 'color', 'material', 'size', 'quantity',
+]
+
+
+def absolute_url(path):
+    if path.startswith('/'):
+        return settings.SITE_URL.rstrip('/') + path
+    return path
+
+
+def feed_items(chunk_size=CHUNK_SIZE):
+    """Yields one feed item (a dict keyed by COLUMNS) per product variant."""
+    products = (
+        Product.objects.filter(is_active=True)
+        .select_related('category')
+        .prefetch_related('variants', 'media')
+        .order_by('pk')
+    )
+    currency = settings.STORE_CURRENCY
+    for product in products.iterator(chunk_size=chunk_size):
+        images = sorted((item for item in product.media.all() if item.image), key=lambda item: not item.is_primary)
+        image_links = [absolute_url(default_storage.url(item.image.name)) for item in images]
+        on_sale = product.original_price and product.original_price > product.price
+        for variant in product.variants.all():
+            price = unit_price(variant, product)
+            regular_price = product.original_price + variant.additional_price if on_sale else price
+            yield {
+                'id': f'{product.sku}-{variant.size}',
+                'item_group_id': product.sku,
+                'title': product.title,
+                'description': product.description,
+                'link': settings.FEED_PRODUCT_URL.format(slug=product.slug),
+                'image_link': image_links[0] if image_links else '',
+                'additional_image_link': ','.join(image_links[1:]),
+                'availability': 'in_stock' if variant.stock > 0 else 'out_of_stock',
+                'price': f'{regular_price} {currency}',
+                'sale_price': f'{price} {currency}' if on_sale else '',
+                'brand': settings.FEED_BRAND,
+                'condition': 'new',
+                'product_type': product.category.name,
+                'color': product.color,
+                'material': product.fabric,
+                'size': variant.size,
+                'quantity': max(variant.stock, 0),
+            }
+
+
+def render_csv(items):
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    for item in items:
+        writer.writerow(item)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def render_ndjson(items):
+    for item in items:
+        yield json.dumps(item, ensure_ascii=False) + '\n'
+
+
+def render_xml(items):
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0">\n<channel>\n'
+        f'<title>{escape(settings.FEED_BRAND)}</title>\n'
+        f'<link>{escape(settings.FRONTEND_URL)}</link>\n'
+        f'<description>{escape(settings.FEED_BRAND)} product feed</description>\n'
+    )
+    for item in items:
+        fields = ''.join(
+            f'<g:{column}>{escape(str(item[column]))}</g:{column}>'
+            for column in COLUMNS if item[column] != ''
+        )
+        yield f'<item>{fields}</item>\n'
+    yield '</channel>\n</rss>\n'
+
+
+RENDERERS = {'xml': render_xml, 'csv': render_csv, 'ndjson': render_ndjson}
+
+
+def render_feed(fmt, chunk_size=CHUNK_SIZE):
+    """Yields the feed as encoded byte chunks."""
+    for text in RENDERERS[fmt](feed_items(chunk_size)):
+        if text:
+            yield text.encode('utf-8')
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def fingerprint():
+    """Changes whenever a product (or, via signals, its variants/media) changes or is deleted."""
+    state = Product.objects.aggregate(updated=Max('updated_at'), count=Count('id'))
+    updated = state['updated'].isoformat() if state['updated'] else '-'
+    return f"{updated}|{state['count']}"
+
+
+def _is_current(path, stamp_path, current):
+    if not (os.path.exists(path) and os.path.exists(stamp_path)):
+        return False
+    with open(stamp_path) as stamp:
+        return stamp.read() == current
+
+
+def cached_feed_path(fmt, compress=False):
+    """
+    Path of an on-disk copy of the feed, rebuilt only when fingerprint()
+    moved since it was written. One rebuild runs at a time, under a cache
+    lock; meanwhile other callers get the previous copy (or wait for the
+    first one). Each rebuild writes its own temp file, swapped in atomically.
+    """
+    directory = settings.FEED_CACHE_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = f"feed.{FORMATS[fmt][1]}{'.gz' if compress else ''}"
+    path = os.path.join(directory, name)
+    stamp_path = path + '.fingerprint'
+
+    current = fingerprint()
+    if _is_current(path, stamp_path, current):
+        return path
+
+    lock, token = f'feed-rebuild:{name}', secrets.token_hex(8)
+    while not cache.add(lock, token, REBUILD_LOCK_TIMEOUT):
+        if os.path.exists(path):
+            return path  # stale, until the rebuild in progress swaps in
+        time.sleep(0.5)
+    try:
+        if _is_current(path, stamp_path, current):
+            return path  # rebuilt while we waited for the lock
+        chunks = render_feed(fmt)
+        if compress:
+            chunks = gzip_stream(chunks)
+        handle, partial = tempfile.mkstemp(dir=directory, prefix=f'{name}.', suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            os.replace(partial, path)
+        except BaseException:
+            os.unlink(partial)
+            raise
+        with open(stamp_path, 'w') as stamp:
+            stamp.write(current)
+    finally:
+        if cache.get(lock) == token:
+            cache.delete(lock)
+    return path
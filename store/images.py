@@ -0,0 +1,157 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Resized copies of every uploaded image are written next to the original,
+# e.g. products/kurta.jpg -> products/kurta_jpg_640w.webp (the source
+# extension keeps kurta.jpg and kurta.png apart), and recorded on the model's
+# `derivatives` field as:
+#   {"source": "products/kurta.jpg",
+#    "webp": {"320": "products/kurta_jpg_320w.webp", ...},
+#    "jpeg": {"320": "products/kurta_jpg_320w.jpg", ...}}
+
+WIDTHS = getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', [320, 640, 1280])
+
+FORMATS = {
+    # format: (extension, Pillow save options)
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Models whose `image` field gets derivatives.
+SOURCES = ['store.ProductImage', 'store.Category', 'web_content.HeroSlide']
+
+# Sent with sender=<model class> and pk=... once derivatives are saved.
+derivatives_ready = Signal()
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-derivatives')
+
+
+def derivative_name(name, width, fmt):
+    root, extension = os.path.splitext(name)
+    if extension:
+        root = f"{root}_{extension.lstrip('.').lower()}"
+    return f"{root}_{width}w.{FORMATS[fmt][0]}"
+
+
+def render(image, width, fmt):
+    resized = image.copy()
+    resized.thumbnail((width, width * 10), Image.LANCZOS)
+    if fmt == 'jpeg' and resized.mode != 'RGB':
+        background = Image.new('RGB', resized.size, (255, 255, 255))
+        rgba = resized.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        resized = background
+    elif resized.mode not in ('RGB', 'RGBA'):
+        resized = resized.convert('RGBA')
+    buffer = BytesIO()
+    resized.save(buffer, format=fmt.upper(), **FORMATS[fmt][1])
+    return buffer.getvalue()
+
+
+def generate_derivatives(field_file):
+    """Write the resized copies of `field_file` and return the derivatives map."""
+    storage = field_file.storage
+    derivatives = {'source': field_file.name}
+    with field_file.open('rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+
+    # Never upscale; an image narrower than every width is served as is.
+    widths = [width for width in WIDTHS if width < image.width]
+    for fmt in FORMATS:
+        derivatives[fmt] = {}
+        for width in widths:
+            name = derivative_name(field_file.name, width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            derivatives[fmt][str(width)] = storage.save(name, ContentFile(render(image, width, fmt)))
+    return derivatives
+
+
+def derivative_names(derivatives):
+    return {name for fmt in FORMATS for name in (derivatives or {}).get(fmt, {}).values()}
+
+
+def delete_derivatives(storage, derivatives, keep=None):
+    for name in derivative_names(derivatives) - derivative_names(keep):
+        storage.delete(name)
+
+
+def process(model_label, pk):
+    """Generate derivatives for one row, unless its image changed meanwhile."""
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not instance.image:
+        return
+    if (instance.derivatives or {}).get('source') == instance.image.name:
+        return
+
+    derivatives = generate_derivatives(instance.image)
+    updated = model.objects.filter(pk=pk, image=instance.image.name).update(derivatives=derivatives)
+    if not updated:
+        delete_derivatives(instance.image.storage, derivatives)
+        return
+    delete_derivatives(instance.image.storage, instance.derivatives, keep=derivatives)
+    derivatives_ready.send(sender=model, pk=pk)
+
+
+def _process_logged(model_label, pk):
+    try:
+        process(model_label, pk)
+    except Exception:
+        logger.exception("Image derivatives failed for %s pk=%s", model_label, pk)
+
+
+def _process_in_background(model_label, pk):
+    try:
+        _process_logged(model_label, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule_derivatives(sender, instance, raw=False, **kwargs):
+    """
+    post_save receiver: once the transaction commits, build derivatives for
+    a new or replaced image on a worker thread, off the request path.
+    """
+    if raw or not instance.image:
+        return
+    if (instance.derivatives or {}).get('source') == instance.image.name:
+        return
+    label = sender._meta.label
+    if getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+        transaction.on_commit(lambda: _executor.submit(_process_in_background, label, instance.pk))
+    else:
+        transaction.on_commit(lambda: _process_logged(label, instance.pk))
+
+
+def srcset(derivatives, request=None, storage=default_storage):
+    """
+    {'webp': 'https://.../x_320w.webp 320w, https://.../x_640w.webp 640w', 'jpeg': ...}
+    for use in <source srcset>; empty until the derivatives have been built.
+    """
+    if not derivatives:
+        return {}
+    result = {}
+    for fmt in FORMATS:
+        entries = []
+        for width, name in sorted(derivatives.get(fmt, {}).items(), key=lambda item: int(item[0])):
+            url = storage.url(name)
+            if request:
+                url = request.build_absolute_uri(url)
+            entries.append(f"{url} {width}w")
+        if entries:
+            result[fmt] = ', '.join(entries)
+    return result
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from store.models import ProductVariant, SiteConfig
+from store.pricing import quote, resolve_lines
+
+
+class Command(BaseCommand):
+    help = (
+        'Microbenchmark for store.pricing: resolving a cart of N lines in one query '
+        'versus one lookup per line, and quote() on already-resolved lines'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=15, help='Cart size (distinct variants)')
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        size, iterations = options['lines'], options['iterations']
+        if size < 1 or iterations < 1:
+            raise CommandError('--lines and --iterations must be positive.')
+        pairs = list(
+            ProductVariant.objects.filter(product__is_active=True)
+            .order_by('pk')
+            .values_list('product__sku', 'size')[:size]
+        )
+        if len(pairs) < size:
+            raise CommandError(f'Needs {size} variants of active products, found {len(pairs)}; import a catalog first.')
+        items = [{'sku': sku, 'size': variant_size, 'quantity': 2} for sku, variant_size in pairs]
+        config = SiteConfig.get_solo()
+
+        def per_line():
+            # What checkout used to do: one lookup (plus the product) per line
+            for item in items:
+                variant = ProductVariant.objects.get(product__sku=item['sku'], size=item['size'])
+                variant.product.price + variant.additional_price
+
+        lines = resolve_lines(items)
+        results = [
+            ('per-line lookups', per_line),
+            ('resolve_lines()', lambda: resolve_lines(items)),
+            ('quote() only', lambda: quote(lines, config=config)),
+        ]
+
+        self.stdout.write(f"{size} lines, {iterations} iterations")
+        for label, run in results:
+            with CaptureQueriesContext(connection) as queries:
+                run()
+            started = time.perf_counter()
+            for _ in range(iterations):
+                run()
+            per_call = (time.perf_counter() - started) / iterations * 1000
+            self.stdout.write(f"  {label:<18} {per_call:8.3f} ms/call  {len(queries):3d} queries")
+
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished."))
@@ -0,0 +1,39 @@
+import shutil
+import sys
+
+from django.core.management.base import BaseCommand
+
+from store.feeds import FORMATS, cached_feed_path, gzip_stream, render_feed
+
+
+class Command(BaseCommand):
+    help = 'Writes the product feed (one item per variant) to a file or stdout in constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(FORMATS), default='xml')
+        parser.add_argument('--output', '-o', help='File to write; defaults to stdout')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument(
+            '--cached', action='store_true',
+            help='Refresh the on-disk copy in FEED_CACHE_DIR only if products changed, then copy it',
+        )
+
+    def handle(self, *args, **options):
+        fmt, compress = options['format'], options['gzip']
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            if options['cached']:
+                with open(cached_feed_path(fmt, compress), 'rb') as cached:
+                    shutil.copyfileobj(cached, output)
+            else:
+                chunks = render_feed(fmt)
+                if compress:
+                    chunks = gzip_stream(chunks)
+                for chunk in chunks:
+                    output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"✅ Feed written to {options['output']}"))
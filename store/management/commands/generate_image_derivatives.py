@@ -0,0 +1,26 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from store.images import SOURCES, process
+
+
+class Command(BaseCommand):
+    help = 'Builds resized WebP/JPEG derivatives for uploaded images that lack them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild derivatives that already exist')
+
+    def handle(self, *args, **options):
+        for label in SOURCES:
+            model = apps.get_model(label)
+            rows = model.objects.exclude(image='').exclude(image__isnull=True)
+            if options['force']:
+                rows.update(derivatives={})
+            count = 0
+            for pk in rows.values_list('pk', flat=True).iterator():
+                try:
+                    process(label, pk)
+                    count += 1
+                except Exception as exc:
+                    self.stderr.write(f"⚠️ {label} pk={pk}: {exc}")
+            self.stdout.write(self.style.SUCCESS(f"✅ {label}: processed {count} images."))
@@ -0,0 +1,290 @@
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from store.cache import bump_versions
+from store.cards import sync_product_cards
+from store.facets import sync_facets
+from store.models import Category, Product, ProductImage, ProductVariant
+from store.search import index_products
+
+# Product columns that may appear in the file, besides sku/title/category.
+PRODUCT_FIELDS = [
+    'description', 'price', 'original_price', 'fabric', 'color', 'wash_care',
+    'disclaimer', 'manufacturer_name', 'manufacturer_address', 'country_of_origin',
+    'is_active', 'is_new', 'badge',
+]
+DECIMAL_FIELDS = {'price', 'original_price', 'additional_price'}
+BOOLEAN_FIELDS = {'is_active', 'is_new'}
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams a CSV or JSONL catalog file and upserts Category, Product (by sku), '
+        'ProductVariant (by product + size) and ProductImage rows in batches. '
+        'Each row is one variant: sku, title, category, price, size, stock, ... '
+        'JSONL rows may instead carry a "variants" list. Extra images go in an '
+        '"images" column as storage paths separated by "|". The search index, '
+        'facets and cards of the products in each batch are updated with it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to a .csv or .jsonl file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help="Don't update the search index, facets and product cards of imported products",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError('Use a .csv or .jsonl file, or pass --format.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        self.stats = dict.fromkeys(
+            ['rows', 'skipped', 'products_created', 'products_updated', 'variants_created', 'variants_updated', 'images_created'],
+            0,
+        )
+        started = time.monotonic()
+
+        with open(path, newline='', encoding='utf-8') as handle:
+            rows = self.read_rows(handle, fmt)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    products = self.import_batch(batch)
+                    if products and not options['skip_rebuild']:
+                        self.sync_products(products.values())
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"… {self.stats['rows']} rows ({self.stats['rows'] / elapsed:.0f} rows/s)")
+
+        # Bulk writes skip model signals, so invalidate cached responses here.
+        bump_versions('categories', 'products')
+        if self.stats['images_created']:
+            self.stdout.write("New images need resized copies: run manage.py generate_image_derivatives")
+
+        elapsed = time.monotonic() - started
+        summary = ', '.join(f"{key.replace('_', ' ')}: {value}" for key, value in self.stats.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Imported in {elapsed:.1f}s ({self.stats['rows'] / max(elapsed, 1e-9):.0f} rows/s). {summary}"
+        ))
+
+    # --- Reading ---
+
+    def read_rows(self, handle, fmt):
+        """Yields (line number, row dict) one variant at a time."""
+        if fmt == 'csv':
+            for line, row in enumerate(csv.DictReader(handle), start=2):
+                yield line, {key.strip(): (value or '').strip() for key, value in row.items() if key}
+            return
+
+        for line, text in enumerate(handle, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except json.JSONDecodeError as exc:
+                self.stderr.write(f"⚠️ Line {line}: invalid JSON ({exc})")
+                self.stats['skipped'] += 1
+                continue
+            if not isinstance(row, dict):
+                self.stderr.write(f"⚠️ Line {line}: skipped (not a JSON object)")
+                self.stats['skipped'] += 1
+                continue
+            variants = row.pop('variants', None)
+            if variants is not None and not (
+                isinstance(variants, list) and all(isinstance(variant, dict) for variant in variants)
+            ):
+                self.stderr.write(f"⚠️ Line {line}: skipped ('variants' must be a list of objects)")
+                self.stats['skipped'] += 1
+                continue
+            if variants:
+                for variant in variants:
+                    yield line, {**row, **variant}
+            else:
+                yield line, row
+
+    def clean(self, line, row):
+        try:
+            for field in ('sku', 'title', 'price', 'size'):
+                if not str(row.get(field, '')).strip():
+                    raise ValueError(f"missing '{field}'")
+            if not str(row.get('category') or row.get('category_slug') or '').strip():
+                raise ValueError("missing 'category'")
+            for field in DECIMAL_FIELDS:
+                value = row.get(field)
+                row[field] = Decimal(str(value)) if value not in (None, '') else None
+            for field in BOOLEAN_FIELDS:
+                value = row.get(field)
+                if value not in (None, ''):
+                    row[field] = value if isinstance(value, bool) else str(value).lower() in TRUE_VALUES
+            row['stock'] = int(row.get('stock') or 0)
+        except (ValueError, InvalidOperation) as exc:
+            self.stderr.write(f"⚠️ Line {line}: skipped ({exc})")
+            self.stats['skipped'] += 1
+            return None
+
+        row['sku'] = str(row['sku']).strip()
+        row['size'] = str(row['size']).strip()
+        row['category_name'] = str(row.get('category') or row.get('category_slug')).strip()
+        row['category_slug'] = str(row.get('category_slug') or slugify(row['category_name'])).strip()
+        return row
+
+    # --- Writing ---
+
+    def import_batch(self, batch):
+        """Upserts one batch; returns the products it touched, by sku."""
+        rows = [row for row in (self.clean(line, row) for line, row in batch) if row]
+        self.stats['rows'] += len(batch)
+        if not rows:
+            return {}
+
+        categories = self.upsert_categories(rows)
+        products = self.upsert_products(rows, categories)
+        self.upsert_variants(rows, products)
+        self.create_images(rows, products)
+        return products
+
+    def sync_products(self, products):
+        """
+        Bulk writes skip the store.signals receivers, so bring the search
+        terms, facets and cards of just these products up to date, in a
+        fixed number of queries per batch.
+        """
+        products = list(products)
+        ids = [product.pk for product in products]
+        index_products(products)
+        sync_facets(ids)
+        sync_product_cards(ids)
+
+    def upsert_categories(self, rows):
+        names = {row['category_slug']: row['category_name'] for row in rows}
+        existing = Category.objects.in_bulk(list(names), field_name='slug')
+        missing = [Category(slug=slug, name=name) for slug, name in names.items() if slug not in existing]
+        if missing:
+            Category.objects.bulk_create(missing)
+            existing = Category.objects.in_bulk(list(names), field_name='slug')
+        return existing
+
+    def upsert_products(self, rows, categories):
+        # Last row wins when a product spans several variant rows.
+        data = {}
+        for row in rows:
+            values = data.setdefault(row['sku'], {})
+            values.update({
+                field: row[field] for field in PRODUCT_FIELDS
+                if field in row and row[field] not in (None, '')
+            })
+            values['title'] = row['title']
+            values['category'] = categories[row['category_slug']]
+            if row.get('slug'):
+                values['slug'] = row['slug']
+
+        existing = Product.objects.in_bulk(list(data), field_name='sku')
+        # bulk_update() doesn't apply auto_now, so stamp updated_at ourselves
+        now = timezone.now()
+        to_create, to_update, update_fields = [], [], {'title', 'category', 'updated_at'}
+        for sku, values in data.items():
+            product = existing.get(sku)
+            if product is None:
+                values.setdefault('slug', slugify(values['title']))
+                values.setdefault('description', '')
+                to_create.append(Product(sku=sku, **values))
+            else:
+                for field, value in values.items():
+                    setattr(product, field, value)
+                product.updated_at = now
+                update_fields.update(values)
+                to_update.append(product)
+
+        if to_create:
+            self.dedupe_slugs(to_create)
+            Product.objects.bulk_create(to_create)
+            self.stats['products_created'] += len(to_create)
+        if to_update:
+            Product.objects.bulk_update(to_update, sorted(update_fields))
+            self.stats['products_updated'] += len(to_update)
+        return Product.objects.in_bulk(list(data), field_name='sku')
+
+    def dedupe_slugs(self, products):
+        """Suffix new slugs that would collide with each other or existing rows."""
+        taken = set(
+            Product.objects.filter(slug__in=[product.slug for product in products])
+            .values_list('slug', flat=True)
+        )
+        for product in products:
+            if product.slug in taken:
+                product.slug = slugify(f"{product.slug}-{product.sku}")
+            taken.add(product.slug)
+
+    def upsert_variants(self, rows, products):
+        wanted = {}
+        for row in rows:
+            wanted[(products[row['sku']].pk, row['size'])] = row
+
+        existing = {
+            (variant.product_id, variant.size): variant
+            for variant in ProductVariant.objects.filter(product__in=[p.pk for p in products.values()])
+        }
+        to_create, to_update = [], []
+        for key, row in wanted.items():
+            additional_price = row['additional_price'] or Decimal('0.00')
+            variant = existing.get(key)
+            if variant is None:
+                to_create.append(ProductVariant(
+                    product_id=key[0], size=key[1], stock=row['stock'], additional_price=additional_price,
+                ))
+            else:
+                variant.stock = row['stock']
+                variant.additional_price = additional_price
+                to_update.append(variant)
+
+        if to_create:
+            ProductVariant.objects.bulk_create(to_create)
+            self.stats['variants_created'] += len(to_create)
+        if to_update:
+            ProductVariant.objects.bulk_update(to_update, ['stock', 'additional_price'])
+            self.stats['variants_updated'] += len(to_update)
+
+    def create_images(self, rows, products):
+        wanted = {}
+        for row in rows:
+            for position, name in enumerate(str(row.get('images') or '').split('|')):
+                if name.strip():
+                    wanted.setdefault((products[row['sku']].pk, name.strip()), position == 0)
+        if not wanted:
+            return
+
+        existing = set(
+            ProductImage.objects.filter(product__in={pk for pk, _ in wanted})
+            .values_list('product_id', 'image')
+        )
+        has_primary = set(
+            ProductImage.objects.filter(product__in={pk for pk, _ in wanted}, is_primary=True)
+            .values_list('product_id', flat=True)
+        )
+        new_images = []
+        for (product_id, name), first in wanted.items():
+            if (product_id, name) in existing:
+                continue
+            primary = first and product_id not in has_primary
+            if primary:
+                has_primary.add(product_id)
+            new_images.append(ProductImage(product_id=product_id, image=name, is_primary=primary))
+        ProductImage.objects.bulk_create(new_images)
+        self.stats['images_created'] += len(new_images)
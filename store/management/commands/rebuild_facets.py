@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the precomputed catalog facet counts from scratch'
+
+    def handle(self, *args, **kwargs):
+        rows = rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt {rows} product facets."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.cards import rebuild_product_cards
+
+
+class Command(BaseCommand):
+    help = 'Recreates the denormalized ProductCard listing rows from scratch'
+
+    def handle(self, *args, **kwargs):
+        count = rebuild_product_cards()
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt {count} product cards."))
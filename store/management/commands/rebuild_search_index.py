@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Product
+from store.search import FIELD_WEIGHTS, index_product
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product search index from scratch'
+
+    def handle(self, *args, **kwargs):
+        count = 0
+        products = Product.objects.only('id', *FIELD_WEIGHTS).iterator(chunk_size=500)
+        for product in products:
+            index_product(product)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"✅ Indexed {count} products."))
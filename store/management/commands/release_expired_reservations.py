@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.coupons import release_unpaid_coupons
+from store.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes expired checkout stock holds in batches. Expired holds already '
+        'stop counting against stock; this keeps the table small and gives back '
+        'the coupon uses of orders still unpaid. Run it from cron, or with '
+        '--every to keep it running as a worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--every', type=float, metavar='SECONDS', help='Repeat forever, sleeping this long between sweeps')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        while True:
+            coupons = 0
+
+            def release_coupons(order_ids):
+                nonlocal coupons
+                coupons += release_unpaid_coupons(order_ids)
+
+            released = release_expired(options['batch_size'], on_release=release_coupons)
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Released {released} expired stock reservations and {coupons} coupon uses."
+            ))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
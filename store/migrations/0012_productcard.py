@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-16 23:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_facets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='store.product')),
+                ('category_slug', models.SlugField()),
+                ('title', models.CharField(max_length=255)),
+                ('slug', models.SlugField(unique=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('original_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('primary_image', models.CharField(blank=True, help_text='Storage path of the primary image', max_length=255)),
+                ('badge', models.CharField(blank=True, max_length=20, null=True)),
+                ('is_new', models.BooleanField(default=False)),
+                ('in_stock', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-created_at', '-product'], name='card_created_idx'), models.Index(fields=['category_slug', '-created_at', '-product'], name='card_category_created_idx')],
+            },
+        ),
+    ]
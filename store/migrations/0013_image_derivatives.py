@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-16 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_productcard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of the image (see store.images)'),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='primary_image_derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of the image (see store.images)'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-16 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='per_user_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='Uses allowed per customer (blank = no limit)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='coupon',
+            name='uses_count',
+            field=models.IntegerField(default=0, help_text='Kept by checkout; see orders.CouponRedemption for who used it'),
+        ),
+    ]
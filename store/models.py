@@ -1,10 +1,16 @@
+import time
+
+from django.conf import settings
 from django.db import models
 from django.utils.text import slugify
 
+from .cache import cache_is_shared, get_versions
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
+    derivatives = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized copies of the image (see store.images)")
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -51,6 +57,12 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination walks products by (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
@@ -65,6 +77,7 @@ class ProductImage(models.Model):
     # Now supports Image OR Video
     image = models.ImageField(upload_to='products/', blank=True, null=True, help_text="Upload Image")
     video = models.FileField(upload_to='product_videos/', blank=True, null=True, help_text="Upload Video (MP4)")
+    derivatives = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized copies of the image (see store.images)")
     
     is_primary = models.BooleanField(default=False)
 
@@ -86,6 +99,104 @@ class ProductVariant(models.Model):
     def __str__(self):
         return f"{self.product.title} - {self.size}"
 
+class StockReservation(models.Model):
+    """
+    Stock held for an unpaid order until expires_at (see store.reservations).
+    Available stock is stock minus the unexpired holds; rows are deleted when
+    the payment is captured or the hold is released.
+    """
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='reservations')
+    order = models.ForeignKey('orders.Order', on_delete=models.CASCADE, related_name='stock_reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Active holds per variant: SUM(quantity) WHERE variant = ? AND expires_at > now
+            models.Index(fields=['variant', 'expires_at'], name='reservation_variant_exp_idx'),
+            # The sweeper: expires_at <= now
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x variant {self.variant_id} for order #{self.order_id}"
+
+class ProductSearchTerm(models.Model):
+    """
+    Inverted index for product search: one row per (term, product), weighted
+    by where the term appears. Maintained by store.search on Product save.
+    """
+    term = models.CharField(max_length=50)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('term', 'product')
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+class ProductFacet(models.Model):
+    """
+    One filterable attribute value of an active product, e.g. ('fabric', 'Cotton')
+    or ('size', 'M') for a size that is in stock. Maintained by store.facets.
+    """
+    FACET_CHOICES = (
+        ('color', 'Color'),
+        ('fabric', 'Fabric'),
+        ('size', 'Size in stock'),
+        ('price_band', 'Price band'),
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='facets')
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES)
+    value = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = ('facet', 'value', 'product')
+
+    def __str__(self):
+        return f"{self.facet}={self.value} ({self.product_id})"
+
+class FacetCount(models.Model):
+    """Precomputed number of active products per facet value."""
+    facet = models.CharField(max_length=20, choices=ProductFacet.FACET_CHOICES)
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('facet', 'value')
+
+    def __str__(self):
+        return f"{self.value} ({self.count})"
+
+class ProductCard(models.Model):
+    """
+    Denormalized read model with just what a listing tile needs, one row per
+    active product. Kept up to date by store.cards from model signals.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='card')
+    category_slug = models.SlugField()
+    title = models.CharField(max_length=255)
+    slug = models.SlugField(unique=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    original_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    primary_image = models.CharField(max_length=255, blank=True, help_text="Storage path of the primary image")
+    primary_image_derivatives = models.JSONField(default=dict, blank=True)
+    badge = models.CharField(max_length=20, blank=True, null=True)
+    is_new = models.BooleanField(default=False)
+    in_stock = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-product'], name='card_created_idx'),
+            models.Index(fields=['category_slug', '-created_at', '-product'], name='card_category_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
 class Coupon(models.Model):
     DISCOUNT_TYPE_CHOICES = (
         ('percentage', 'Percentage'),
@@ -99,19 +210,56 @@ class Coupon(models.Model):
     valid_to = models.DateTimeField()
     active = models.BooleanField(default=True)
     usage_limit = models.IntegerField(default=100)
-    uses_count = models.IntegerField(default=0)
+    uses_count = models.IntegerField(default=0, help_text="Kept by checkout; see orders.CouponRedemption for who used it")
+    per_user_limit = models.PositiveIntegerField(null=True, blank=True, help_text="Uses allowed per customer (blank = no limit)")
 
     def __str__(self):
         return self.code
 
 class SiteConfig(models.Model):
+    # Cache namespace bumped on every change (see store.cache and get_solo)
+    CACHE_NAMESPACE = 'site-config'
+    CHECK_INTERVAL = getattr(settings, 'SITE_CONFIG_CHECK_INTERVAL', 1.0)
+
     shipping_flat_rate = models.DecimalField(max_digits=10, decimal_places=2, default=100.00)
     shipping_free_above = models.DecimalField(max_digits=10, decimal_places=2, default=2000.00)
     tax_rate_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=18.00) 
+
+    # Per-process copy for get_solo(): (instance, namespace version, time checked)
+    _solo = None
     
     def __str__(self):
         return "Miscellaneous Charges Configuration"
 
+    @classmethod
+    def get_solo(cls):
+        """
+        The site configuration, served from a per-process copy. The copy is
+        compared with the namespace version in the shared cache at most once
+        every CHECK_INTERVAL seconds and reloaded only when it changed, so an
+        admin edit reaches every worker within a second while the hot path
+        costs no query. Without a shared cache it is simply reloaded every
+        CHECK_INTERVAL. Falls back to an unsaved row with the defaults.
+        Treat the result as read-only.
+        """
+        now = time.monotonic()
+        solo = cls._solo
+        if solo is not None and now - solo[2] < cls.CHECK_INTERVAL:
+            return solo[0]
+
+        [version] = get_versions([cls.CACHE_NAMESPACE]) if cache_is_shared() else [None]
+        if solo is not None and version is not None and solo[1] == version:
+            cls._solo = (solo[0], version, now)
+            return solo[0]
+
+        instance = cls.objects.order_by('pk').first() or cls()
+        cls._solo = (instance, version, now)
+        return instance
+
+    @classmethod
+    def forget_solo(cls):
+        cls._solo = None
+
     class Meta:
         verbose_name = "Miscellaneous Charges"
         verbose_name_plural = "Miscellaneous Charges"
\ No newline at end of file
@@ -0,0 +1,119 @@
+import operator
+from decimal import Decimal, ROUND_HALF_UP
+from functools import reduce
+
+from django.db.models import Q
+
+from .coupons import check_coupon
+from .models import ProductVariant, SiteConfig
+
+# The one place prices are worked out. Cart, checkout, coupon validation and
+# /api/store/quote/ all build "lines" and hand them to quote():
+#   {'variant', 'sku', 'size', 'product_name', 'quantity', 'price_per_unit', 'line_total'}
+# Coupons come off the subtotal, tax is charged on the discounted subtotal,
+# and shipping is free once that reaches SiteConfig.shipping_free_above.
+
+CENTS = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+class PricingError(Exception):
+    """A cart that can't be priced; str(exc) is safe to show the shopper."""
+
+
+def money(value):
+    # SiteConfig defaults are floats until the row is saved
+    return Decimal(str(value)).quantize(CENTS)
+
+
+def unit_price(variant, product=None):
+    product = product or variant.product
+    return product.price + variant.additional_price
+
+
+def make_line(variant, quantity):
+    price = unit_price(variant)
+    return {
+        'variant': variant,
+        'sku': variant.product.sku,
+        'size': variant.size,
+        'product_name': variant.product.title,
+        'quantity': quantity,
+        'price_per_unit': price,
+        'line_total': price * quantity,
+    }
+
+
+def resolve_lines(items):
+    """
+    Lines for a client-side cart, [{'sku', 'size', 'quantity'}, ...], in the
+    given order. Every variant is fetched in one query; raises PricingError
+    for malformed items or variants that aren't for sale.
+    """
+    if not isinstance(items, list) or not items:
+        raise PricingError('Invalid items format. Expected a list of items.')
+
+    wanted = []
+    for item in items:
+        if not isinstance(item, dict) or not item.get('sku') or not item.get('size'):
+            raise PricingError("Each item must include 'sku' and 'size'.")
+        try:
+            quantity = int(item['quantity']) if item.get('quantity') not in (None, '') else 1
+        except (TypeError, ValueError):
+            raise PricingError('Quantity must be a whole number.')
+        if quantity < 1:
+            raise PricingError('Quantity must be at least 1.')
+        wanted.append((str(item['sku']), str(item['size']), quantity))
+
+    condition = reduce(operator.or_, (Q(product__sku=sku, size=size) for sku, size, _ in wanted))
+    variants = {
+        (variant.product.sku, variant.size): variant
+        for variant in ProductVariant.objects.filter(condition, product__is_active=True).select_related('product')
+    }
+
+    lines = []
+    for sku, size, quantity in wanted:
+        variant = variants.get((sku, size))
+        if variant is None:
+            raise PricingError(f'Product not available: {sku} ({size})')
+        lines.append(make_line(variant, quantity))
+    return lines
+
+
+def cart_lines(cart_items):
+    """Lines for server-side CartItems (with variant__product already loaded)."""
+    return [make_line(item.variant, item.quantity) for item in cart_items]
+
+
+def quote(lines, coupon_code=None, user=None, config=None):
+    """
+    Prices `lines` in one pass. Returns a dict with the lines, subtotal,
+    coupon, discount, shipping, tax and total. Raises store.coupons.CouponError
+    if `coupon_code` doesn't apply.
+    """
+    config = config or SiteConfig.get_solo()
+
+    subtotal = ZERO
+    for line in lines:
+        subtotal += line['line_total']
+
+    coupon, discount = None, ZERO
+    if coupon_code:
+        coupon, discount = check_coupon(coupon_code, subtotal, user)
+
+    taxable = subtotal - discount
+    if not lines or taxable >= money(config.shipping_free_above):
+        shipping = ZERO
+    else:
+        shipping = money(config.shipping_flat_rate)
+    tax = (taxable * money(config.tax_rate_percentage) / 100).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+    return {
+        'lines': lines,
+        'subtotal': subtotal,
+        'coupon': coupon,
+        'discount': discount,
+        'shipping': shipping,
+        'tax': tax,
+        'total': taxable + shipping + tax,
+    }
@@ -0,0 +1,130 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ProductVariant, StockReservation
+
+# Checkout holds stock for an order until it is paid or the hold expires:
+#   available = ProductVariant.stock - SUM(unexpired StockReservation.quantity)
+# Payment capture deducts stock and deletes the order's holds in the same
+# transaction. Expired holds stop counting the moment they expire; the
+# release_expired_reservations command clears them out of the table and gives
+# back the coupon uses of orders left unpaid.
+
+TTL = getattr(settings, 'STOCK_RESERVATION_TTL', 15 * 60)
+
+
+class InsufficientStock(Exception):
+    """str(exc) is safe to show the shopper."""
+
+
+def reserved_quantity(now=None):
+    """Unexpired quantity held on the variant in OuterRef('pk'), or 0."""
+    held = (
+        StockReservation.objects.filter(variant=OuterRef('pk'), expires_at__gt=now or timezone.now())
+        .order_by()
+        .values('variant')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return Coalesce(Subquery(held, output_field=IntegerField()), Value(0))
+
+
+def with_available(variants, now=None):
+    """Annotates a ProductVariant queryset with `reserved` and `available`."""
+    return variants.annotate(reserved=reserved_quantity(now)).annotate(available=F('stock') - F('reserved'))
+
+
+def lock_variants(ids):
+    """
+    Lock the variants in primary-key order, so concurrent callers queue
+    instead of deadlocking. Availability must be read in a later statement:
+    under READ COMMITTED a subquery in the locking SELECT is evaluated against
+    the snapshot from before the lock wait, missing holds committed meanwhile.
+    """
+    return list(
+        ProductVariant.objects.select_for_update().filter(pk__in=list(ids)).order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def available_stock(ids, now=None):
+    """{variant id: stock minus unexpired holds}."""
+    return dict(with_available(ProductVariant.objects.filter(pk__in=list(ids)), now).values_list('pk', 'available'))
+
+
+def reserve(order, lines, ttl=TTL):
+    """
+    Hold every line's quantity (see store.pricing) for `order` for `ttl`
+    seconds. Call inside the checkout transaction: the variants are locked
+    (lock_variants), checked against stock minus other active holds, and the
+    holds are inserted in one statement. Raises InsufficientStock, which must
+    roll the transaction back.
+    """
+    wanted, names = Counter(), {}
+    for line in lines:
+        wanted[line['variant'].pk] += line['quantity']
+        names[line['variant'].pk] = f"{line['product_name']} ({line['size']})"
+
+    now = timezone.now()
+    lock_variants(wanted)
+    available = available_stock(wanted, now)
+    for pk, quantity in wanted.items():
+        if available.get(pk, 0) < quantity:
+            raise InsufficientStock(f'Not enough stock for {names[pk]}')
+
+    expires_at = now + timedelta(seconds=ttl)
+    return StockReservation.objects.bulk_create([
+        StockReservation(variant_id=pk, order=order, quantity=quantity, expires_at=expires_at)
+        for pk, quantity in wanted.items()
+    ])
+
+
+def ensure_available(quantities, now=None):
+    """
+    For an order that holds none of its stock any more (its holds expired):
+    raise InsufficientStock unless {variant id: quantity} fits stock minus
+    other orders' active holds. Locks the variants; call inside the capture
+    transaction.
+    """
+    lock_variants(quantities)
+    available = available_stock(quantities, now)
+    if any(available.get(pk, 0) < quantity for pk, quantity in quantities.items()):
+        raise InsufficientStock('Out of stock for one or more items')
+
+
+def has_active_holds(order, now=None):
+    return StockReservation.objects.filter(order=order, expires_at__gt=now or timezone.now()).exists()
+
+
+def release_reservations(order):
+    """The order won't be paid: give its held stock back."""
+    return StockReservation.objects.filter(order=order).delete()[0]
+
+
+def convert_reservations(order):
+    """The order was paid: its stock is deducted in this transaction, drop the holds."""
+    return release_reservations(order)
+
+
+def release_expired(batch_size=1000, now=None, on_release=None):
+    """
+    Deletes expired holds in batches of primary keys; returns how many.
+    `on_release`, if given, is called with the set of order ids of each batch.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        batch = list(
+            StockReservation.objects.filter(expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('pk', 'order_id')[:batch_size]
+        )
+        if not batch:
+            return released
+        released += StockReservation.objects.filter(pk__in=[pk for pk, _ in batch]).delete()[0]
+        if on_release is not None:
+            on_release({order_id for _, order_id in batch})
@@ -0,0 +1,91 @@
+import unicodedata
+from collections import Counter
+from functools import reduce
+from itertools import groupby
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, Q, Sum, When
+
+from .models import ProductSearchTerm
+
+# Field -> weight of a term found in it. Title hits rank above attribute hits,
+# which rank above hits buried in the description.
+FIELD_WEIGHTS = {
+    'title': 8,
+    'color': 4,
+    'fabric': 4,
+    'description': 1,
+}
+
+STOP_WORDS = {'a', 'an', 'and', 'for', 'in', 'of', 'on', 'the', 'to', 'with'}
+
+MAX_TERM_LENGTH = ProductSearchTerm._meta.get_field('term').max_length
+
+
+
+def _is_word_char(char):
+    # Letters and digits of any script, plus combining marks: Devanagari
+    # vowel signs and viramas are marks, and \w alone would split words there
+    return unicodedata.category(char)[0] in 'LMN'
+
+
+def tokenize(text):
+    """
+    Lower-cased tokens of `text` (runs of letters, digits and combining
+    marks in any script, after NFKC normalization), without stop words.
+    """
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    tokens = (''.join(chars) for is_word, chars in groupby(text, _is_word_char) if is_word)
+    return [token[:MAX_TERM_LENGTH] for token in tokens if token not in STOP_WORDS]
+
+
+def index_product(product):
+    """Replace the search terms of a single product."""
+    index_products([product])
+
+
+def index_products(products):
+    """Replace the search terms of several products, in two queries."""
+    terms = []
+    for product in products:
+        weights = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(product, field)):
+                weights[token] += weight
+        terms += [
+            ProductSearchTerm(term=term, product=product, weight=weight)
+            for term, weight in weights.items()
+        ]
+
+    with transaction.atomic():
+        ProductSearchTerm.objects.filter(product__in=products).delete()
+        ProductSearchTerm.objects.bulk_create(terms)
+
+
+def search_products(query):
+    """
+    Returns a values queryset of {'product', 'score'} for active products
+    matching every token of `query`, best match first. The last token is
+    matched as a prefix so results update while the shopper is typing.
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return ProductSearchTerm.objects.none().values('product')
+
+    conditions = [Q(term=token) for token in tokens[:-1]]
+    conditions.append(Q(term__startswith=tokens[-1]))
+    matched = {
+        f'matched_{i}': Max(Case(When(condition, then=1), default=0, output_field=IntegerField()))
+        for i, condition in enumerate(conditions)
+    }
+
+    return (
+        ProductSearchTerm.objects
+        .filter(reduce(or_, conditions), product__is_active=True)
+        .values('product')
+        .annotate(score=Sum('weight'), **matched)
+        .filter(**{name: 1 for name in matched})
+        .values('product', 'score')
+        .order_by('-score', 'product')
+    )
@@ -1,10 +1,83 @@
 from rest_framework import serializers
-from .models import Product, ProductVariant, Category, ProductImage, Coupon, SiteConfig
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.storage import default_storage
+from .images import srcset
+from .models import Product, ProductVariant, Category, ProductImage, Coupon, SiteConfig, ProductCard
+
+
+def _param_list(request, name):
+    return [value.strip() for value in request.query_params.get(name, '').split(',') if value.strip()]
+
+
+class SparseFieldsetMixin:
+    """
+    Lets clients trim a ModelSerializer's output with ?fields=a,b (keep only
+    these) and/or ?omit=c,d (drop these), read from the request in context.
+
+    optimize_queryset() trims the SQL to match: unused columns are deferred
+    with only(), and relations are joined or prefetched only when a selected
+    field needs them. Method fields that read a relation declare it in
+    Meta.field_relations, e.g. {'images': 'media'}.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is not None:
+            keep = self.selected_fields(request, self.fields)
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+    @staticmethod
+    def selected_fields(request, available):
+        names = set(available)
+        fields = _param_list(request, 'fields')
+        if fields:
+            names &= set(fields)
+        return names - set(_param_list(request, 'omit'))
+
+    @classmethod
+    def optimize_queryset(cls, queryset, request=None, always=()):
+        fields = cls().fields
+        names = cls.selected_fields(request, fields) if request is not None else set(fields)
+        relations = getattr(cls.Meta, 'field_relations', {})
+        model = queryset.model
+
+        columns = {model._meta.pk.name, *always}
+        select, prefetch = set(), set()
+        for name in names:
+            lookup = relations.get(name) or fields[name].source
+            if lookup == '*':
+                continue
+            try:
+                model_field = model._meta.get_field(lookup)
+            except FieldDoesNotExist:
+                continue  # not backed by a model field or relation
+            if model_field.is_relation and (model_field.many_to_one or model_field.one_to_one) and model_field.concrete:
+                columns.add(lookup)
+                select.add(lookup)
+            elif model_field.is_relation:
+                prefetch.add(lookup)
+            else:
+                columns.add(lookup)
+
+        queryset = queryset.only(*columns)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
 
 class CategorySerializer(serializers.ModelSerializer):
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Category
-        fields = ('id', 'name', 'slug', 'image', 'description')
+        fields = ('id', 'name', 'slug', 'image', 'image_srcset', 'description')
+
+    def get_image_srcset(self, obj):
+        return srcset(obj.derivatives, self.context.get('request'))
 
 class ProductImageSerializer(serializers.ModelSerializer):
     # This serializer is for internal use if needed
@@ -17,12 +90,13 @@ class ProductVariantSerializer(serializers.ModelSerializer):
         model = ProductVariant
         fields = ('id', 'size', 'stock', 'additional_price')
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category = serializers.SerializerMethodField()
     variants = ProductVariantSerializer(many=True, read_only=True)
     
     # Explicitly defining these as MethodFields to avoid "Field name not valid" error
     images = serializers.SerializerMethodField()
+    imageSrcsets = serializers.SerializerMethodField()
     videos = serializers.SerializerMethodField()
     
     # Mapped fields
@@ -38,41 +112,70 @@ class ProductSerializer(serializers.ModelSerializer):
             'fabric', 'color', 'washCare', 
             'category', 
             'images', # Matches the SerializerMethodField above
+            'imageSrcsets', # One {'webp': ..., 'jpeg': ...} per entry in images
             'videos', # Matches the SerializerMethodField above
             'variants',
             'isNew', 'badge', 'is_active', 
             'disclaimer', 'manufacturer_name', 'manufacturer_address', 'country_of_origin'
         )
+        # Relations read by the SerializerMethodFields (see SparseFieldsetMixin)
+        field_relations = {
+            'category': 'category',
+            'images': 'media',
+            'imageSrcsets': 'media',
+            'videos': 'media',
+        }
 
     def get_category(self, obj):
         return obj.category.name if obj.category else None
 
     def get_images(self, obj):
+        return self._media_urls(obj, 'image')
+
+    def get_imageSrcsets(self, obj):
         request = self.context.get('request')
-        # Filter only items that have an image
-        media_items = obj.media.filter(image__isnull=False).exclude(image='')
-        urls = []
-        for item in media_items:
-            if item.image:
-                if request:
-                    urls.append(request.build_absolute_uri(item.image.url))
-                else:
-                    urls.append(item.image.url)
-        return urls
+        return [srcset(item.derivatives, request) for item in obj.media.all() if item.image]
 
     def get_videos(self, obj):
+        return self._media_urls(obj, 'video')
+
+    def _media_urls(self, obj, field):
+        # Uses obj.media.all() so the views' prefetch_related('media') is reused
+        # for both images and videos instead of querying once per product.
         request = self.context.get('request')
-        # Filter only items that have a video
-        media_items = obj.media.filter(video__isnull=False).exclude(video='')
         urls = []
-        for item in media_items:
-            if item.video:
+        for item in obj.media.all():
+            media_file = getattr(item, field)
+            if media_file:
                 if request:
-                    urls.append(request.build_absolute_uri(item.video.url))
+                    urls.append(request.build_absolute_uri(media_file.url))
                 else:
-                    urls.append(item.video.url)
+                    urls.append(media_file.url)
         return urls
 
+class ProductCardSerializer(serializers.ModelSerializer):
+    """Listing tile, read straight from the denormalized ProductCard row."""
+    id = serializers.IntegerField(source='product_id', read_only=True)
+    originalPrice = serializers.DecimalField(source='original_price', max_digits=10, decimal_places=2, read_only=True)
+    isNew = serializers.BooleanField(source='is_new', read_only=True)
+    inStock = serializers.BooleanField(source='in_stock', read_only=True)
+    image = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductCard
+        fields = ('id', 'title', 'slug', 'price', 'originalPrice', 'image', 'srcset', 'badge', 'isNew', 'inStock')
+
+    def get_image(self, obj):
+        if not obj.primary_image:
+            return None
+        url = default_storage.url(obj.primary_image)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_srcset(self, obj):
+        return srcset(obj.primary_image_derivatives, self.context.get('request'))
+
 class CouponSerializer(serializers.ModelSerializer):
     class Meta:
         model = Coupon
@@ -81,4 +184,23 @@ class CouponSerializer(serializers.ModelSerializer):
 class SiteConfigSerializer(serializers.ModelSerializer):
     class Meta:
         model = SiteConfig
-        fields = ('id', 'shipping_flat_rate', 'shipping_free_above', 'tax_rate_percentage')
\ No newline at end of file
+        fields = ('id', 'shipping_flat_rate', 'shipping_free_above', 'tax_rate_percentage')
+
+
+class QuoteLineSerializer(serializers.Serializer):
+    sku = serializers.CharField()
+    size = serializers.CharField()
+    product_name = serializers.CharField()
+    quantity = serializers.IntegerField()
+    price_per_unit = serializers.DecimalField(max_digits=10, decimal_places=2)
+    line_total = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+class QuoteSerializer(serializers.Serializer):
+    """Renders a store.pricing.quote() result."""
+    lines = QuoteLineSerializer(many=True)
+    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2)
+    coupon = serializers.SlugRelatedField(slug_field='code', read_only=True)
+    discount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    shipping = serializers.DecimalField(max_digits=10, decimal_places=2)
+    tax = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total = serializers.DecimalField(max_digits=10, decimal_places=2)
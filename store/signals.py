@@ -0,0 +1,156 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidate
+from .cards import sync_product_card
+from .facets import sync_product_facets
+from .images import derivatives_ready, schedule_derivatives
+from .models import Category, Product, ProductCard, ProductImage, ProductVariant, SiteConfig
+from .search import FIELD_WEIGHTS, index_product
+
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, update_fields=None, raw=False, **kwargs):
+    # Saves that don't touch searchable text (e.g. update_fields=['is_active'])
+    # leave the index alone.
+    if raw or (update_fields and not set(update_fields) & set(FIELD_WEIGHTS)):
+        return
+    index_product(instance)
+
+
+@receiver(post_save, sender=Product)
+def sync_product_facet_counts(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_product_facets(instance.pk)
+
+
+@receiver(pre_delete, sender=Product)
+def remove_product_facet_counts(sender, instance, **kwargs):
+    sync_product_facets(instance.pk, deleted=True)
+
+
+@receiver(post_save, sender=ProductVariant)
+def sync_variant_facet_counts(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_product_facets(instance.product_id)
+
+
+@receiver(post_delete, sender=ProductVariant)
+def remove_variant_facet_counts(sender, instance, origin=None, **kwargs):
+    # Variants deleted by a cascade from their product (or its category)
+    # were already taken out of the counts by remove_product_facet_counts.
+    if _deleted_via(origin, Product) or _deleted_via(origin, Category):
+        return
+    sync_product_facets(instance.product_id)
+
+
+def _deleted_via(origin, model):
+    """Whether a cascade delete started from `model` (an instance or a queryset)."""
+    if isinstance(origin, QuerySet):
+        return origin.model is model
+    return isinstance(origin, model)
+
+
+# --- Product.updated_at covers variant and media changes too ---
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product(sender, instance, raw=False, origin=None, **kwargs):
+    # update() rather than save(): no signal cascade back into the product
+    if raw or _deleted_via(origin, Product) or _deleted_via(origin, Category):
+        return
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+# --- ProductCard read model (see store.cards) ---
+
+@receiver(post_save, sender=Product)
+def sync_card_for_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_product_card(instance.pk)
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def sync_card_for_product_child(sender, instance, raw=False, origin=None, **kwargs):
+    # The card goes away with the product itself (on_delete=CASCADE).
+    if raw or _deleted_via(origin, Product) or _deleted_via(origin, Category):
+        return
+    sync_product_card(instance.product_id)
+
+
+@receiver(post_save, sender=Category)
+def sync_card_category_slug(sender, instance, raw=False, **kwargs):
+    if not raw:
+        ProductCard.objects.filter(product__category=instance).exclude(
+            category_slug=instance.slug
+        ).update(category_slug=instance.slug)
+
+
+# --- Response cache invalidation (see store.cache) ---
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    invalidate('categories')
+
+
+@receiver(pre_save, sender=Product)
+def invalidate_renamed_product_cache(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    old_slug = Product.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+    if old_slug and old_slug != instance.slug:
+        invalidate(f'product:{old_slug}')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    invalidate('products', f'product:{instance.slug}')
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_product_child_cache(sender, instance, origin=None, **kwargs):
+    if _deleted_via(origin, Product) or _deleted_via(origin, Category):
+        return
+    slug = Product.objects.filter(pk=instance.product_id).values_list('slug', flat=True).first()
+    invalidate('products', f'product:{slug}')
+
+
+@receiver(post_save, sender=SiteConfig)
+@receiver(post_delete, sender=SiteConfig)
+def invalidate_site_config(sender, instance, **kwargs):
+    # Other workers notice the version bump; this one can drop its copy now
+    invalidate(SiteConfig.CACHE_NAMESPACE)
+    transaction.on_commit(SiteConfig.forget_solo)
+
+
+# --- Image derivatives (see store.images) ---
+
+post_save.connect(schedule_derivatives, sender=ProductImage, dispatch_uid='productimage_derivatives')
+post_save.connect(schedule_derivatives, sender=Category, dispatch_uid='category_derivatives')
+
+
+@receiver(derivatives_ready, sender=ProductImage)
+def product_image_derivatives_ready(sender, pk, **kwargs):
+    image = ProductImage.objects.select_related('product').filter(pk=pk).first()
+    if image is None:
+        return
+    sync_product_card(image.product_id)
+    invalidate('products', f'product:{image.product.slug}')
+
+
+@receiver(derivatives_ready, sender=Category)
+def category_derivatives_ready(sender, pk, **kwargs):
+    invalidate('categories')
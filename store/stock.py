@@ -0,0 +1,106 @@
+import hashlib
+import operator
+from decimal import Decimal
+from functools import reduce
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .cache import KEY_PREFIX, bump_versions, get_versions
+from .cards import sync_product_card
+from .facets import sync_product_facets
+from .models import Product, ProductVariant
+from .reservations import InsufficientStock, with_available
+
+MAX_LINES = getattr(settings, 'STORE_STOCK_MAX_LINES', 50)
+CACHE_TIMEOUT = getattr(settings, 'STORE_STOCK_CACHE_TIMEOUT', 5)
+CENTS = Decimal('0.01')
+
+# Per-(sku, size) entries are keyed by the 'products' namespace version, so
+# admin edits and checkouts show up at once; the short timeout bounds how
+# stale a level can get through writes that skip model signals.
+
+
+def _key(version, sku, size):
+    digest = hashlib.md5(f'{sku}\x00{size}'.encode()).hexdigest()
+    return f'{KEY_PREFIX}:stock:{version}:{digest}'
+
+
+def stock_levels(pairs):
+    """
+    {(sku, size): {'stock': ..., 'price': ...} or None} for every pair, where
+    stock is what's left after active checkout holds (store.reservations),
+    price is the unit price (product price + variant surcharge) and None
+    means no such variant on an active product. Pairs not in the cache are
+    resolved together in one query.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    [version] = get_versions(['products'])
+    keys = {pair: _key(version, *pair) for pair in pairs}
+    cached = cache.get_many(keys.values())
+    levels = {pair: cached[key] for pair, key in keys.items() if key in cached}
+
+    missing = [pair for pair in pairs if pair not in levels]
+    if missing:
+        condition = reduce(operator.or_, (Q(product__sku=sku, size=size) for sku, size in missing))
+        rows = (
+            with_available(ProductVariant.objects.filter(condition, product__is_active=True))
+            .annotate(unit_price=ExpressionWrapper(
+                F('product__price') + F('additional_price'),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ))
+            .values_list('product__sku', 'size', 'available', 'unit_price')
+        )
+        found = {
+            (sku, size): {'stock': max(available, 0), 'price': price.quantize(CENTS)}
+            for sku, size, available, price in rows
+        }
+        fresh = {pair: found.get(pair) for pair in missing}
+        cache.set_many({keys[pair]: level for pair, level in fresh.items()}, CACHE_TIMEOUT)
+        levels.update(fresh)
+    return levels
+
+
+def deduct_stock(quantities):
+    """
+    Take {variant id: quantity} off stock with one conditional UPDATE
+    (SET stock = stock - q WHERE stock >= q), all or nothing: raises
+    InsufficientStock and deducts nothing if any variant is short. The rows
+    are locked in primary-key order first, so concurrent captures queue
+    instead of deadlocking. Call inside the capture transaction.
+    """
+    ids = sorted(quantities)
+    if not ids:
+        return
+    locked = (
+        ProductVariant.objects.select_for_update(of=('self',))
+        .filter(pk__in=ids)
+        .order_by('pk')
+        .values_list('product_id', 'product__slug')
+    )
+    products = dict(locked)
+
+    wanted = Case(
+        *(When(pk=pk, then=Value(quantities[pk])) for pk in ids),
+        output_field=IntegerField(),
+    )
+    with transaction.atomic():
+        updated = ProductVariant.objects.filter(pk__in=ids, stock__gte=wanted).update(stock=F('stock') - wanted)
+        if updated != len(ids):
+            raise InsufficientStock('Out of stock for one or more items')
+
+    # update() skips the model signals (store.signals), so sync what they
+    # would, after commit to keep the capture transaction short
+    transaction.on_commit(lambda: stock_changed(products))
+
+
+def stock_changed(products):
+    """Refresh the catalog read models for {product id: slug} after a bulk stock change."""
+    for product_id in products:
+        sync_product_facets(product_id)
+        sync_product_card(product_id)
+    Product.objects.filter(pk__in=list(products)).update(updated_at=timezone.now())
+    bump_versions('products', *(f'product:{slug}' for slug in products.values()))
@@ -1,3 +1,788 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from accounts.models import CustomUser
+
+from .cache import bump_versions
+from .cards import rebuild_product_cards
+from .facets import rebuild_facets
+from .images import derivative_name
+from .management.commands import import_catalog
+from .models import Category, Coupon, FacetCount, Product, ProductCard, ProductFacet, ProductImage, ProductVariant, SiteConfig
+from .pagination import KeysetPagination
+from .search import tokenize
+
+
+def make_product(category, index, **kwargs):
+    defaults = {
+        'category': category,
+        'title': f'Kurta {index}',
+        'slug': f'kurta-{index}',
+        'sku': f'SKU-{index}',
+        'description': 'Hand-dyed cotton kurta',
+        'price': '1000.00',
+        'country_of_origin': 'India',
+    }
+    defaults.update(kwargs)
+    product = Product.objects.create(**defaults)
+    ProductImage.objects.create(product=product, image=f'products/{index}.jpg', is_primary=True)
+    ProductImage.objects.create(product=product, video=f'product_videos/{index}.mp4')
+    ProductVariant.objects.create(product=product, size='M', stock=5)
+    ProductVariant.objects.create(product=product, size='L', stock=0)
+    return product
+
+
+@override_settings(IMAGE_DERIVATIVES_ASYNC=False)
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        # Catalog responses are cached; never let one test see another's.
+        cache.clear()
+        # The test cache is LocMemCache, shared by everything in this process
+        for target in ('store.cache.cache_is_shared', 'store.models.cache_is_shared'):
+            patcher = mock.patch(target, return_value=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class ProductQueryCountTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Kurtas', slug='kurtas')
+
+    def test_list_query_count_is_independent_of_catalog_size(self):
+        make_product(self.category, 0)
+        # products + media + variants + facet counts
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('product_list'))
+        self.assertEqual(len(response.data['results']), 1)
+
+        for index in range(1, 10):
+            make_product(self.category, index)
+        cache.clear()
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('product_list'))
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_detail_splits_images_and_videos(self):
+        product = make_product(self.category, 0)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('product_detail', args=[product.slug]))
+        self.assertEqual(response.data['category'], 'Kurtas')
+        self.assertEqual(len(response.data['images']), 1)
+        self.assertTrue(response.data['images'][0].endswith('/media/products/0.jpg'))
+        self.assertEqual(len(response.data['videos']), 1)
+        self.assertEqual(len(response.data['variants']), 2)
+
+
+class ProductPaginationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Kurtas', slug='kurtas')
+        other = Category.objects.create(name='Sarees', slug='sarees')
+        self.products = [make_product(self.category, index) for index in range(5)]
+        make_product(other, 99)
+
+    def walk(self, url):
+        slugs, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            slugs += [item['slug'] for item in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return slugs, pages
+
+    def test_cursor_walks_filtered_catalog_newest_first(self):
+        slugs, pages = self.walk(reverse('product_list') + '?category=kurtas&page_size=2')
+        self.assertEqual(slugs, [p.slug for p in reversed(self.products)])
+        self.assertEqual(pages, 3)
+
+    def test_previous_link_returns_to_earlier_page(self):
+        first = self.client.get(reverse('product_list') + '?category=kurtas&page_size=2')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(KeysetPagination, 'max_page_size', 4):
+            response = self.client.get(reverse('product_list') + '?page_size=100000')
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('product_list') + '?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductSearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Kurtas', slug='kurtas')
+        self.shibori = make_product(
+            category, 1, title='Shibori Cotton Kurta', fabric='Cotton', color='Indigo',
+        )
+        self.silk = make_product(
+            category, 2, title='Silk Kurta', fabric='Silk', color='Red',
+            description='Pairs well with a cotton dupatta',
+        )
+        make_product(category, 3, title='Cotton Saree', fabric='Cotton', is_active=False)
+
+    def search(self, query):
+        response = self.client.get(reverse('product_search'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['slug'] for item in response.data['results']]
+
+    def test_ranks_title_and_attribute_hits_above_description(self):
+        self.assertEqual(self.search('cotton'), [self.shibori.slug, self.silk.slug])
+
+    def test_all_tokens_must_match_and_last_is_prefix(self):
+        self.assertEqual(self.search('kurta indi'), [self.shibori.slug])
+        self.assertEqual(self.search('silk indigo'), [])
+
+    def test_index_follows_product_edits(self):
+        self.silk.title = 'Silk Indigo Kurta'
+        self.silk.save()
+        self.assertEqual(self.search('silk indigo'), [self.silk.slug])
+
+    def test_blank_query_returns_nothing(self):
+        self.assertEqual(self.search('  '), [])
+
+    def test_accented_and_non_latin_text_is_indexed(self):
+        category = Category.objects.get(slug='kurtas')
+        hindi = make_product(category, 4, title='हथकरघा कुर्ता', fabric='खादी')
+        accented = make_product(category, 5, title='Crêpe Kurta', color='Café')
+        self.assertEqual(self.search('कुर्ता'), [hindi.slug])
+        self.assertEqual(self.search('खा'), [hindi.slug])
+        self.assertEqual(self.search('CAFÉ crê'), [accented.slug])
+        self.assertEqual(self.search('cafe'), [])  # accents are kept
+        self.assertEqual(tokenize('Kurta_Set Cafe\u0301'), ['kurta', 'set', 'café'])
+
+
+class ProductFacetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Kurtas', slug='kurtas')
+        self.cotton = make_product(category, 1, fabric='Cotton', color='Indigo', price='800.00')
+        self.silk = make_product(category, 2, fabric='Silk', color='Red', price='2500.00')
+        variant = self.silk.variants.get(size='L')
+        variant.stock = 3
+        variant.save()
+
+    def facets(self):
+        return self.client.get(reverse('product_list')).data['facets']
+
+    def counts(self):
+        return dict(
+            ((facet, value), count)
+            for facet, value, count in FacetCount.objects.filter(count__gt=0).values_list('facet', 'value', 'count')
+        )
+
+    def list_slugs(self, **params):
+        response = self.client.get(reverse('product_list'), params)
+        return sorted(item['slug'] for item in response.data['results'])
+
+    def test_facet_block_in_listing(self):
+        facets = self.facets()
+        self.assertEqual(facets['fabric'], [{'value': 'Cotton', 'count': 1}, {'value': 'Silk', 'count': 1}])
+        self.assertEqual(facets['size'], [{'value': 'L', 'count': 1}, {'value': 'M', 'count': 2}])
+        self.assertEqual(facets['price_band'], [{'value': '0-1000', 'count': 1}, {'value': '2000-5000', 'count': 1}])
+
+    def test_counts_follow_product_and_variant_changes(self):
+        variant = self.cotton.variants.get(size='L')
+        variant.stock = 4
+        variant.save()
+        self.assertEqual(self.counts()[('size', 'L')], 2)
+
+        self.cotton.fabric = 'Silk'
+        self.cotton.save()
+        self.assertEqual(self.counts()[('fabric', 'Silk')], 2)
+        self.assertNotIn(('fabric', 'Cotton'), self.counts())
+
+        self.silk.is_active = False
+        self.silk.save()
+        self.assertEqual(self.counts()[('fabric', 'Silk')], 1)
+
+        self.cotton.delete()
+        self.assertEqual(self.counts(), {})
+
+    def test_deleting_a_category_removes_its_products_counts(self):
+        Category.objects.get(slug='kurtas').delete()
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(ProductFacet.objects.exists())
+        self.assertEqual(self.counts(), {})
+
+    def test_incremental_counts_match_rebuild(self):
+        self.cotton.variants.get(size='M').delete()
+        incremental = self.counts()
+        rebuild_facets()
+        self.assertEqual(self.counts(), incremental)
+
+    def test_filters(self):
+        self.assertEqual(self.list_slugs(fabric='Cotton'), [self.cotton.slug])
+        self.assertEqual(self.list_slugs(size='L'), [self.silk.slug])
+        self.assertEqual(self.list_slugs(color='Indigo,Red', price_band='2000-5000'), [self.silk.slug])
+        self.assertEqual(self.list_slugs(min_price='1000'), [self.silk.slug])
+        self.assertEqual(self.list_slugs(max_price='1000'), [self.cotton.slug])
+        response = self.client.get(reverse('product_list'), {'min_price': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CatalogCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Kurtas', slug='kurtas')
+        self.first = make_product(self.category, 1)
+        self.second = make_product(self.category, 2)
+
+    def get(self, url, **params):
+        return self.client.get(url, params)
+
+    def test_repeat_requests_are_served_from_cache(self):
+        url = reverse('product_list')
+        self.assertEqual(self.get(url, is_new='false', category='kurtas')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.get(url, category='kurtas', is_new='false')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_product_change_invalidates_listing_and_only_its_detail(self):
+        list_url = reverse('product_list')
+        first_url = reverse('product_detail', args=[self.first.slug])
+        second_url = reverse('product_detail', args=[self.second.slug])
+        for url in (list_url, first_url, second_url):
+            self.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            variant = self.first.variants.get(size='L')
+            variant.stock = 9
+            variant.save()
+
+        self.assertEqual(self.get(list_url)['X-Cache'], 'MISS')
+        self.assertEqual(self.get(first_url)['X-Cache'], 'MISS')
+        self.assertEqual(self.get(second_url)['X-Cache'], 'HIT')
+
+    def test_category_change_invalidates_categories_and_products(self):
+        category_url = reverse('category_list')
+        detail_url = reverse('product_detail', args=[self.first.slug])
+        search_url = reverse('product_search')
+        self.get(category_url)
+        self.get(detail_url)
+        self.get(search_url, q='kurta')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Kurta Sets'
+            self.category.save()
+
+        response = self.get(category_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data[0]['name'], 'Kurta Sets')
+        self.assertEqual(self.get(detail_url).data['category'], 'Kurta Sets')
+        response = self.get(search_url, q='kurta')
+        self.assertEqual((response['X-Cache'], response.data['results'][0]['category']), ('MISS', 'Kurta Sets'))
+        self.assertEqual(self.get(search_url, q='kurta')['X-Cache'], 'HIT')
+
+    def test_renamed_product_old_slug_is_invalidated(self):
+        old_url = reverse('product_detail', args=[self.first.slug])
+        self.assertEqual(self.get(old_url).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.slug = 'renamed-kurta'
+            self.first.save()
+
+        self.assertEqual(self.get(old_url).status_code, 404)
+
+    def test_stats_are_staff_only(self):
+        url = reverse('product_list')
+        self.get(url)
+        self.get(url)
+
+        self.assertIn(self.client.get(reverse('catalog_cache_stats')).status_code, (401, 403))
+        staff = CustomUser.objects.create_user(email='staff@example.com', password='pw', is_staff=True)
+        self.client.force_authenticate(staff)
+        stats = self.client.get(reverse('catalog_cache_stats')).data
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (1, 1, 0.5))
+
+
+class ConditionalGetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = make_product(Category.objects.create(name='Kurtas', slug='kurtas'), 1)
+        self.url = reverse('product_detail', args=[self.product.slug])
+
+    def test_matching_etag_gets_304_without_queries(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.url)
+        not_modified = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_change_produces_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = '1200.00'
+            self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_listing_and_categories_have_validators(self):
+        for url in (reverse('product_list'), reverse('category_list')):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_per_process_cache_serves_fresh_responses_without_validators(self):
+        with mock.patch('store.cache.cache_is_shared', return_value=False):
+            self.client.get(self.url)
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('X-Cache'))
+
+
+class ProductCardTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Kurtas', slug='kurtas')
+        self.product = make_product(self.category, 1, original_price='1500.00', is_new=True)
+
+    def card(self):
+        return ProductCard.objects.get(product=self.product)
+
+    def test_card_tracks_product_variants_and_images(self):
+        card = self.card()
+        self.assertEqual((card.title, card.category_slug, card.primary_image), ('Kurta 1', 'kurtas', 'products/1.jpg'))
+        self.assertTrue(card.in_stock)
+
+        self.product.variants.filter(size='M').delete()
+        self.assertFalse(self.card().in_stock)
+
+        self.product.media.filter(is_primary=True).delete()
+        self.assertEqual(self.card().primary_image, '')
+
+        self.category.slug = 'kurta-sets'
+        self.category.save()
+        self.assertEqual(self.card().category_slug, 'kurta-sets')
+
+        self.product.is_active = False
+        self.product.save()
+        self.assertFalse(ProductCard.objects.exists())
+
+    def test_rebuild_matches_incremental_cards(self):
+        before = list(ProductCard.objects.values())
+        rebuild_product_cards()
+        self.assertEqual(list(ProductCard.objects.values()), before)
+
+    def test_card_listing_is_a_single_query(self):
+        for index in range(2, 6):
+            make_product(self.category, index)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('product_cards'), {'category': 'kurtas', 'page_size': 3})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+
+        tile = self.client.get(reverse('product_cards'), {'is_new': 'true'}).data['results'][0]
+        self.assertEqual(tile['slug'], self.product.slug)
+        self.assertEqual(tile['originalPrice'], '1500.00')
+        self.assertTrue(tile['image'].endswith('/media/products/1.jpg'))
+        self.assertTrue(tile['inStock'])
+
+
+class ImageDerivativeTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.product = make_product(Category.objects.create(name='Kurtas', slug='kurtas'), 1)
+        self.product.media.all().delete()
+
+    def upload(self, width=800, height=1000):
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, format='PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProductImage.objects.create(
+                product=self.product,
+                image=SimpleUploadedFile('kurta.png', buffer.getvalue()),
+                is_primary=True,
+            )
+
+    def test_upload_builds_webp_and_jpeg_widths(self):
+        image = self.upload()
+        image.refresh_from_db()
+        self.assertEqual(image.derivatives['source'], image.image.name)
+        self.assertEqual(sorted(image.derivatives['webp']), ['320', '640'])
+        with default_storage.open(image.derivatives['webp']['320']) as derivative:
+            self.assertEqual(Image.open(derivative).size, (320, 400))
+        with default_storage.open(image.derivatives['jpeg']['640']) as derivative:
+            self.assertEqual(Image.open(derivative).format, 'JPEG')
+
+    def test_sources_differing_only_in_extension_get_their_own_derivatives(self):
+        self.assertEqual(derivative_name('products/kurta.jpg', 320, 'webp'), 'products/kurta_jpg_320w.webp')
+        self.assertNotEqual(
+            derivative_name('products/kurta.jpg', 320, 'webp'), derivative_name('products/kurta.png', 320, 'webp'),
+        )
+
+    def test_serializers_expose_srcsets(self):
+        self.upload()
+        detail = self.client.get(reverse('product_detail', args=[self.product.slug])).data
+        self.assertEqual(len(detail['imageSrcsets']), 1)
+        self.assertRegex(detail['imageSrcsets'][0]['webp'], r'^http://testserver/media/products/kurta\S*_320w\.webp 320w, ')
+
+        tile = self.client.get(reverse('product_cards')).data['results'][0]
+        self.assertTrue(tile['srcset']['jpeg'].endswith('640w'))
+
+    def test_small_images_are_not_upscaled(self):
+        image = self.upload(width=200, height=200)
+        image.refresh_from_db()
+        self.assertEqual(image.derivatives['webp'], {})
+
+
+class SparseFieldsetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = make_product(Category.objects.create(name='Kurtas', slug='kurtas'), 1)
+
+    def test_fields_trims_payload_and_sql(self):
+        # products + facet counts; no media, variants or category join
+        with self.assertNumQueries(2) as queries:
+            response = self.client.get(reverse('product_list'), {'fields': 'title,slug,price'})
+        self.assertEqual(set(response.data['results'][0]), {'title', 'slug', 'price'})
+        product_sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('description', product_sql)
+        self.assertNotIn('store_category', product_sql)
+
+    def test_omit_skips_unused_prefetches(self):
+        url = reverse('product_detail', args=[self.product.slug])
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'omit': 'images,imageSrcsets,videos,disclaimer'})
+        self.assertIn('variants', response.data)
+        self.assertIn('category', response.data)
+        self.assertNotIn('images', response.data)
+        self.assertNotIn('disclaimer', response.data)
+
+
+class ImportCatalogTests(CatalogTestCase):
+    CSV = (
+        "sku,title,category,price,original_price,fabric,color,size,stock,is_new,images\n"
+        "KRT-1,Shibori Kurta,Kurtas,1200,1500,Cotton,Indigo,M,4,true,products/krt1.jpg|products/krt1b.jpg\n"
+        "KRT-1,Shibori Kurta,Kurtas,1200,1500,Cotton,Indigo,L,0,true,\n"
+        "SAR-1,Silk Saree,Sarees,5400,,Silk,Red,Free,2,false,\n"
+        "BAD-1,,Kurtas,100,,,,M,1,,\n"
+    )
+
+    def run_import(self, name, content, *args):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = f'{directory}/{name}'
+        with open(path, 'w') as handle:
+            handle.write(content)
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_upserts_in_batches(self):
+        out, err = self.run_import('catalog.csv', self.CSV, '--batch-size', '2')
+        self.assertIn("Line 5: skipped (missing 'title')", err)
+        self.assertIn('rows/s', out)
+
+        kurta = Product.objects.get(sku='KRT-1')
+        self.assertEqual((kurta.category.slug, kurta.price, kurta.is_new), ('kurtas', Decimal('1200'), True))
+        self.assertEqual(sorted(kurta.variants.values_list('size', 'stock')), [('L', 0), ('M', 4)])
+        self.assertEqual(list(kurta.media.filter(is_primary=True).values_list('image', flat=True)), ['products/krt1.jpg'])
+        self.assertEqual(Category.objects.count(), 2)
+
+        # Derived read models of the imported products are synced with each batch.
+        self.assertTrue(ProductCard.objects.get(product=kurta).in_stock)
+        self.assertEqual(FacetCount.objects.get(facet='fabric', value='Silk').count, 1)
+        self.assertTrue(kurta.search_terms.filter(term='shibori').exists())
+
+        # Re-importing updates in place.
+        self.run_import('catalog.csv', self.CSV.replace(',M,4,', ',M,9,'))
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(kurta.variants.get(size='M').stock, 9)
+        self.assertEqual(kurta.media.count(), 2)
+
+    def test_jsonl_with_nested_variants(self):
+        line = {
+            'sku': 'KRT-2', 'title': 'Block Print Kurta', 'category': 'Kurtas', 'price': 999.5,
+            'variants': [{'size': 'S', 'stock': 1}, {'size': 'M', 'stock': 2, 'additional_price': 50}],
+        }
+        self.run_import('catalog.jsonl', json.dumps(line) + '\n', '--skip-rebuild')
+        product = Product.objects.get(sku='KRT-2')
+        self.assertEqual(product.price, Decimal('999.50'))
+        self.assertEqual(product.variants.get(size='M').additional_price, Decimal('50.00'))
+        self.assertFalse(ProductCard.objects.exists())
+
+    def test_jsonl_lines_that_are_not_objects_are_skipped(self):
+        content = '[]\n"x"\n1\n' + json.dumps({'sku': 'KRT-3', 'title': 'Kurta', 'category': 'Kurtas', 'price': 10, 'size': 'M'})
+        out, err = self.run_import('catalog.jsonl', content + '\n')
+        self.assertEqual(err.count('not a JSON object'), 3)
+        self.assertIn('skipped: 3', out)
+        self.assertTrue(ProductCard.objects.filter(product__sku='KRT-3').exists())
+
+    def test_jsonl_variants_that_are_not_a_list_of_objects_are_skipped(self):
+        row = {'sku': 'KRT-4', 'title': 'Kurta', 'category': 'Kurtas', 'price': 10}
+        content = ''.join(json.dumps({**row, 'variants': variants}) + '\n' for variants in ({'size': 'M'}, 'M', ['M']))
+        out, err = self.run_import('catalog.jsonl', content)
+        self.assertEqual(err.count("'variants' must be a list of objects"), 3)
+        self.assertIn('skipped: 3', out)
+        self.assertFalse(Product.objects.exists())
+
+    def test_only_imported_products_are_synced(self):
+        untouched = make_product(Category.objects.create(name='Kurtas', slug='kurtas'), 5)
+        with mock.patch('store.management.commands.import_catalog.sync_product_cards') as sync_cards:
+            self.run_import('catalog.csv', self.CSV, '--batch-size', '2')
+        self.assertEqual(
+            sorted(pk for call in sync_cards.call_args_list for pk in call.args[0]),
+            sorted(Product.objects.exclude(pk=untouched.pk).values_list('pk', flat=True)),
+        )
+
+    def test_sync_queries_do_not_grow_with_the_batch(self):
+        category = Category.objects.create(name='Kurtas', slug='kurtas')
+        products = [make_product(category, index) for index in range(6)]
+        command = import_catalog.Command()
+        Product.objects.update(fabric='Linen')
+        with CaptureQueriesContext(connection) as one:
+            command.sync_products(Product.objects.filter(pk=products[0].pk))
+        with CaptureQueriesContext(connection) as many:
+            command.sync_products(Product.objects.all())
+        self.assertEqual(len(one), len(many))
+        self.assertEqual(FacetCount.objects.get(facet='fabric', value='Linen').count, 6)
+
+
+class ProductFeedTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Kurtas', slug='kurtas')
+        self.products = [make_product(category, 0, original_price='1200.00'), make_product(category, 1)]
+        self.feed_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.feed_dir)
+
+    def fetch(self, fmt, **params):
+        response = self.client.get(reverse('product_feed', args=[fmt]), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content if response.streaming else [response.content])
+
+    def test_one_item_per_variant(self):
+        rows = list(csv.DictReader(StringIO(self.fetch('csv').decode())))
+        self.assertEqual(len(rows), 4)
+        medium = next(row for row in rows if row['id'] == 'SKU-0-M')
+        self.assertEqual(medium['availability'], 'in_stock')
+        self.assertEqual((medium['price'], medium['sale_price']), ('1200.00 INR', '1000.00 INR'))
+        self.assertTrue(medium['image_link'].endswith('/media/products/0.jpg'))
+
+        items = [json.loads(line) for line in self.fetch('ndjson').splitlines()]
+        self.assertEqual({item['id'] for item in items}, {row['id'] for row in rows})
+
+        root = ElementTree.fromstring(self.fetch('xml'))
+        self.assertEqual(len(root.findall('./channel/item')), 4)
+
+    def test_gzip_and_unknown_format(self):
+        self.assertEqual(gzip.decompress(self.fetch('csv', gzip='1')), self.fetch('csv'))
+        self.assertEqual(self.client.get(reverse('product_feed', args=['pdf'])).status_code, 404)
+
+    def test_cached_copy_is_rebuilt_only_after_changes(self):
+        with override_settings(FEED_CACHE_DIR=self.feed_dir):
+            first = self.fetch('ndjson', cached='1')
+            with mock.patch('store.feeds.render_feed') as render:
+                self.assertEqual(self.fetch('ndjson', cached='1'), first)
+            render.assert_not_called()
+
+            self.products[0].variants.filter(size='L').get().delete()
+            self.assertEqual(len(self.fetch('ndjson', cached='1').splitlines()), 3)
+
+    def test_stale_copy_is_served_while_another_rebuild_runs(self):
+        with override_settings(FEED_CACHE_DIR=self.feed_dir):
+            first = self.fetch('ndjson', cached='1')
+            self.products[0].variants.filter(size='L').get().delete()
+            cache.set('feed-rebuild:feed.ndjson', 'other-worker')
+            with mock.patch('store.feeds.render_feed') as render:
+                self.assertEqual(self.fetch('ndjson', cached='1'), first)
+            render.assert_not_called()
+            cache.delete('feed-rebuild:feed.ndjson')
+            self.assertEqual(len(self.fetch('ndjson', cached='1').splitlines()), 3)
+        self.assertFalse([name for name in os.listdir(self.feed_dir) if name.endswith('.tmp')])
+
+    def test_export_command(self):
+        path = f'{self.feed_dir}/feed.xml.gz'
+        call_command('export_feed', '--format', 'xml', '--gzip', '--output', path, stdout=StringIO())
+        with gzip.open(path) as handle:
+            self.assertEqual(len(ElementTree.parse(handle).findall('./channel/item')), 4)
+
+
+class StockLevelTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Kurtas', slug='kurtas')
+        self.product = make_product(category, 0)
+        self.product.variants.filter(size='L').update(additional_price='150.00')
+        make_product(category, 1, is_active=False)
+
+    def post(self, items):
+        return self.client.post(reverse('stock_levels'), {'items': items}, format='json')
+
+    def test_levels_in_one_query_then_cached(self):
+        items = [
+            {'sku': 'SKU-0', 'size': 'L'}, {'sku': 'SKU-0', 'size': 'M'},
+            {'sku': 'SKU-1', 'size': 'M'}, {'sku': 'NOPE', 'size': 'M'},
+        ]
+        with self.assertNumQueries(1):
+            response = self.post(items)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['items'], [
+            {'sku': 'SKU-0', 'size': 'L', 'stock': 0, 'price': '1150.00'},
+            {'sku': 'SKU-0', 'size': 'M', 'stock': 5, 'price': '1000.00'},
+            {'sku': 'SKU-1', 'size': 'M', 'stock': 0, 'price': None},
+            {'sku': 'NOPE', 'size': 'M', 'stock': 0, 'price': None},
+        ])
+        with self.assertNumQueries(0):
+            self.post(items)
+
+    def test_variant_changes_show_up_immediately(self):
+        self.post([{'sku': 'SKU-0', 'size': 'M'}])
+        variant = self.product.variants.get(size='M')
+        variant.stock = 2
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.save()
+        self.assertEqual(self.post([{'sku': 'SKU-0', 'size': 'M'}]).json()['items'][0]['stock'], 2)
+
+    def test_invalid_payloads(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post([{'sku': 'SKU-0'}]).status_code, 400)
+        with mock.patch('store.views.STOCK_MAX_LINES', 1):
+            self.assertEqual(self.post([{'sku': 'SKU-0', 'size': 'M'}] * 2).status_code, 400)
+
+
+class SiteConfigCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        SiteConfig.forget_solo()
+        self.addCleanup(SiteConfig.forget_solo)
+
+    def test_hot_path_costs_no_query(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(SiteConfig.get_solo().pk)  # unsaved defaults
+        with self.assertNumQueries(0):
+            SiteConfig.get_solo()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('site_config'))
+        self.assertEqual(response.data['shipping_flat_rate'], '100.00')
+        self.assertFalse(SiteConfig.objects.exists())
+
+    def test_edits_reach_other_workers_after_the_check_interval(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            config = SiteConfig.objects.create(shipping_flat_rate='80.00')
+        self.assertEqual(SiteConfig.get_solo().shipping_flat_rate, Decimal('80.00'))
+
+        # Another worker's edit: the row and the shared version change, this
+        # process's copy doesn't
+        stale = SiteConfig._solo
+        SiteConfig.objects.filter(pk=config.pk).update(shipping_flat_rate='50.00')
+        bump_versions(SiteConfig.CACHE_NAMESPACE)
+        self.assertEqual(SiteConfig.get_solo().shipping_flat_rate, Decimal('80.00'))
+
+        later = stale[2] + SiteConfig.CHECK_INTERVAL + 0.1
+        with mock.patch('store.models.time.monotonic', return_value=later), self.assertNumQueries(1):
+            self.assertEqual(SiteConfig.get_solo().shipping_flat_rate, Decimal('50.00'))
+
+    def test_per_process_cache_reloads_every_check_interval(self):
+        SiteConfig.objects.create(shipping_flat_rate='80.00')
+        with mock.patch('store.models.cache_is_shared', return_value=False):
+            stale = SiteConfig.get_solo()
+            later = SiteConfig._solo[2] + SiteConfig.CHECK_INTERVAL + 0.1
+            with mock.patch('store.models.time.monotonic', return_value=later), self.assertNumQueries(1):
+                self.assertIsNot(SiteConfig.get_solo(), stale)
+
+
+class PricingTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        SiteConfig.forget_solo()
+        self.addCleanup(SiteConfig.forget_solo)
+        SiteConfig.objects.create(shipping_flat_rate='100.00', shipping_free_above='2000.00', tax_rate_percentage='5.00')
+        category = Category.objects.create(name='Kurtas', slug='kurtas')
+        make_product(category, 0)
+        make_product(category, 1, price='450.00')
+        ProductVariant.objects.filter(product__sku='SKU-1', size='L').update(additional_price='50.00', stock=3)
+        now = timezone.now()
+        Coupon.objects.create(
+            code='FLAT300', discount_type='fixed', value='300.00',
+            valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+        )
+
+    def post_quote(self, items, **extra):
+        return self.client.post(reverse('quote'), {'items': items, **extra}, format='json')
+
+    def test_quote_breakdown(self):
+        SiteConfig.get_solo()
+        items = [{'sku': 'SKU-0', 'size': 'M', 'quantity': 1}, {'sku': 'SKU-1', 'size': 'L', 'quantity': 2}]
+        with self.assertNumQueries(1):
+            response = self.post_quote(items)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([line['price_per_unit'] for line in response.data['lines']], ['1000.00', '500.00'])
+        # Shipping is free from 2000 on; tax is 5% of the subtotal
+        self.assertEqual(
+            [response.data[key] for key in ('subtotal', 'discount', 'shipping', 'tax', 'total')],
+            ['2000.00', '0.00', '0.00', '100.00', '2100.00'],
+        )
+
+        response = self.post_quote(items, coupon_code='flat300')
+        self.assertEqual(response.data['coupon'], 'FLAT300')
+        self.assertEqual(
+            [response.data[key] for key in ('subtotal', 'discount', 'shipping', 'tax', 'total')],
+            ['2000.00', '300.00', '100.00', '85.00', '1885.00'],
+        )
+
+    def test_errors(self):
+        response = self.post_quote([{'sku': 'SKU-0', 'size': 'XXL'}])
+        self.assertEqual((response.status_code, response.data['error']), (400, 'Product not available: SKU-0 (XXL)'))
+        self.assertEqual(self.post_quote([{'sku': 'SKU-0', 'size': 'M', 'quantity': 0}]).status_code, 400)
+        response = self.post_quote([{'sku': 'SKU-1', 'size': 'M'}], coupon_code='NOPE')
+        self.assertEqual((response.status_code, response.data['error']), (400, 'Invalid coupon code'))
+
+    def test_validate_coupon_prices_items_server_side(self):
+        response = self.client.post(reverse('validate_coupon'), {
+            'code': 'FLAT300', 'order_total': '999999', 'items': [{'sku': 'SKU-1', 'size': 'M', 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.data['discount'], 300.0)
+        Coupon.objects.filter(code='FLAT300').update(min_order_value='1000.00')
+        response = self.client.post(reverse('validate_coupon'), {
+            'code': 'FLAT300', 'order_total': '999999', 'items': [{'sku': 'SKU-1', 'size': 'M', 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_pricing', '--lines', '4', '--iterations', '2', stdout=out)
+        self.assertIn('resolve_lines()', out.getvalue())
+        self.assertRegex(out.getvalue(), r'resolve_lines\(\)\s+[\d.]+ ms/call\s+1 queries')
@@ -2,15 +2,27 @@ from django.urls import path
 from .views import (
     ProductListView, 
     ProductDetailView, 
+    ProductCardListView,
+    ProductSearchView,
     CategoryListView,
+    ProductFeedView,
+    StockView,
+    QuoteView,
+    CatalogCacheStatsView,
     ValidateCouponView,
     SiteConfigView
 )
 
 urlpatterns = [
     path('products/', ProductListView.as_view(), name='product_list'),
+    path('cards/', ProductCardListView.as_view(), name='product_cards'),
+    path('search/', ProductSearchView.as_view(), name='product_search'),
     path('products/<slug:slug>/', ProductDetailView.as_view(), name='product_detail'),
+    path('feed/<str:fmt>/', ProductFeedView.as_view(), name='product_feed'),
     path('categories/', CategoryListView.as_view(), name='category_list'),
+    path('stock/', StockView.as_view(), name='stock_levels'),
+    path('quote/', QuoteView.as_view(), name='quote'),
     path('validate-coupon/', ValidateCouponView.as_view(), name='validate_coupon'),
+    path('cache-stats/', CatalogCacheStatsView.as_view(), name='catalog_cache_stats'),
     path('config/', SiteConfigView.as_view(), name='site_config'),
 ]
\ No newline at end of file
@@ -1,24 +1,51 @@
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
-from django.utils import timezone
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.exceptions import ValidationError
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from decimal import Decimal
 
-from .models import Product, Category, Coupon, SiteConfig
+from .models import Product, Category, SiteConfig, ProductCard
+from .cache import CachedResponseMixin, get_stats
+from .coupons import CouponError, CouponNotFound, check_coupon, normalize_code
+from .facets import facet_counts, filter_by_facets
+from .feeds import FORMATS as FEED_FORMATS, cached_feed_path, gzip_stream, render_feed
+from .pagination import KeysetPagination, SearchPagination
+from .pricing import PricingError, quote, resolve_lines
+from .search import search_products
+from .stock import MAX_LINES as STOCK_MAX_LINES, stock_levels
 from .serializers import (
     ProductSerializer, 
+    ProductCardSerializer,
     CategorySerializer, 
     CouponSerializer, 
+    QuoteSerializer,
     SiteConfigSerializer
 )
 
-class ProductListView(generics.ListAPIView):
+def product_queryset(request=None):
+    """
+    Active products with everything ProductSerializer touches loaded up front,
+    so a page costs the same number of queries no matter how many rows it has.
+    With a request, only the columns and relations behind the fields picked
+    by ?fields= / ?omit= are loaded.
+    """
+    queryset = Product.objects.filter(is_active=True)
+    if request is not None:
+        # created_at is the keyset pagination cursor
+        return ProductSerializer.optimize_queryset(queryset, request, always=('created_at',))
+    return queryset.select_related('category').prefetch_related('media', 'variants')
+
+class ProductListView(CachedResponseMixin, generics.ListAPIView):
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    cache_namespaces = ('categories', 'products')
+    # Ordering (-created_at, -id) is applied by the paginator
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True).order_by('-created_at')
+        queryset = product_queryset(self.request)
         
         # Filter by category
         category = self.request.query_params.get('category', None)
@@ -29,57 +56,204 @@ class ProductListView(generics.ListAPIView):
         is_new = self.request.query_params.get('is_new', None)
         if is_new == 'true':
             queryset = queryset.filter(is_new=True)
+
+        # Filter by color / fabric / size in stock / price band
+        queryset = filter_by_facets(queryset, self.request.query_params)
+
+        # Filter by price range
+        for param, lookup in (('min_price', 'price__gte'), ('max_price', 'price__lte')):
+            value = self.request.query_params.get(param)
+            if value:
+                try:
+                    queryset = queryset.filter(**{lookup: Decimal(value)})
+                except ArithmeticError:
+                    raise ValidationError({param: 'Must be a number.'})
         
         return queryset
 
-class ProductDetailView(generics.RetrieveAPIView):
-    queryset = Product.objects.filter(is_active=True)
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['facets'] = facet_counts()
+        return response
+
+class ProductCardListView(CachedResponseMixin, generics.ListAPIView):
+    """
+    GET /api/store/cards/ -> lightweight listing tiles, read from ProductCard
+    in a single indexed query per page. Supports ?category= and ?is_new=true.
+    """
+    serializer_class = ProductCardSerializer
+    permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    cache_namespaces = ('categories', 'products')
+
+    def get_queryset(self):
+        queryset = ProductCard.objects.all()
+
+        category = self.request.query_params.get('category', None)
+        if category:
+            queryset = queryset.filter(category_slug=category)
+
+        if self.request.query_params.get('is_new', None) == 'true':
+            queryset = queryset.filter(is_new=True)
+
+        return queryset
+
+class ProductDetailView(CachedResponseMixin, generics.RetrieveAPIView):
     serializer_class = ProductSerializer
     lookup_field = 'slug'
     permission_classes = [AllowAny]
 
-class CategoryListView(generics.ListAPIView):
+    def get_queryset(self):
+        return product_queryset(self.request)
+
+    def get_cache_namespaces(self):
+        return ['categories', f"product:{self.kwargs['slug']}"]
+
+class ProductSearchView(CachedResponseMixin, generics.ListAPIView):
+    """
+    GET /api/store/search/?q=cotton+kurta -> ranked, paginated products.
+    Matching and ranking run on the ProductSearchTerm index; only the
+    products on the requested page are loaded.
+    """
+    serializer_class = ProductSerializer
+    permission_classes = [AllowAny]
+    pagination_class = SearchPagination
+    cache_namespaces = ('categories', 'products')
+
+    def list(self, request, *args, **kwargs):
+        matches = search_products(request.query_params.get('q', ''))
+        page = self.paginate_queryset(matches)
+        ids = [match['product'] for match in page]
+        products = product_queryset(request).in_bulk(ids)
+        ranked = [products[pk] for pk in ids if pk in products]
+        serializer = self.get_serializer(ranked, many=True)
+        return self.get_paginated_response(serializer.data)
+
+class ProductFeedView(APIView):
+    """
+    GET /api/store/feed/<xml|csv|ndjson>/ -> the whole catalog, one item per
+    variant, streamed without holding it in memory.
+    ?gzip=1 compresses the stream; ?cached=1 serves an on-disk copy that is
+    only rebuilt when products have changed since it was written.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, fmt):
+        if fmt not in FEED_FORMATS:
+            raise Http404
+        content_type, extension = FEED_FORMATS[fmt]
+        compress = request.query_params.get('gzip') == '1'
+        filename = f"feed.{extension}{'.gz' if compress else ''}"
+        if compress:
+            content_type = 'application/gzip'
+
+        if request.query_params.get('cached') == '1':
+            return FileResponse(
+                open(cached_feed_path(fmt, compress), 'rb'),
+                content_type=content_type,
+                filename=filename,
+            )
+
+        chunks = render_feed(fmt)
+        if compress:
+            chunks = gzip_stream(chunks)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'inline; filename="{filename}"'
+        return response
+
+class CategoryListView(CachedResponseMixin, generics.ListAPIView):
     queryset = Category.objects.all().order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
+    cache_namespaces = ('categories',)
+
+class CatalogCacheStatsView(APIView):
+    """GET /api/store/cache-stats/ -> catalog response cache hit/miss counters (staff only)."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_stats())
+
+class StockView(APIView):
+    """
+    POST /api/store/stock/  {"items": [{"sku": "VS-101", "size": "M"}, ...]}
+    -> {"items": [{"sku", "size", "stock", "price"}, ...]} in request order,
+    for revalidating a client-side cart. price is the unit price including
+    the variant's surcharge; unknown or inactive lines get stock 0, price null.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response({'error': "'items' must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > STOCK_MAX_LINES:
+            return Response(
+                {'error': f'At most {STOCK_MAX_LINES} items per request'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        pairs = []
+        for line in items:
+            if not isinstance(line, dict) or not line.get('sku') or not line.get('size'):
+                return Response({'error': "Each item must include 'sku' and 'size'."}, status=status.HTTP_400_BAD_REQUEST)
+            pairs.append((str(line['sku']), str(line['size'])))
+
+        levels = stock_levels(pairs)
+        results = []
+        for sku, size in pairs:
+            level = levels[(sku, size)]
+            results.append({
+                'sku': sku,
+                'size': size,
+                'stock': level['stock'] if level else 0,
+                # a string, like the catalog serializers' decimals
+                'price': str(level['price']) if level else None,
+            })
+        return Response({'items': results})
+
+class QuoteView(APIView):
+    """
+    POST /api/store/quote/  {"items": [{"sku", "size", "quantity"}, ...], "coupon_code": "..."}
+    -> the priced lines plus subtotal, discount, shipping, tax and total,
+    exactly as checkout would charge them (see store.pricing).
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        try:
+            lines = resolve_lines(request.data.get('items'))
+            pricing = quote(lines, request.data.get('coupon_code'), request.user)
+        except (PricingError, CouponError) as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(QuoteSerializer(pricing).data)
 
 # NEW: Coupon Validation View
 class ValidateCouponView(APIView):
     permission_classes = [AllowAny]
     
     def post(self, request):
-        code = request.data.get('code', '').strip().upper()
-        order_total = Decimal(request.data.get('order_total', 0))
+        code = normalize_code(request.data.get('code', ''))
         
         if not code:
             return Response({'error': 'Coupon code is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Prefer pricing the cart's items server-side over a client-sent total
+        if request.data.get('items'):
+            try:
+                order_total = quote(resolve_lines(request.data['items']))['subtotal']
+            except PricingError as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            order_total = Decimal(request.data.get('order_total', 0))
         
+        # Same checks checkout applies; the use itself is only counted there
         try:
-            coupon = Coupon.objects.get(code=code, active=True)
-        except Coupon.DoesNotExist:
-            return Response({'error': 'Invalid coupon code'}, status=status.HTTP_404_NOT_FOUND)
-        
-        # Check validity dates
-        now = timezone.now()
-        if coupon.valid_from > now or coupon.valid_to < now:
-            return Response({'error': 'Coupon has expired'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Check minimum order value
-        if order_total < coupon.min_order_value:
-            return Response({
-                'error': f'Minimum order value of ₹{coupon.min_order_value} required'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Check usage limit
-        if coupon.uses_count >= coupon.usage_limit:
-            return Response({'error': 'Coupon usage limit exceeded'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Calculate discount
-        discount = 0
-        if coupon.discount_type == 'percentage':
-            discount = (order_total * coupon.value) / 100
-        else:  # fixed
-            discount = coupon.value
+            coupon, discount = check_coupon(code, order_total, request.user)
+        except CouponNotFound as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_404_NOT_FOUND)
+        except CouponError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'success': True,
@@ -94,10 +268,8 @@ class SiteConfigView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request):
-        config = SiteConfig.objects.first()
-        if not config:
-            # Create default config if none exists
-            config = SiteConfig.objects.create()
+        # Cached per process; defaults until one is saved in the admin
+        config = SiteConfig.get_solo()
         
         serializer = SiteConfigSerializer(config)
         return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
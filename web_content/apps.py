@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class WebContentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'web_content'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-16 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_content', '0004_videosection_youtube_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='heroslide',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of the image (see store.images)'),
+        ),
+    ]
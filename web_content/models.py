@@ -4,6 +4,7 @@ class HeroSlide(models.Model):
     title = models.CharField(max_length=100)
     subtitle = models.CharField(max_length=255)
     image = models.ImageField(upload_to='hero_slides/', blank=True, null=True) 
+    derivatives = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized copies of the image (see store.images)")
     order = models.IntegerField(default=0)
     is_active = models.BooleanField(default=True)
 
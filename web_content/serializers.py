@@ -1,10 +1,16 @@
 from rest_framework import serializers
+from store.images import srcset
 from .models import HeroSlide, PromoMessage, VideoSection
 
 class HeroSlideSerializer(serializers.ModelSerializer):
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = HeroSlide
-        fields = ['id', 'title', 'subtitle', 'image', 'order']
+        fields = ['id', 'title', 'subtitle', 'image', 'image_srcset', 'order']
+
+    def get_image_srcset(self, obj):
+        return srcset(obj.derivatives, self.context.get('request'))
 
 class PromoMessageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from store.cache import invalidate
+from store.images import derivatives_ready, schedule_derivatives
+from .models import HeroSlide, PromoMessage, VideoSection
+
+
+@receiver(post_save, sender=HeroSlide)
+@receiver(post_delete, sender=HeroSlide)
+@receiver(post_save, sender=PromoMessage)
+@receiver(post_delete, sender=PromoMessage)
+@receiver(post_save, sender=VideoSection)
+@receiver(post_delete, sender=VideoSection)
+def invalidate_content_cache(sender, instance, **kwargs):
+    invalidate('content')
+
+
+post_save.connect(schedule_derivatives, sender=HeroSlide, dispatch_uid='heroslide_derivatives')
+
+
+@receiver(derivatives_ready, sender=HeroSlide)
+def hero_slide_derivatives_ready(sender, pk, **kwargs):
+    invalidate('content')
@@ -1,3 +1,33 @@
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import PromoMessage
+
+
+class ContentConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # The test cache is LocMemCache, shared by everything in this process
+        patcher = mock.patch('store.cache.cache_is_shared', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        PromoMessage.objects.create(text='NEW COLLECTION JUST ARRIVED')
+
+    def test_unchanged_content_gets_304(self):
+        response = self.client.get('/api/content/promos/')
+        self.assertEqual(len(response.data), 1)
+        with self.assertNumQueries(0):
+            not_modified = self.client.get('/api/content/promos/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
 
-# Create your tests here.
+    def test_edit_changes_etag(self):
+        etag = self.client.get('/api/content/promos/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            PromoMessage.objects.create(text='FREE SHIPPING')
+        response = self.client.get('/api/content/promos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
@@ -1,6 +1,7 @@
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from store.cache import conditional
 from .models import HeroSlide, PromoMessage, VideoSection
 from .serializers import HeroSlideSerializer, PromoMessageSerializer, VideoSectionSerializer
 
@@ -8,21 +9,25 @@ class WebContentViewSet(viewsets.ViewSet):
     """
     A combined viewset to get all homepage content in one go, 
     or you can access them individually if preferred.
+    Each action answers conditional GETs (ETag / Last-Modified) with a 304.
     """
 
     @action(detail=False, methods=['get'])
+    @conditional('content')
     def hero_slides(self, request):
         slides = HeroSlide.objects.filter(is_active=True).order_by('order')
         serializer = HeroSlideSerializer(slides, many=True, context={'request': request})
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @conditional('content')
     def promos(self, request):
         promos = PromoMessage.objects.filter(is_active=True).order_by('order')
         serializer = PromoMessageSerializer(promos, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @conditional('content')
     def video(self, request):
         # Get the first active video configuration
         video = VideoSection.objects.filter(is_active=True).first()